@@ -0,0 +1,4 @@
+"""
+Offline benchmarklar (haqiqiy Telegram/MongoDB siz)
+Repo ildizidan ishga tushiriladi: python -m benchmarks.e2e --help
+"""
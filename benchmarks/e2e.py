@@ -0,0 +1,287 @@
+"""
+Offline end-to-end benchmark: sintetik updatelar dp.feed_update orqali, Telegram Bot API,
+media server va MongoDB lokal stand-inlar bilan almashtirilgan.
+
+Hisobot: throughput, bosqichlar bo'yicha p50/p95/p99 (process_download, download_media,
+safe_send_media), peak RSS va vaqtinchalik papkalarning peak disk hajmi.
+
+O'lchovdan oldin yt-dlp isitiladi (bot main() dagidek) va --warmup ta yuklash o'lchanmasdan
+bajariladi: generic extractor birinchi chaqiruvda barcha extractor modullarini yuklaydi,
+pool esa har bir executor threadida YoutubeDL yaratadi - aks holda p50 shu sovuq start bo'ladi.
+Generic extractor faylni avval tekshirish uchun so'raydi, shuning uchun served_mb ~2x uploaded_mb.
+
+    python -m benchmarks.e2e --requests 200 --concurrency 50 --video-mb 5
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Any, Callable, Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+STAGES = ("process_download", "download_media", "safe_send_media")
+
+
+def prepare_environment(work_dir: str):
+    """Config import qilinishidan oldin - haqiqiy servislarga ulanmaslik uchun"""
+    os.environ.setdefault("BOT_TOKEN", "123456:BENCHMARK")
+    os.environ["RUN_MODE"] = "polling"
+    os.environ["FSM_STORAGE"] = "memory"
+    os.environ.setdefault("MONGO_URI", "mongodb://127.0.0.1:9")
+    # Locales nisbiy yo'l bilan o'qiladi
+    os.chdir(ROOT)
+    sys.path.insert(0, ROOT)
+    tempfile.tempdir = work_dir
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+class StageTimer:
+    """Modul funksiyasini o'rab, har bir chaqiruv davomiyligini yozish"""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+
+    def wrap(self, module: Any, name: str, stage: str, on_done: Callable[[], None] = None):
+        original = getattr(module, name)
+
+        async def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await original(*args, **kwargs)
+            except BaseException:
+                self.errors[stage] += 1
+                raise
+            finally:
+                self.samples[stage].append((time.perf_counter() - started) * 1000)
+                if on_done:
+                    on_done()
+
+        setattr(module, name, timed)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        return {
+            stage: {
+                "count": len(self.samples[stage]),
+                "errors": self.errors[stage],
+                "p50_ms": round(percentile(self.samples[stage], 50), 1),
+                "p95_ms": round(percentile(self.samples[stage], 95), 1),
+                "p99_ms": round(percentile(self.samples[stage], 99), 1),
+            }
+            for stage in STAGES
+        }
+
+
+def dir_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+async def sample_resources(work_dir: str, peaks: Dict[str, int], interval: float = 0.05):
+    while True:
+        peaks["disk_bytes"] = max(peaks["disk_bytes"], dir_size(work_dir))
+        await asyncio.sleep(interval)
+
+
+def make_update(update_id: int, user_id: int, text: str):
+    from datetime import datetime
+    from aiogram.types import Chat, Message, Update, User
+
+    return Update(
+        update_id=update_id,
+        message=Message(
+            message_id=update_id,
+            date=datetime.now(),
+            chat=Chat(id=user_id, type="private"),
+            from_user=User(id=user_id, is_bot=False, first_name="bench", language_code="uz"),
+            text=text,
+        ),
+    )
+
+
+def build_urls(media_url: str, count: int, repeat: float, kind: str, seed: int = 1) -> List[str]:
+    """repeat - oldingi URL qayta yuboriladigan ulush (file_id kesh hitlari)"""
+    rng = random.Random(seed)
+    unique: List[str] = []
+    urls: List[str] = []
+    for i in range(count):
+        if unique and rng.random() < repeat:
+            urls.append(rng.choice(unique))
+        else:
+            unique.append(f"{media_url}/media/item{i}.{kind}")
+            urls.append(unique[-1])
+    return urls
+
+
+async def run(args) -> Dict[str, Any]:
+    work_dir = tempfile.mkdtemp(prefix="bench-")
+    prepare_environment(work_dir)
+
+    from benchmarks.fakes import FakeTelegramAPI, MediaServer, install_fake_database, db_calls, make_fixtures
+
+    media = MediaServer(make_fixtures(args.video_mb))
+    api = FakeTelegramAPI(latency=args.api_latency / 1000)
+    media_url = await media.start()
+    api_url = await api.start()
+
+    from aiogram import Bot
+    from aiogram.client.session.aiohttp import AiohttpSession
+    from aiogram.client.telegram import TelegramAPIServer
+
+    import bot as bot_module
+    import downloader
+    from config import SUPPORTED_PLATFORMS, config
+    from platforms import registry
+    from middlewares import SubscriptionMiddleware, ThrottlingMiddleware
+    from i18n_middleware import I18nMiddleware
+
+    collections = install_fake_database(latency=args.db_latency / 1000)
+
+    # Lokal media server - alohida "platforma" (yt-dlp generic extractor bilan yuklanadi)
+    SUPPORTED_PLATFORMS["bench"] = {
+        "name": "Bench", "emoji": "🧪", "hosts": {"127.0.0.1": r"^/media/"}, "supports": ["video"]
+    }
+    registry.register(
+        "bench", SUPPORTED_PLATFORMS["bench"],
+        lambda url, *_: downloader.download_generic(url, "bench"),
+    )
+
+    # Bosqichlarni o'lchash
+    done = asyncio.Event()
+    finished = {"count": 0}
+
+    def on_job_done():
+        finished["count"] += 1
+        if finished["count"] >= args.requests:
+            done.set()
+
+    timer = StageTimer()
+    timer.wrap(bot_module, "process_download", "process_download", on_job_done)
+    timer.wrap(bot_module, "download_media", "download_media")
+    timer.wrap(bot_module, "safe_send_media", "safe_send_media")
+
+    session = AiohttpSession(api=TelegramAPIServer.from_base(api_url))
+    bot = Bot(token=os.environ["BOT_TOKEN"], session=session)
+    dp = bot_module.dp
+    if not args.no_throttle:
+        dp.update.middleware(ThrottlingMiddleware())
+    dp.update.middleware(SubscriptionMiddleware())
+    dp.update.middleware(I18nMiddleware())
+    bot_module.start_upload_workers()
+
+    # Sovuq startni o'lchovdan chiqarish (har bir executor threadi kamida bir marta)
+    from startup import warm_downloader
+    await asyncio.to_thread(warm_downloader)
+    if args.warmup is None:
+        args.warmup = config.download_workers
+    if args.warmup:
+        (await downloader.download_generic(f"{media_url}/media/warmup.{args.kind}", "bench")).cleanup()
+        for result in await asyncio.gather(*(
+            downloader.download_generic(f"{media_url}/media/warmup{i}.{args.kind}", "bench")
+            for i in range(args.warmup)
+        )):
+            result.cleanup()
+    served_before = media.served_bytes
+
+    peaks = {"disk_bytes": 0}
+    sampler = asyncio.create_task(sample_resources(work_dir, peaks))
+
+    urls = build_urls(media_url, args.requests, args.repeat, args.kind)
+    feed_limit = asyncio.Semaphore(args.concurrency)
+
+    async def feed(i: int, url: str):
+        async with feed_limit:
+            # Har bir update alohida foydalanuvchidan (throttling cheklovi o'lchovga aralashmasin)
+            await dp.feed_update(bot, make_update(i + 1, 10_000 + i, url))
+            if args.rate:
+                await asyncio.sleep(args.concurrency / args.rate)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(feed(i, url) for i, url in enumerate(urls)))
+    try:
+        await asyncio.wait_for(done.wait(), timeout=args.timeout)
+    except asyncio.TimeoutError:
+        print(f"⚠️ Timeout: {finished['count']}/{args.requests} tugadi", file=sys.stderr)
+    elapsed = time.perf_counter() - started
+
+    sampler.cancel()
+    await api.stop()
+    await media.stop()
+    await session.close()
+
+    return {
+        "requests": args.requests,
+        "completed": finished["count"],
+        "elapsed_s": round(elapsed, 2),
+        "throughput_per_s": round(finished["count"] / elapsed, 2) if elapsed else 0,
+        "stages": timer.summary(),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "peak_disk_mb": round(peaks["disk_bytes"] / (1024 * 1024), 1),
+        "uploaded_mb": round(api.uploaded_bytes / (1024 * 1024), 1),
+        "served_mb": round((media.served_bytes - served_before) / (1024 * 1024), 1),
+        "warmup": args.warmup,
+        "api_calls": dict(api.calls),
+        "db_calls": db_calls(collections),
+    }
+
+
+def print_report(report: Dict[str, Any]):
+    print(f"\n📊 {report['completed']}/{report['requests']} in {report['elapsed_s']}s "
+          f"→ {report['throughput_per_s']} links/s")
+    print(f"{'stage':<20}{'count':>8}{'err':>6}{'p50':>10}{'p95':>10}{'p99':>10}")
+    for stage, row in report["stages"].items():
+        print(f"{stage:<20}{row['count']:>8}{row['errors']:>6}"
+              f"{row['p50_ms']:>10}{row['p95_ms']:>10}{row['p99_ms']:>10}")
+    print(f"\npeak RSS {report['peak_rss_mb']} MB · peak disk {report['peak_disk_mb']} MB · "
+          f"uploaded {report['uploaded_mb']} MB · served {report['served_mb']} MB")
+    print(f"API calls: {report['api_calls']}")
+    print(f"DB calls: {report['db_calls']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline end-to-end benchmark")
+    parser.add_argument("--requests", type=int, default=100, help="Sintetik havolalar soni")
+    parser.add_argument("--concurrency", type=int, default=50, help="Bir vaqtda feed qilinadigan updatelar")
+    parser.add_argument("--rate", type=float, default=0, help="Updatelar/s (0 - cheklovsiz)")
+    parser.add_argument("--repeat", type=float, default=0.0, help="Takroriy URL ulushi (kesh hitlari), 0..1")
+    parser.add_argument("--kind", choices=("mp4", "jpg"), default="mp4")
+    parser.add_argument("--video-mb", type=float, default=5, help="Fixture MP4 hajmi")
+    parser.add_argument("--api-latency", type=float, default=0, help="Fake Bot API kechikishi (ms)")
+    parser.add_argument("--db-latency", type=float, default=0, help="Fake DB kechikishi (ms)")
+    parser.add_argument("--no-throttle", action="store_true", help="ThrottlingMiddleware siz")
+    parser.add_argument("--warmup", type=int, default=None,
+                        help="O'lchanmaydigan parallel yuklashlar (standart: DOWNLOAD_WORKERS)")
+    parser.add_argument("--timeout", type=float, default=600)
+    parser.add_argument("--json", help="Hisobotni JSON faylga yozish (CI da solishtirish uchun)")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,352 @@
+"""
+Benchmark uchun stand-inlar:
+- FakeCollection - database.py ishlatadigan motor metodlarining xotiradagi nusxasi
+- FakeTelegramAPI - Bot API o'rnini bosuvchi lokal aiohttp server
+- MediaServer - fixture MP4/JPEG fayllarni beruvchi lokal server
+"""
+
+import asyncio
+import copy
+import itertools
+import json
+import os
+import time
+from collections import Counter
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+
+from aiohttp import web
+
+
+# ============== MongoDB stand-in ==============
+
+def _get(doc: Dict[str, Any], key: str) -> Any:
+    return doc.get(key)
+
+
+def _matches(doc: Dict[str, Any], query: Dict[str, Any]) -> bool:
+    for key, cond in (query or {}).items():
+        value = _get(doc, key)
+        if isinstance(cond, dict) and any(k.startswith("$") for k in cond):
+            for op, arg in cond.items():
+                if op == "$lt" and not (value is not None and value < arg):
+                    return False
+                if op == "$lte" and not (value is not None and value <= arg):
+                    return False
+                if op == "$gt" and not (value is not None and value > arg):
+                    return False
+                if op == "$gte" and not (value is not None and value >= arg):
+                    return False
+                if op == "$in" and value not in arg:
+                    return False
+                if op == "$ne" and value == arg:
+                    return False
+        elif value != cond:
+            return False
+    return True
+
+
+def _project(doc: Optional[Dict[str, Any]], projection: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    if doc is None or not projection:
+        return copy.deepcopy(doc)
+    include = {k for k, v in projection.items() if v and k != "_id"}
+    result = {k: copy.deepcopy(v) for k, v in doc.items() if k in include}
+    if projection.get("_id", 1) and "_id" in doc:
+        result["_id"] = doc["_id"]
+    return result
+
+
+def _apply_update(doc: Dict[str, Any], update: Dict[str, Any], inserting: bool):
+    for key, value in update.get("$set", {}).items():
+        doc[key] = copy.deepcopy(value)
+    for key, value in update.get("$inc", {}).items():
+        doc[key] = doc.get(key, 0) + value
+    for key in update.get("$unset", {}):
+        doc.pop(key, None)
+    if inserting:
+        for key, value in update.get("$setOnInsert", {}).items():
+            doc[key] = copy.deepcopy(value)
+
+
+class FakeCursor:
+    def __init__(self, docs: List[Dict[str, Any]]):
+        self._docs = docs
+
+    def sort(self, key, direction: int = 1):
+        if isinstance(key, list):
+            key, direction = key[0]
+        self._docs.sort(key=lambda d: (d.get(key) is None, d.get(key)), reverse=direction < 0)
+        return self
+
+    def limit(self, n: int):
+        if n:
+            self._docs = self._docs[:n]
+        return self
+
+    async def to_list(self, length: Optional[int] = None):
+        return self._docs[:length] if length else list(self._docs)
+
+
+class FakeCollection:
+    """Faqat database.py ishlatadigan so'rovlar to'plami (tenglik va $lt/$gte kabi operatorlar)"""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, name: str, latency: float = 0.0):
+        self.name = name
+        self.latency = latency
+        self.docs: List[Dict[str, Any]] = []
+        self.calls: Counter = Counter()
+
+    async def _tick(self, method: str):
+        self.calls[method] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    def _find(self, query):
+        return next((d for d in self.docs if _matches(d, query)), None)
+
+    async def create_index(self, *args, **kwargs):
+        return "index"
+
+    async def find_one(self, query=None, projection=None, **kwargs):
+        await self._tick("find_one")
+        return _project(self._find(query), projection)
+
+    def find(self, query=None, projection=None, **kwargs):
+        self.calls["find"] += 1
+        return FakeCursor([_project(d, projection) for d in self.docs if _matches(d, query)])
+
+    async def count_documents(self, query=None):
+        await self._tick("count_documents")
+        return sum(1 for d in self.docs if _matches(d, query))
+
+    async def insert_one(self, doc):
+        await self._tick("insert_one")
+        doc = copy.deepcopy(doc)
+        doc.setdefault("_id", next(self._ids))
+        self.docs.append(doc)
+        return SimpleNamespace(inserted_id=doc["_id"])
+
+    async def _upsert(self, query, update, upsert):
+        doc = self._find(query)
+        if doc is None:
+            if not upsert:
+                return None, False
+            doc = {k: copy.deepcopy(v) for k, v in query.items() if not isinstance(v, dict)}
+            doc.setdefault("_id", next(self._ids))
+            _apply_update(doc, update, inserting=True)
+            self.docs.append(doc)
+            return doc, True
+        _apply_update(doc, update, inserting=False)
+        return doc, False
+
+    async def update_one(self, query, update, upsert=False):
+        await self._tick("update_one")
+        doc, inserted = await self._upsert(query, update, upsert)
+        return SimpleNamespace(
+            matched_count=int(doc is not None and not inserted),
+            modified_count=int(doc is not None and not inserted),
+            upserted_id=doc["_id"] if inserted else None
+        )
+
+    async def find_one_and_update(self, query, update, projection=None, return_document=False, upsert=False, **kwargs):
+        await self._tick("find_one_and_update")
+        before = copy.deepcopy(self._find(query))
+        doc, _ = await self._upsert(query, update, upsert)
+        return _project(doc if return_document else before, projection)
+
+    async def delete_one(self, query):
+        await self._tick("delete_one")
+        doc = self._find(query)
+        if doc is not None:
+            self.docs.remove(doc)
+        return SimpleNamespace(deleted_count=int(doc is not None))
+
+    async def delete_many(self, query):
+        await self._tick("delete_many")
+        matched = [d for d in self.docs if _matches(d, query)]
+        for doc in matched:
+            self.docs.remove(doc)
+        return SimpleNamespace(deleted_count=len(matched))
+
+    async def bulk_write(self, requests, ordered=True):
+        await self._tick("bulk_write")
+        for req in requests:
+            doc = getattr(req, "_doc", None)
+            query = getattr(req, "_filter", {})
+            if doc is None:
+                await self.delete_one(query)
+            else:
+                await self._upsert(query, doc, getattr(req, "_upsert", False))
+        return SimpleNamespace(acknowledged=True)
+
+
+def install_fake_database(latency: float = 0.0) -> Dict[str, FakeCollection]:
+    """database.py kolleksiyalarini xotiradagilar bilan almashtirish (funksiyalar global nomni o'qiydi)"""
+    import database
+
+    collections = {}
+    for attr in ("users_col", "settings_col", "fsm_col", "channels_col", "downloads_col", "links_col"):
+        fake = FakeCollection(attr, latency)
+        setattr(database, attr, fake)
+        collections[attr] = fake
+    # Kanallar keshi (bo'sh ro'yxat ham keshlanadi)
+    database._channels_cache = None
+    return collections
+
+
+def db_calls(collections: Dict[str, FakeCollection]) -> int:
+    return sum(sum(col.calls.values()) for col in collections.values())
+
+
+# ============== Telegram Bot API stand-in ==============
+
+BOT_ID = 777000
+
+
+class FakeTelegramAPI:
+    """
+    /bot<token>/<method> so'rovlariga Bot API formatida javob beradi.
+    Yuborilgan fayllar to'liq o'qiladi (upload hajmi hisoblanadi), latency sun'iy qo'shiladi.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls: Counter = Counter()
+        self.uploaded_bytes = 0
+        self._message_ids = itertools.count(1)
+        self._file_ids = itertools.count(1)
+        self._runner: Optional[web.AppRunner] = None
+        self.url = ""
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        app = web.Application(client_max_size=2 * 1024 ** 3)
+        app.router.add_post("/bot{token}/{method}", self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = self._runner.addresses[0][1]
+        self.url = f"http://{host}:{port}"
+        return self.url
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+
+    def _file(self, kind: str, value: Any) -> Dict[str, Any]:
+        # Keshdan yuborilgan (file_id string) bo'lsa o'sha ID qaytadi
+        if isinstance(value, str) and value and not value.startswith("attach://"):
+            file_id = value
+        else:
+            file_id = f"bench-{kind}-{next(self._file_ids)}"
+        return {"file_id": file_id, "file_unique_id": file_id[-16:]}
+
+    def _message(self, chat_id: Any, **fields) -> Dict[str, Any]:
+        return {
+            "message_id": next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": int(chat_id or 0), "type": "private"},
+            "from": {"id": BOT_ID, "is_bot": True, "first_name": "bench"},
+            **fields,
+        }
+
+    def _media_message(self, chat_id: Any, kind: str, value: Any) -> Dict[str, Any]:
+        media = self._file(kind, value)
+        if kind == "video":
+            return self._message(chat_id, video={**media, "width": 1280, "height": 720, "duration": 10})
+        if kind == "audio":
+            return self._message(chat_id, audio={**media, "duration": 10})
+        if kind == "photo":
+            return self._message(chat_id, photo=[{**media, "width": 1280, "height": 720}])
+        return self._message(chat_id, document=media)
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        self.calls[method] += 1
+
+        form: Dict[str, Any] = {}
+        if request.content_type.startswith("multipart/"):
+            reader = await request.multipart()
+            async for part in reader:
+                if part.filename:
+                    while chunk := await part.read_chunk(256 * 1024):
+                        self.uploaded_bytes += len(chunk)
+                    form[part.name] = f"attach://{part.name}"
+                else:
+                    form[part.name] = await part.text()
+        elif request.can_read_body:
+            form = dict(await request.post())
+
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        result = self._result(method.lower(), form)
+        return web.json_response({"ok": True, "result": result})
+
+    def _result(self, method: str, form: Dict[str, Any]) -> Any:
+        chat_id = form.get("chat_id", 0)
+        if method == "getme":
+            return {"id": BOT_ID, "is_bot": True, "first_name": "bench", "username": "benchbot"}
+        if method in ("sendmessage", "editmessagetext"):
+            return self._message(chat_id, text=form.get("text", ""))
+        for kind in ("video", "audio", "photo", "document"):
+            if method == f"send{kind}":
+                return self._media_message(chat_id, kind, form.get(kind))
+        if method == "sendmediagroup":
+            items = json.loads(form.get("media", "[]"))
+            return [self._media_message(chat_id, item.get("type", "document"), item.get("media")) for item in items]
+        return True
+
+
+# ============== Lokal media server ==============
+
+class MediaServer:
+    """
+    /media/<n>.<ext> - fixture fayl, boshiga n ga bog'liq baytlar qo'shiladi
+    (har bir URL kontenti har xil bo'lishi uchun - kontent dedup benchmarkni buzmasin).
+    """
+
+    CONTENT_TYPES = {"mp4": "video/mp4", "jpg": "image/jpeg"}
+
+    def __init__(self, fixtures: Dict[str, bytes]):
+        self.fixtures = fixtures
+        self.served_bytes = 0
+        self._runner: Optional[web.AppRunner] = None
+        self.url = ""
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        app = web.Application()
+        app.router.add_route("*", "/media/{name}", self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = self._runner.addresses[0][1]
+        self.url = f"http://{host}:{port}"
+        return self.url
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+
+    async def _handle(self, request: web.Request) -> web.StreamResponse:
+        stem, _, ext = request.match_info["name"].rpartition(".")
+        body = self.fixtures.get(ext)
+        if body is None:
+            raise web.HTTPNotFound()
+        body = stem.encode().ljust(64, b"\0") + body
+        headers = {"Content-Type": self.CONTENT_TYPES[ext], "Content-Length": str(len(body)), "Accept-Ranges": "bytes"}
+        if request.method == "HEAD":
+            return web.Response(headers=headers)
+        self.served_bytes += len(body)
+        return web.Response(body=body, headers=headers)
+
+
+def make_fixtures(video_mb: float) -> Dict[str, bytes]:
+    """Fixture fayllar (tasodifiy baytlar - fake API ularni dekodlamaydi)"""
+    return {
+        "mp4": os.urandom(int(video_mb * 1024 * 1024)),
+        "jpg": b"\xff\xd8\xff\xe0" + os.urandom(200 * 1024),
+    }
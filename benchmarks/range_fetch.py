@@ -0,0 +1,90 @@
+"""
+Segmentli yuklash (range_fetch.py): bitta oqim vs K ta Range ulanish.
+Lokal server har bir ulanishni sekinlashtiradi (RTT va oqim tezligi) - uzoq CDN ga o'xshash.
+
+    python -m benchmarks.range_fetch --size-mb 32 --rtt-ms 80 --stream-mbps 40 --connections 1,2,4,8
+"""
+
+import argparse
+import asyncio
+import hashlib
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CHUNK = 64 * 1024
+
+
+def make_app(data: bytes, rtt: float, stream_bps: float):
+    from aiohttp import web
+
+    async def handler(request):
+        await asyncio.sleep(rtt)  # Ulanish + so'rov
+        start, end, status = 0, len(data) - 1, 200
+        headers = {"Content-Type": "video/mp4", "Accept-Ranges": "bytes"}
+        range_header = request.headers.get("Range")
+        if range_header:
+            first, _, last = range_header.split("=", 1)[1].partition("-")
+            start, end, status = int(first), int(last) if last else end, 206
+            headers["Content-Range"] = f"bytes {start}-{end}/{len(data)}"
+        resp = web.StreamResponse(status=status, headers=headers)
+        resp.content_length = end - start + 1
+        await resp.prepare(request)
+        try:
+            for offset in range(start, end + 1, CHUNK):
+                await resp.write(data[offset:min(offset + CHUNK, end + 1)])
+                await asyncio.sleep(CHUNK / stream_bps)
+        except (ConnectionError, RuntimeError):
+            pass  # Mijoz birinchi segmentdan keyin ulanishni yopadi
+        return resp
+
+    app = web.Application()
+    app.router.add_get("/media.mp4", handler)
+    return app
+
+
+async def run(args):
+    import aiohttp
+    from aiohttp import web
+    from range_fetch import fetch_to_file
+
+    data = os.urandom(args.size_mb * 1024 * 1024)
+    expected = hashlib.md5(data).hexdigest()
+    runner = web.AppRunner(make_app(data, args.rtt_ms / 1000, args.stream_mbps * 1024 * 1024 / 8))
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    url = f"http://127.0.0.1:{port}/media.mp4"
+
+    path = os.path.join(tempfile.mkdtemp(prefix="range-fetch-"), "media.mp4")
+    async with aiohttp.ClientSession() as session:
+        for connections in args.connections:
+            started = time.perf_counter()
+            result = await fetch_to_file(session, url, path, connections=connections)
+            elapsed = time.perf_counter() - started
+            with open(path, "rb") as f:
+                ok = hashlib.md5(f.read()).hexdigest() == expected
+            print(f"{connections:>3} conn{elapsed:>9.2f} s{args.size_mb / elapsed:>9.1f} MB/s"
+                  f"   segments={result.connections} {'ok' if ok else 'CORRUPT'}")
+    await runner.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Segmented range download micro-benchmark")
+    parser.add_argument("--size-mb", type=int, default=32)
+    parser.add_argument("--rtt-ms", type=float, default=80)
+    parser.add_argument("--stream-mbps", type=float, default=40, help="Bitta ulanish tezligi (Mbit/s)")
+    parser.add_argument("--connections", default="1,2,4,8")
+    args = parser.parse_args()
+    args.connections = [int(x) for x in args.connections.split(",")]
+
+    os.environ.setdefault("BOT_TOKEN", "123456:BENCHMARK")
+    sys.path.insert(0, ROOT)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+"""
+Yozib olingan Update oqimini dispatcherga qayta ijro etish (RECORD_UPDATES bilan yozilgan fayl).
+Telegram va MongoDB stand-inlar bilan almashtiriladi, yuklash ishlari ishga tushirilmaydi -
+faqat middleware zanjiri va handlerlar o'lchanadi.
+
+Hisobot: har bir middleware (o'z vaqti, ichki zanjirsiz) va handler vaqti, update boshiga
+DB chaqiruvlari va xotira bloklari.
+
+    python -m benchmarks.replay updates.jsonl.gz --speed 20
+    python -m benchmarks.replay updates.jsonl.gz --rate 500 --loop 5 --tracemalloc
+"""
+
+import argparse
+import asyncio
+import gc
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import defaultdict
+from typing import Any, Callable, Dict, List
+
+from benchmarks.e2e import percentile, prepare_environment
+
+
+def timing_row(samples: List[float]) -> Dict[str, float]:
+    return {
+        "count": len(samples),
+        "mean_us": round(sum(samples) / len(samples) * 1e6, 1) if samples else 0,
+        "p50_us": round(percentile(samples, 50) * 1e6, 1),
+        "p95_us": round(percentile(samples, 95) * 1e6, 1),
+        "p99_us": round(percentile(samples, 99) * 1e6, 1),
+    }
+
+
+def make_timed_middleware(inner: Any, name: str, stats: Dict[str, List[float]]):
+    """Middleware ning o'z vaqti = umumiy vaqt - ichki zanjir (keyingi middleware/handler) vaqti"""
+    from aiogram import BaseMiddleware
+
+    class TimedMiddleware(BaseMiddleware):
+        async def __call__(self, handler: Callable, event: Any, data: Dict[str, Any]) -> Any:
+            downstream = 0.0
+
+            async def timed_handler(e, d):
+                nonlocal downstream
+                started = time.perf_counter()
+                try:
+                    return await handler(e, d)
+                finally:
+                    downstream += time.perf_counter() - started
+
+            started = time.perf_counter()
+            try:
+                return await inner(timed_handler, event, data)
+            finally:
+                stats[name].append(time.perf_counter() - started - downstream)
+
+    return TimedMiddleware()
+
+
+def make_handler_timer(stats: Dict[str, List[float]]):
+    """Router observerlariga ichki middleware - qaysi handler qancha vaqt olgani"""
+    from aiogram import BaseMiddleware
+
+    class HandlerTimer(BaseMiddleware):
+        async def __call__(self, handler: Callable, event: Any, data: Dict[str, Any]) -> Any:
+            handler_object = data.get("handler")
+            name = getattr(getattr(handler_object, "callback", None), "__name__", "unknown")
+            started = time.perf_counter()
+            try:
+                return await handler(event, data)
+            finally:
+                stats[name].append(time.perf_counter() - started)
+
+    return HandlerTimer()
+
+
+async def run(args) -> Dict[str, Any]:
+    prepare_environment(tempfile.mkdtemp(prefix="replay-"))
+
+    from aiogram import Bot
+    from aiogram.client.session.aiohttp import AiohttpSession
+    from aiogram.client.telegram import TelegramAPIServer
+    from aiogram.types import Update
+
+    from benchmarks.fakes import FakeTelegramAPI, install_fake_database, db_calls
+    from update_recorder import load_recording
+    import bot as bot_module
+    from middlewares import SubscriptionMiddleware, ThrottlingMiddleware
+    from i18n_middleware import I18nMiddleware
+
+    recording = list(load_recording(args.path))
+    if not recording:
+        raise SystemExit("Bo'sh yozuv")
+
+    api = FakeTelegramAPI(latency=args.api_latency / 1000)
+    api_url = await api.start()
+    collections = install_fake_database(latency=args.db_latency / 1000)
+
+    # Yuklash ishlari o'lchanmaydi (faqat handler zanjiri)
+    async def skip(*_args, **_kwargs):
+        return None
+
+    bot_module.process_download = skip
+    bot_module.process_batch = skip
+
+    middleware_stats: Dict[str, List[float]] = defaultdict(list)
+    handler_stats: Dict[str, List[float]] = defaultdict(list)
+
+    dp = bot_module.dp
+    # bot.main() dagi tartib
+    for name, middleware in (
+        ("ThrottlingMiddleware", ThrottlingMiddleware()),
+        ("SubscriptionMiddleware", SubscriptionMiddleware()),
+        ("I18nMiddleware", I18nMiddleware()),
+    ):
+        dp.update.middleware(make_timed_middleware(middleware, name, middleware_stats))
+
+    handler_timer = make_handler_timer(handler_stats)
+    for observer in ("message", "callback_query", "inline_query", "chosen_inline_result"):
+        getattr(bot_module.router, observer).middleware(handler_timer)
+
+    session = AiohttpSession(api=TelegramAPIServer.from_base(api_url))
+    bot = Bot(token="123456:REPLAY", session=session)
+
+    updates = [
+        (t, Update.model_validate(payload, context={"bot": bot}))
+        for t, payload in recording
+    ] * args.loop
+    if args.rate:
+        schedule = [i / args.rate for i in range(len(updates))]
+    else:
+        duration = recording[-1][0] or 1
+        schedule = [t / args.speed + (i // len(recording)) * duration / args.speed for i, (t, _) in enumerate(updates)]
+
+    lags: List[float] = []
+    update_times: List[float] = []
+
+    async def feed(update):
+        started = time.perf_counter()
+        await dp.feed_update(bot, update)
+        update_times.append(time.perf_counter() - started)
+
+    gc.collect()
+    if args.tracemalloc:
+        tracemalloc.start()
+        snapshot_before = tracemalloc.take_snapshot()
+    blocks_before = sys.getallocatedblocks()
+    db_before = db_calls(collections)
+
+    loop = asyncio.get_running_loop()
+    tasks = []
+    started = loop.time()
+    for (_, update), at in zip(updates, schedule):
+        delay = started + at - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        lags.append(max(0.0, loop.time() - started - at))
+        # Polling kabi - har bir update alohida task
+        tasks.append(asyncio.create_task(feed(update)))
+    await asyncio.gather(*tasks, return_exceptions=True)
+    elapsed = loop.time() - started
+
+    count = len(updates)
+    report: Dict[str, Any] = {
+        "updates": count,
+        "elapsed_s": round(elapsed, 2),
+        "updates_per_s": round(count / elapsed, 1) if elapsed else 0,
+        "update": timing_row(update_times),
+        "schedule_lag_p99_ms": round(percentile(lags, 99) * 1000, 2),
+        "middlewares": {name: timing_row(samples) for name, samples in middleware_stats.items()},
+        "handlers": {name: timing_row(samples) for name, samples in sorted(handler_stats.items())},
+        "db_calls_per_update": round((db_calls(collections) - db_before) / count, 2),
+        "db_calls_by_method": {
+            f"{col.name}.{method}": n for col in collections.values() for method, n in col.calls.items()
+        },
+        "retained_blocks_per_update": round((sys.getallocatedblocks() - blocks_before) / count, 1),
+        "api_calls": dict(api.calls),
+    }
+    if args.tracemalloc:
+        snapshot_after = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        diff = snapshot_after.compare_to(snapshot_before, "lineno")
+        report["traced_bytes_per_update"] = round(sum(s.size_diff for s in diff) / count, 1)
+        report["traced_allocs_per_update"] = round(sum(s.count_diff for s in diff) / count, 2)
+        report["traced_peak_mb"] = round(peak / (1024 * 1024), 2)
+        report["top_allocations"] = [str(s) for s in diff[:10]]
+        tracemalloc.stop()
+
+    await api.stop()
+    await session.close()
+    return report
+
+
+def print_report(report: Dict[str, Any]):
+    print(f"\n📼 {report['updates']} updates in {report['elapsed_s']}s → {report['updates_per_s']}/s "
+          f"(schedule lag p99 {report['schedule_lag_p99_ms']} ms)")
+    header = f"{'':<28}{'count':>8}{'mean µs':>10}{'p50':>10}{'p95':>10}{'p99':>10}"
+
+    def rows(title, table):
+        print(f"\n{title}\n{header}")
+        for name, row in table.items():
+            print(f"{name:<28}{row['count']:>8}{row['mean_us']:>10}{row['p50_us']:>10}{row['p95_us']:>10}{row['p99_us']:>10}")
+
+    rows("Update (feed_update)", {"total": report["update"]})
+    rows("Middlewares (self time)", report["middlewares"])
+    rows("Handlers", report["handlers"])
+    print(f"\nDB calls/update: {report['db_calls_per_update']}  {report['db_calls_by_method']}")
+    print(f"Retained blocks/update: {report['retained_blocks_per_update']}")
+    if "traced_allocs_per_update" in report:
+        print(f"Traced allocs/update: {report['traced_allocs_per_update']} "
+              f"({report['traced_bytes_per_update']} B), peak {report['traced_peak_mb']} MB")
+        for line in report["top_allocations"]:
+            print(f"  {line}")
+    print(f"API calls: {report['api_calls']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recorded update replay")
+    parser.add_argument("path", help="RECORD_UPDATES bilan yozilgan .jsonl.gz fayl")
+    parser.add_argument("--speed", type=float, default=1.0, help="Yozilgan vaqtga nisbatan tezlashtirish")
+    parser.add_argument("--rate", type=float, default=0, help="Qat'iy updates/s (speed o'rniga)")
+    parser.add_argument("--loop", type=int, default=1, help="Yozuvni necha marta takrorlash")
+    parser.add_argument("--api-latency", type=float, default=0, help="Fake Bot API kechikishi (ms)")
+    parser.add_argument("--db-latency", type=float, default=0, help="Fake DB kechikishi (ms)")
+    parser.add_argument("--tracemalloc", action="store_true", help="Allokatsiyalarni kuzatish (sekinlashtiradi)")
+    args = parser.parse_args()
+
+    print_report(asyncio.run(run(args)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+YoutubeDL pool vs har safar yangi obyekt: bitta job uchun vaqt va allokatsiyalar.
+Tarmoqsiz - lokal fayl file:// orqali (generic extractor) yuklanadi.
+
+    python -m benchmarks.ydl_pool --jobs 50
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_jobs(jobs: int, pooled: bool, source: str, out_dir: str):
+    import yt_dlp
+    from ydl_pool import ydl_pool
+
+    base = {'quiet': True, 'no_warnings': True, 'noprogress': True, 'enable_file_urls': True, 'noplaylist': True}
+    tracemalloc.start()
+    started = time.perf_counter()
+    for i in range(jobs):
+        opts = {**base, 'outtmpl': os.path.join(out_dir, f"{'p' if pooled else 'f'}{i}.%(ext)s"),
+                'progress_hooks': [lambda d: None]}
+        if pooled:
+            with ydl_pool.acquire(opts) as ydl:
+                ydl.extract_info(f"file://{source}", download=True)
+        else:
+            with yt_dlp.YoutubeDL(opts) as ydl:
+                ydl.extract_info(f"file://{source}", download=True)
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed / jobs * 1000, peak / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description="YoutubeDL pool micro-benchmark")
+    parser.add_argument("--jobs", type=int, default=30)
+    parser.add_argument("--size-kb", type=int, default=256)
+    args = parser.parse_args()
+
+    os.environ.setdefault("BOT_TOKEN", "123456:BENCHMARK")
+    sys.path.insert(0, ROOT)
+
+    work_dir = tempfile.mkdtemp(prefix="ydl-pool-")
+    source = os.path.join(work_dir, "source.mp4")
+    with open(source, "wb") as f:
+        f.write(os.urandom(args.size_kb * 1024))
+
+    # Birinchi chaqiruv (import, extractor reestri) o'lchovga kirmasin
+    run_jobs(1, True, source, work_dir)
+    for pooled in (False, True):
+        ms, peak_kb = run_jobs(args.jobs, pooled, source, work_dir)
+        print(f"{'pooled' if pooled else 'fresh':<8}{ms:>10.2f} ms/job{peak_kb:>10.0f} KiB peak")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,17 +4,24 @@ YouTube, Instagram, TikTok va boshqa platformalardan video/audio/rasm yuklab ber
 """
 
 import asyncio
+import contextvars
+import hmac
 import logging
+import socket
 import sys
 import time
 from datetime import datetime
-from typing import Dict, Optional, Any
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
 
 from aiogram import Bot, Dispatcher, Router, F
 from aiogram.types import (
     Message, CallbackQuery, BotCommand, ErrorEvent,
     InlineKeyboardButton, InlineKeyboardMarkup,
-    BufferedInputFile, FSInputFile
+    BufferedInputFile, FSInputFile,
+    InputMediaAudio, InputMediaPhoto, InputMediaVideo,
+    InlineQuery, ChosenInlineResult, InlineQueryResultsButton,
+    InlineQueryResultArticle, InputTextMessageContent,
+    InlineQueryResultCachedAudio, InlineQueryResultCachedPhoto, InlineQueryResultCachedVideo
 )
 from aiogram.filters import Command
 from aiogram.enums import ParseMode
@@ -26,69 +33,37 @@ class BroadcastState(StatesGroup):
     waiting_for_message = State()
     confirm_send = State()
 
+from cache import TTLCache
 from config import config, SUPPORTED_PLATFORMS
 from downloader import (
-    detect_platform, extract_url, download_media, DownloadResult
+    detect_platform, extract_urls, is_playlist_url, expand_playlist,
+    download_media, DownloadResult
 )
+from link_registry import register_link, resolve_link, callback_data as link_callback_data
+from metrics import inc, register_gauge
+from progress import progress
+from jobs import Job, start_job, finish_job, get_job
+from profiler import profile, start_loop_monitor
+from startup import startup, warm_downloader
+from tracing import create_traced_task, record_span, span, trace_id
 from database import (
     init_db, add_user, get_settings as db_get_settings, update_settings, 
     set_user_active, get_users_count, get_active_users_count, 
     get_new_users_today, get_all_users, get_last_users,
-    add_cached_file, get_cached_file,
+    add_cached_file, add_cached_group, get_cached_file, get_cached_by_hash,
+    invalidate_file_id, record_cached_send_failure,
     settings_col, get_user_language
 )
 
-# Logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+# Logging (navbat orqali - stdout sekin bo'lsa ham event loop kutmaydi)
+from logging_setup import setup_logging
+setup_logging(config.log_level, config.log_format, config.log_sample, config.log_error_interval)
 logger = logging.getLogger(__name__)
 
-# --- DNS MONKEY PATCH START ---
-# Hugging Face Spaces da DNS muammosini hal qilish uchun
-try:
-    import dns.resolver
-    import socket
-    
-    logger.info("🛠️ DNS Resolver Monkey Patching...")
-    
-    original_getaddrinfo = socket.getaddrinfo
-    resolver = dns.resolver.Resolver()
-    resolver.nameservers = ['8.8.8.8', '1.1.1.1']
-    # TCP ni yoqish (UDP bloklangan bo'lishi mumkin)
-    resolver.use_tcp = True
-    
-    def custom_getaddrinfo(host, port, family=0, type=0, proto=0, flags=0):
-        # Faqat domen nomlarini resolve qilish (IP larni emas)
-        if host is None:
-             return original_getaddrinfo(host, port, family, type, proto, flags)
-
-        try:
-            # Agar host allaqachon IP bo'lsa, original funksiyani ishlatish
-            socket.inet_aton(host)
-            return original_getaddrinfo(host, port, family, type, proto, flags)
-        except OSError:
-            pass # IP emas (yoki IPv6)
-            
-        try:
-            # IPv4 ni afzal ko'rish (A record)
-            answers = resolver.resolve(host, 'A')
-            ip = answers[0].to_text()
-            # Asl manzilni IP bilan almashtirib chaqirish
-            return original_getaddrinfo(ip, port, family, type, proto, flags)
-        except Exception:
-            # Fallback
-            return original_getaddrinfo(host, port, family, type, proto, flags)
-            
-    socket.getaddrinfo = custom_getaddrinfo
-    logger.info("✅ socket.getaddrinfo patched with Google DNS (TCP enabled)!")
-    
-except ImportError:
-    logger.warning("⚠️ dnspython not found! DNS patching skipped.")
-except Exception as e:
-    logger.error(f"❌ DNS Patching error: {e}")
-# --- DNS MONKEY PATCH END ---
+# --- DNS PATCH ---
+# Hugging Face Spaces da DNS muammosini hal qilish uchun (umumiy keshlangan resolver)
+from dns_resolver import install_getaddrinfo_patch, CachedResolver
+install_getaddrinfo_patch()
 
 
 # Bot va Router
@@ -98,17 +73,16 @@ except Exception as e:
 # --- IPv4 Session (Singleton) ---
 from aiogram.client.session.aiohttp import AiohttpSession
 from aiohttp import TCPConnector, ClientSession as AioHttpClientSession
-from aiohttp.resolver import AsyncResolver
 
 class IPv4Session(AiohttpSession):
     _singleton_session: Optional[AioHttpClientSession] = None
 
     async def create_session(self) -> AioHttpClientSession:
         if self._singleton_session is None or self._singleton_session.closed:
-            logger.info("🔌 IPv4Session: Creating Singleton ClientSession (AsyncResolver + Google DNS)...")
+            logger.info("🔌 IPv4Session: Creating Singleton ClientSession (CachedResolver + Google DNS)...")
             
-            # Explicit Google DNS resolver for aiohttp
-            resolver = AsyncResolver(nameservers=["8.8.8.8", "1.1.1.1"])
+            # Umumiy keshlangan DNS (Google/Cloudflare)
+            resolver = CachedResolver()
             
             connector = TCPConnector(
                 family=socket.AF_INET,
@@ -119,7 +93,7 @@ class IPv4Session(AiohttpSession):
             )
             self._singleton_session = AioHttpClientSession(connector=connector, json_serialize=self.json_dumps)
         else:
-            logger.info("🔌 IPv4Session: Reusing Singleton ClientSession")
+            logger.debug("🔌 IPv4Session: Reusing Singleton ClientSession")
 
         return self._singleton_session
 
@@ -128,18 +102,42 @@ class IPv4Session(AiohttpSession):
             await self._singleton_session.close()
         await super().close()
 
-dp = Dispatcher()
+from fsm_storage import create_storage
+
+dp = Dispatcher(storage=create_storage())
 router = Router()
 dp.include_router(router)
 
 # Concurrency control only (rate limiting now handled by ThrottlingMiddleware)
 
 # Concurrency Limiting (High Load Strategy)
-DOWNLOAD_SEMAPHORE = asyncio.Semaphore(100)
+class SlotSemaphore(asyncio.Semaphore):
+    """Band slotlarni o'zi sanaydigan semaphore (metrikalar Semaphore._value ga tayanmaydi)"""
+
+    def __init__(self, value: int):
+        super().__init__(value)
+        self.limit = value
+        self.in_use = 0
+
+    async def acquire(self):
+        await super().acquire()
+        self.in_use += 1
+        return True
+
+    def release(self):
+        self.in_use -= 1
+        super().release()
+
+    @property
+    def free(self) -> int:
+        return self.limit - self.in_use
+
+
+DOWNLOAD_SEMAPHORE = SlotSemaphore(config.download_concurrency)
 
 
 class DownloadState(StatesGroup):
-    """Yuklash jarayoni holatlari"""
+    """Yuklash jarayoni holatlari (eski dl:video tugmalari uchun; yangilari link_registry da)"""
     waiting_for_choice = State()
 
 
@@ -238,8 +236,8 @@ def main_keyboard():
     ])
 
 
-def download_keyboard(url: str, platform: str, t):
-    """Yuklash variantlari (to'liq)"""
+def download_keyboard(link_id: str, platform: str, t):
+    """Yuklash variantlari (to'liq) - havola ID si callback_data ichida"""
     buttons = []
     
     platform_info = SUPPORTED_PLATFORMS.get(platform, {})
@@ -247,15 +245,15 @@ def download_keyboard(url: str, platform: str, t):
     
     # Video
     if 'video' in supports:
-        buttons.append([InlineKeyboardButton(text=t("btn_video"), callback_data="dl:video")])
+        buttons.append([InlineKeyboardButton(text=t("btn_video"), callback_data=link_callback_data("video", link_id))])
     
     # TikTok uchun no-watermark
     if platform == 'tiktok':
-        buttons.append([InlineKeyboardButton(text=t("btn_video_nowm"), callback_data="dl:nowm")])
+        buttons.append([InlineKeyboardButton(text=t("btn_video_nowm"), callback_data=link_callback_data("nowm", link_id))])
     
     # Audio (YouTube, TikTok, SoundCloud, VK, Spotify)
     if 'audio' in supports:
-        buttons.append([InlineKeyboardButton(text=t("btn_audio"), callback_data="dl:audio")])
+        buttons.append([InlineKeyboardButton(text=t("btn_audio"), callback_data=link_callback_data("audio", link_id))])
     
     buttons.append([InlineKeyboardButton(text=t("btn_cancel"), callback_data="cancel")])
     
@@ -343,8 +341,9 @@ async def safe_delete(msg: Message) -> bool:
         return False
 
 
-async def safe_send_media(message: Message, media_type: str, file: Any, **kwargs):
-    """Media yuborish (xavfsiz va retry bilan)"""
+async def safe_send_media(message: Message, media_type: str, file: Any,
+                          errors: Optional[List[Exception]] = None, **kwargs):
+    """Media yuborish (xavfsiz va retry bilan). Yutilgan xatolar errors ro'yxatiga qo'shiladi"""
     method = {
         'video': message.answer_video,
         'audio': message.answer_audio,
@@ -355,27 +354,123 @@ async def safe_send_media(message: Message, media_type: str, file: Any, **kwargs
     if not method:
         return None
 
+    last_error: Optional[Exception] = None
     for attempt in range(3):
         try:
-            return await method(file, **kwargs)
+            with span("telegram_send", media_type=media_type, attempt=attempt + 1):
+                return await method(file, **kwargs)
         except TelegramRetryAfter as e:
+            last_error = e
             logger.warning(f"FloodWait: Sleeping {e.retry_after}s")
             await asyncio.sleep(e.retry_after)
-        except TelegramNetworkError:
+        except TelegramNetworkError as e:
+            last_error = e
             logger.warning(f"Network error, retrying... ({attempt+1}/3)")
             await asyncio.sleep(1)
-        except TelegramEntityTooLarge:
+        except TelegramEntityTooLarge as e:
+            if errors is not None:
+                errors.append(e)
             await message.answer("❌ Fayl hajmi Telegram limitidan katta (50MB/2GB).", parse_mode="Markdown")
             return None
         except Exception as e:
+            last_error = e
             logger.error(f"Send media error: {e}")
             if attempt < 2:
                 await asyncio.sleep(0.5)
             else:
                 await message.answer("❌ Media yuborishda xatolik yuz berdi.", parse_mode="Markdown")
+    if errors is not None and last_error is not None:
+        errors.append(last_error)
     return None
 
 
+async def safe_send_media_group(message: Message, media: list,
+                                errors: Optional[List[Exception]] = None) -> Optional[List[Message]]:
+    """Media guruh yuborish (retry bilan). Yutilgan xato errors ro'yxatiga qo'shiladi"""
+    last_error: Optional[Exception] = None
+    for attempt in range(3):
+        try:
+            return await message.answer_media_group(media=media)
+        except TelegramRetryAfter as e:
+            last_error = e
+            logger.warning(f"FloodWait: Sleeping {e.retry_after}s")
+            await asyncio.sleep(e.retry_after)
+        except TelegramNetworkError as e:
+            last_error = e
+            logger.warning(f"Network error, retrying... ({attempt+1}/3)")
+            await asyncio.sleep(1)
+        except Exception as e:
+            last_error = e
+            logger.error(f"Send media group error: {e}")
+            break
+    if errors is not None and last_error is not None:
+        errors.append(last_error)
+    return None
+
+
+def extract_file_id(sent_msg: Message, media_type: str) -> Optional[str]:
+    """Yuborilgan xabardan file_id ni olish (keshlash uchun)"""
+    if media_type == 'audio' and sent_msg.audio:
+        return sent_msg.audio.file_id
+    if media_type == 'image' and sent_msg.photo:
+        return sent_msg.photo[-1].file_id
+    if media_type == 'video' and sent_msg.video:
+        return sent_msg.video.file_id
+    return None
+
+
+# Telegram file_id ni rad etganda (qayta urinish foydasiz - yozuv darhol o'chiriladi).
+# URL dan olish xatolari ("failed to get http url content" va h.k.) bu yerga kirmaydi - file_id ga aloqasi yo'q
+STALE_FILE_ID_ERRORS = (
+    "wrong file identifier",
+    "wrong remote file",
+    "file reference",
+)
+CACHE_SEND_MAX_FAILURES = 3  # Boshqa xatolar shuncha marta takrorlansa ham o'chiriladi
+
+
+def is_stale_file_id_error(error: Exception) -> bool:
+    """Xato yaroqsiz (eskirgan) file_id sababli bo'lganmi"""
+    if not isinstance(error, TelegramBadRequest):
+        return False
+    text = str(error).lower()
+    return any(marker in text for marker in STALE_FILE_ID_ERRORS)
+
+
+async def handle_cached_send_failure(url: str, cached: Dict[str, Any], error: Optional[Exception]):
+    """
+    Keshdan yuborish muvaffaqiyatsiz bo'ldi.
+    Faqat file_id rad etilganda darhol o'chiriladi (shu file_id li barcha URL lar); Forbidden, tarmoq,
+    flood va noma'lum (error=None) xatolar sanaladi - yaroqli file_id bir martalik xato uchun yo'qolmaydi.
+    Yozuv boshqa URL niki bo'lishi mumkin (kontent dedup) - hisob o'sha yozuvga yoziladi.
+    """
+    if error is not None and is_stale_file_id_error(error):
+        await invalidate_file_id(cached['file_id'])
+    else:
+        await record_cached_send_failure(cached.get('url') or url, cached['file_id'], CACHE_SEND_MAX_FAILURES)
+
+
+async def find_known_content(url: str, result: DownloadResult) -> Optional[Dict[str, Any]]:
+    """
+    Yuklangan fayl boshqa URL dan allaqachon yuborilganmi (kontent xeshi bo'yicha).
+    Asl yozuv qaytariladi ('url' - o'sha URL); yangi URL faqat yuborish muvaffaqiyatli
+    bo'lgach cache_known_content() bilan keshlanadi - o'lik file_id ko'paytirilmaydi.
+    """
+    if not result.content_hash:
+        return None
+    known = await get_cached_by_hash(result.content_hash, result.media_type)
+    if not known:
+        return None
+    inc("content_dedup_hits")
+    logger.info(f"Content dedup: {url} == {known['url']}")
+    return {**known, 'known': True}
+
+
+async def cache_known_content(url: str, known: Dict[str, Any]):
+    """Dedup topilgan file_id yuborildi - endi shu URL ham keshlanadi"""
+    await add_cached_file(url, known['file_id'], known['media_type'], known.get('content_hash', ""))
+
+
 # ============== Commands ==============
 
 @router.message(Command("start"))
@@ -608,6 +703,33 @@ async def cmd_stats(message: Message):
     await message.answer(text, parse_mode=ParseMode.MARKDOWN)
 
 
+@router.message(Command("profile"))
+async def cmd_profile(message: Message):
+    """Sampling profiler (Admin): /profile [sekund] - collapsed stack fayl (flamegraph uchun)"""
+    if message.from_user.id not in config.admin_ids:
+        return
+
+    parts = message.text.split()
+    seconds = int(parts[1]) if len(parts) > 1 and parts[1].isdigit() else 10
+    seconds = max(1, min(seconds, config.profile_max_seconds))
+
+    msg = await message.answer(f"🔬 Profil yozilmoqda ({seconds} s)...")
+    stacks = await profile(seconds)
+    if stacks is None:
+        await msg.edit_text("⏳ Boshqa profil yozilmoqda, keyinroq urinib ko'ring")
+        return
+    if not stacks:
+        await msg.edit_text("🤷 Namuna yo'q (barcha threadlar bo'sh)")
+        return
+
+    name = f"profile-{datetime.now().strftime('%Y%m%d-%H%M%S')}.collapsed"
+    await message.answer_document(
+        BufferedInputFile(stacks.encode(), filename=name),
+        caption="🔥 flamegraph.pl yoki speedscope.app bilan oching"
+    )
+    await msg.delete()
+
+
 @router.message(Command("broadcast"))
 async def cmd_broadcast(message: Message):
     """Xabar tarqatish (Admin)"""
@@ -724,24 +846,34 @@ async def process_broadcast_cancel(callback: CallbackQuery, state: FSMContext):
 # ============== Link Handler ==============
 
 @router.message(F.text)
-async def handle_message(message: Message, state: FSMContext, t):
-    """Xabarlarni qayta ishlash (optimized + FSM)"""
+async def handle_message(message: Message, t, throttle=None):
+    """Xabarlarni qayta ishlash (optimized, FSM siz)"""
     user_id = message.from_user.id
     text = message.text.strip()
     
     # Aktiv statusini yangilash (bazaga qo'shish emas — /start da qilinadi)
     await set_user_active(user_id, True)
     
-    # URL ni topish
-    url = extract_url(text)
+    # URL larni topish
+    urls = extract_urls(text, limit=config.batch_max_items)
     
-    if not url:
+    if not urls:
         await message.answer(
             t("error_link"),
             parse_mode=ParseMode.MARKDOWN_V2
         )
         return
     
+    # Bir nechta havola yoki playlist - parallel yuklash
+    if len(urls) > 1 or is_playlist_url(urls[0]):
+        if throttle and not throttle.allow_download(user_id):
+            await message.answer(t("rate_limit"), parse_mode=ParseMode.MARKDOWN_V2)
+            return
+        create_traced_task(process_batch(message, urls, t=t, throttle=throttle))
+        return
+    
+    url = urls[0]
+    
     # Platformani aniqlash
     platform = detect_platform(url)
     
@@ -758,10 +890,6 @@ async def handle_message(message: Message, state: FSMContext, t):
     name = platform_info['name']
     supports = platform_info.get('supports', ['video'])
     
-    # URL va platformani saqlash (FSM)
-    await state.update_data(url=url, platform=platform)
-    await state.set_state(DownloadState.waiting_for_choice)
-    
     # Variant kerak bo'lgan platformalar
     needs_choice = (
         platform in ['youtube', 'tiktok', 'vk', 'soundcloud', 'spotify'] or
@@ -769,19 +897,32 @@ async def handle_message(message: Message, state: FSMContext, t):
     )
     
     if needs_choice:
+        # URL qisqa ID bilan reestrga yoziladi (har bir havola uchun alohida tugmalar)
+        link_id = await register_link(url, platform)
         await message.answer(
             t("what_to_download", emoji=emoji, name=escape_md(name)),
             parse_mode=ParseMode.MARKDOWN_V2,
-            reply_markup=download_keyboard(url, platform, t)
+            reply_markup=download_keyboard(link_id, platform, t)
         )
         return
     
     # To'g'ridan-to'g'ri yuklash
+    if throttle and not throttle.allow_download(user_id):
+        await message.answer(t("rate_limit"), parse_mode=ParseMode.MARKDOWN_V2)
+        return
+
     media_type = supports[0] if supports else 'video'
     
     # Katta fayllarni tekshirish (HEAD request)
     # create_task da exception handling qiyin, shuning uchun process_download ichida hal qilinadi.
-    asyncio.create_task(process_download(message, url, platform, media_type, t=t))
+    create_traced_task(process_download(message, url, platform, media_type, t=t))
+
+
+def cancel_keyboard(job: Job, t) -> InlineKeyboardMarkup:
+    """Progress xabaridagi Cancel tugmasi"""
+    return InlineKeyboardMarkup(inline_keyboard=[[
+        InlineKeyboardButton(text=t("btn_cancel"), callback_data=f"job:cancel:{job.id}")
+    ]])
 
 
 async def process_download(
@@ -791,6 +932,34 @@ async def process_download(
     media_type: str, 
     t,
     no_watermark: bool = False
+):
+    """
+    Yuklash ishi - Cancel tugmasi bilan bekor qilinadigan job sifatida.
+    Bekor qilinganda temp papkalar va semaphore darhol bo'shatiladi.
+    """
+    job = start_job(message.chat.id)
+    try:
+        await run_download(message, url, platform, media_type, t, no_watermark, job)
+    except asyncio.CancelledError:
+        if not job.cancelled:
+            raise
+        logger.info(f"Download cancelled: {url}")
+        if job.message:
+            await progress.discard(job.message)
+            await safe_edit(job.message, t("job_cancelled"), parse_mode=ParseMode.MARKDOWN_V2)
+    finally:
+        job.release()
+        finish_job(job)
+
+
+async def run_download(
+    message: Message, 
+    url: str, 
+    platform: str, 
+    media_type: str, 
+    t,
+    no_watermark: bool,
+    job: Job
 ):
     """
     Yuklash jarayoni (maksimal optimizatsiya)
@@ -801,12 +970,15 @@ async def process_download(
     platform_info = SUPPORTED_PLATFORMS.get(platform, {})
     emoji = platform_info.get('emoji', '📥')
     name = platform_info.get('name', platform)
+    cancel_kb = cancel_keyboard(job, t)
     
     # Loading xabar
     loading_msg = await message.answer(
         f"{emoji} *{escape_md(name)}*\n\n{t('preparing')}",
-        parse_mode=ParseMode.MARKDOWN_V2
+        parse_mode=ParseMode.MARKDOWN_V2,
+        reply_markup=cancel_kb
     )
+    job.message = loading_msg
     
     # 1. Keshni tekshirish (File ID Caching)
     cached_file = await get_cached_file(url)
@@ -815,174 +987,832 @@ async def process_download(
             file_id = cached_file.get('file_id')
             media_type_cached = cached_file.get('media_type')
             
-            await safe_edit(
+            progress.update(
                 loading_msg,
                 f"{emoji} *{escape_md(name)}*\n\n✅ Fayl topildi, yuborilmoqda...",
-                parse_mode=ParseMode.MARKDOWN_V2
+                parse_mode=ParseMode.MARKDOWN_V2,
+                reply_markup=cancel_kb
             )
             
             # Send cached file
-            if media_type_cached == 'audio':
-                await message.answer_audio(file_id, caption=f"{emoji} {escape_md(name)} via @tguzsavebot")
-            elif media_type_cached == 'image':
-                await message.answer_photo(file_id, caption=f"{emoji} {escape_md(name)} via @tguzsavebot")
-            else: # video
-                await message.answer_video(file_id, caption=f"{emoji} {escape_md(name)} via @tguzsavebot")
+            with span("cached_send", media_type=media_type_cached):
+                if media_type_cached == 'group':
+                    # Albom - bitta send_media_group chaqiruvi
+                    entries = media_entries({'platform': platform, 'cached': cached_file, 'result': None})
+                    send_errors: List[Optional[Exception]] = [None] * len(entries)
+                    file_ids = await send_media_entries(message, entries, send_errors)
+                    if not all(file_ids):
+                        await handle_cached_send_failure(url, cached_file, next(filter(None, send_errors), None))
+                        raise RuntimeError("cached media group send failed")
+                elif media_type_cached == 'audio':
+                    await message.answer_audio(file_id, caption=f"{emoji} {escape_md(name)} via @tguzsavebot")
+                elif media_type_cached == 'image':
+                    await message.answer_photo(file_id, caption=f"{emoji} {escape_md(name)} via @tguzsavebot")
+                else: # video
+                    await message.answer_video(file_id, caption=f"{emoji} {escape_md(name)} via @tguzsavebot")
             
+            await progress.discard(loading_msg)
             await safe_delete(loading_msg)
             return
         except Exception as e:
             logger.warning(f"Cache hit but failed to send {url}: {e}")
-            # Agar kesh ishlamasa, qayta yuklashga o'tadi
+            if media_type_cached != 'group':
+                await handle_cached_send_failure(url, cached_file, e)
+            # Agar kesh ishlamasa, qayta yuklashga o'tadi (yangi file_id keshni qayta to'ldiradi)
     
-    # 2. Concurrency limiting (Navbat)
-    if DOWNLOAD_SEMAPHORE.locked():
-        await safe_edit(
+    # Progress callback (faqat oxirgi holat saqlanadi - renderer o'zi tahrirlaydi)
+    async def update_progress(status: str):
+        progress.update(
             loading_msg,
-            f"{emoji} *{escape_md(name)}*\n\n⏳ Server band, navbatingizni kuting...",
-            parse_mode=ParseMode.MARKDOWN_V2
+            f"{emoji} *{escape_md(name)}*\n\n{escape_md(status)}",
+            parse_mode=ParseMode.MARKDOWN_V2,
+            reply_markup=cancel_kb
         )
     
-    async with DOWNLOAD_SEMAPHORE:
-        # Progress callback
-        progress_state = {'last_update': 0, 'step': 0}
+    async def download_and_submit(direct: bool) -> Optional[Tuple[DownloadResult, asyncio.Future]]:
+        """Yuklash sloti ichida yuklash va upload navbatiga qo'yish; xato bo'lsa foydalanuvchiga yozib None"""
+        # 2. Concurrency limiting (Navbat)
+        if DOWNLOAD_SEMAPHORE.locked():
+            progress.update(
+                loading_msg,
+                f"{emoji} *{escape_md(name)}*\n\n⏳ Server band, navbatingizni kuting...",
+                parse_mode=ParseMode.MARKDOWN_V2,
+                reply_markup=cancel_kb
+            )
         
-        async def update_progress(status: str):
-            now = time.time()
-            if now - progress_state['last_update'] > 2:
-                progress_state['step'] += 1
-                dots = "." * (progress_state['step'] % 4)
-                try:
+        slot_requested = time.monotonic()
+        async with DOWNLOAD_SEMAPHORE:
+            record_span("download_slot_wait", slot_requested)
+            result = None
+            
+            try:
+                # Yuklash boshlandi
+                progress.update(
+                    loading_msg,
+                    f"{emoji} *{escape_md(name)}*\n\n{t('downloading')}",
+                    parse_mode=ParseMode.MARKDOWN_V2,
+                    reply_markup=cancel_kb
+                )
+                
+                # Yuklash (retry bilan)
+                for attempt in range(2):
+                    result = await download_media(url, media_type, no_watermark, update_progress, direct=direct)
+                    
+                    if result.success:
+                        break
+                    elif attempt < 1:
+                        await asyncio.sleep(1)
+                        logger.info(f"Retry download: {platform}")
+                
+                if not result.success:
+                    error_text = result.error or t("error_unknown")
+                    await progress.discard(loading_msg)
                     await safe_edit(
                         loading_msg,
-                        f"{emoji} *{escape_md(name)}*\n\n{escape_md(status)}{dots}",
+                        f"❌ *Xatolik*\n\n{escape_md(error_text)}",
                         parse_mode=ParseMode.MARKDOWN_V2
                     )
-                    progress_state['last_update'] = now
-                except:
-                    pass
-        
-        result = None
-        
-        try:
-            # Yuklash boshlandi
-            await safe_edit(
-                loading_msg,
-                f"{emoji} *{escape_md(name)}*\n\n{t('downloading')}",
-                parse_mode=ParseMode.MARKDOWN_V2
-            )
-            
-            # Yuklash (retry bilan)
-            for attempt in range(2):
-                result = await download_media(url, media_type, no_watermark, update_progress)
+                    result.cleanup()
+                    return None
                 
-                if result.success:
-                    break
-                elif attempt < 1:
-                    await asyncio.sleep(1)
-                    logger.info(f"Retry download: {platform}")
-            
-            if not result.success:
-                error_text = result.error or t("error_unknown")
+                # Upload navbatiga - navbat to'la bo'lsa yuklash sloti bo'shamaydi (backpressure).
+                # direct_url bo'lsa ham - Telegram URL ni olishini (va FloodWait ni) upload bosqichi kutadi
+                upload = await submit_upload(
+                    lambda: upload_result(message, url, platform, result, loading_msg, t, cancel_kb),
+                    cleanup=result.cleanup
+                )
+                return result, upload
+                
+            except Exception as e:
+                logger.error(f"Download error [{trace_id()}]: {e}", exc_info=True)
+                await progress.discard(loading_msg)
                 await safe_edit(
                     loading_msg,
-                    f"❌ *Xatolik*\n\n{escape_md(error_text)}",
+                    f"❌ *Xatolik*\n\n{escape_md(str(e)[:80])}",
                     parse_mode=ParseMode.MARKDOWN_V2
                 )
+                if result:
+                    result.cleanup()
+                return None
+    
+    submitted = await download_and_submit(config.direct_delivery)
+    if not submitted:
+        return
+    
+    # Upload alohida workerlarda (yuklash sloti allaqachon bo'sh)
+    try:
+        result, upload = submitted
+        delivered = await upload
+        if result.direct_url and not delivered:
+            # Telegram URL ni ololmadi - odatdagi yuklash + upload (slot qaytadan olinadi)
+            submitted = await download_and_submit(False)
+            if not submitted:
                 return
-            
-            # Uploading
-            await safe_edit(
-                loading_msg,
-                f"{emoji} *{escape_md(name)}*\n\n{t('uploading')}",
-                parse_mode=ParseMode.MARKDOWN_V2
-            )
-            
-            # Caption yaratish
-            caption = generate_caption(result, name, emoji)
-            
-            # Media yuborish (Safe Wrapper orqali)
-            input_file = FSInputFile(result.file_path)
-            thumb_file = BufferedInputFile(result.thumbnail, filename="thumb.jpg") if result.thumbnail else None
-            
-            sent_msg = None
-            if result.media_type == 'audio':
-                sent_msg = await safe_send_media(
-                    message, 
-                    'audio', 
-                    input_file,
-                    title=result.title[:1000],
-                    duration=result.duration,
-                    thumbnail=thumb_file,
-                    caption=caption,
-                    parse_mode=ParseMode.MARKDOWN_V2
-                )
-            elif result.media_type == 'image':
-                sent_msg = await safe_send_media(
-                    message, 
-                    'photo', 
-                    input_file,
-                    caption=caption,
-                    parse_mode=ParseMode.MARKDOWN_V2
-                )
-            else:
-                sent_msg = await safe_send_media(
-                    message, 
-                    'video', 
-                    input_file,
-                    caption=caption,
-                    duration=result.duration,
-                    width=1920,
-                    height=1080,
-                    thumbnail=thumb_file,
-                    supports_streaming=True,
-                    parse_mode=ParseMode.MARKDOWN_V2
-                )
-                
-            # 3. Keshga saqlash (File ID Caching)
-            if sent_msg:
-                file_id = None
-                if result.media_type == 'audio' and sent_msg.audio:
-                    file_id = sent_msg.audio.file_id
-                elif result.media_type == 'image' and sent_msg.photo:
-                    file_id = sent_msg.photo[-1].file_id
-                elif result.media_type == 'video' and sent_msg.video:
-                    file_id = sent_msg.video.file_id
-                
-                if file_id:
-                    await add_cached_file(url, file_id, result.media_type)
-                    logger.info(f"Cached file_id for {url}")
-            
-            # Loading xabarini o'chirish
+            await submitted[1]
+    except Exception as e:
+        logger.error(f"Upload error [{trace_id()}]: {e}", exc_info=True)
+        await progress.discard(loading_msg)
+        await safe_edit(
+            loading_msg,
+            f"❌ *Xatolik*\n\n{escape_md(str(e)[:80])}",
+            parse_mode=ParseMode.MARKDOWN_V2
+        )
+
+
+async def upload_result(
+    message: Message, url: str, platform: str, result: DownloadResult, loading_msg: Message, t,
+    cancel_kb: Optional[InlineKeyboardMarkup] = None
+):
+    """
+    Yuklangan faylni Telegramga yuborish va file_id ni keshlash (upload worker ichida).
+    result.direct_url bo'lsa Telegram faylni o'zi oladi - natija: yuborildimi (False - fallback kerak).
+    """
+    if result.direct_url:
+        return await send_direct(message, url, platform, result, loading_msg)
+    
+    platform_info = SUPPORTED_PLATFORMS.get(platform, {})
+    emoji = platform_info.get('emoji', '📥')
+    name = platform_info.get('name', platform)
+    
+    # Uploading
+    progress.update(
+        loading_msg,
+        f"{emoji} *{escape_md(name)}*\n\n{t('uploading')}",
+        parse_mode=ParseMode.MARKDOWN_V2,
+        reply_markup=cancel_kb
+    )
+    
+    # Albom (Instagram carousel va h.k.) - bitta media group
+    if result.items:
+        entries = media_entries({'platform': platform, 'cached': None, 'result': result})
+        file_ids = await send_media_entries(message, entries)
+        if all(file_ids):
+            await cache_sent_media(url, [(e[0], fid) for e, fid in zip(entries, file_ids)])
+        await progress.discard(loading_msg)
+        await safe_delete(loading_msg)
+        return
+    
+    # Caption yaratish
+    caption = generate_caption(result, name, emoji)
+    
+    # Bir xil kontent boshqa havoladan yuborilgan bo'lsa - qayta yuklamasdan file_id
+    known = await find_known_content(url, result)
+    if known:
+        method = {
+            'audio': message.answer_audio,
+            'image': message.answer_photo,
+        }.get(result.media_type, message.answer_video)
+        try:
+            await method(known['file_id'], caption=caption, parse_mode=ParseMode.MARKDOWN_V2)
+            await cache_known_content(url, known)
+            await progress.discard(loading_msg)
             await safe_delete(loading_msg)
-            
+            return
         except Exception as e:
-            logger.error(f"Download error: {e}", exc_info=True)
-            await safe_edit(
-                loading_msg,
-                f"❌ *Xatolik*\n\n{escape_md(str(e)[:80])}",
-                parse_mode=ParseMode.MARKDOWN_V2
-            )
+            logger.warning(f"Known content send failed {url}: {e}")
+            await handle_cached_send_failure(url, known, e)
+    
+    # Media yuborish (Safe Wrapper orqali)
+    input_file = FSInputFile(result.file_path)
+    thumb_file = BufferedInputFile(result.thumbnail, filename="thumb.jpg") if result.thumbnail else None
+    
+    sent_msg = None
+    if result.media_type == 'audio':
+        sent_msg = await safe_send_media(
+            message, 
+            'audio', 
+            input_file,
+            title=result.title[:1000],
+            duration=result.duration,
+            thumbnail=thumb_file,
+            caption=caption,
+            parse_mode=ParseMode.MARKDOWN_V2
+        )
+    elif result.media_type == 'image':
+        sent_msg = await safe_send_media(
+            message, 
+            'photo', 
+            input_file,
+            caption=caption,
+            parse_mode=ParseMode.MARKDOWN_V2
+        )
+    else:
+        sent_msg = await safe_send_media(
+            message, 
+            'video', 
+            input_file,
+            caption=caption,
+            duration=result.duration,
+            width=1920,
+            height=1080,
+            thumbnail=thumb_file,
+            supports_streaming=True,
+            parse_mode=ParseMode.MARKDOWN_V2
+        )
         
+    # 3. Keshga saqlash (File ID Caching)
+    if sent_msg:
+        file_id = extract_file_id(sent_msg, result.media_type)
+        
+        if file_id:
+            await add_cached_file(url, file_id, result.media_type, result.content_hash)
+            logger.info("Cached file_id for %s", url)
+    
+    # Loading xabarini o'chirish
+    await progress.discard(loading_msg)
+    await safe_delete(loading_msg)
+
+
+async def send_direct(message: Message, url: str, platform: str, result: DownloadResult, loading_msg: Message) -> bool:
+    """
+    Faylni Telegram o'zi result.direct_url dan oladi (bizda yuklash va upload yo'q).
+    Muvaffaqiyatsiz bo'lsa False - chaqiruvchi odatdagi yuklash + uploadga o'tadi.
+    """
+    platform_info = SUPPORTED_PLATFORMS.get(platform, {})
+    caption = generate_caption(result, platform_info.get('name', platform), platform_info.get('emoji', '📥'))
+
+    sent_msg = None
+    for attempt in range(2):
+        try:
+            with span("telegram_send", media_type=result.media_type, direct=True):
+                if result.media_type == 'image':
+                    sent_msg = await message.answer_photo(
+                        result.direct_url, caption=caption, parse_mode=ParseMode.MARKDOWN_V2
+                    )
+                else:
+                    sent_msg = await message.answer_video(
+                        result.direct_url,
+                        caption=caption,
+                        duration=result.duration or None,
+                        supports_streaming=True,
+                        parse_mode=ParseMode.MARKDOWN_V2
+                    )
+            break
+        except TelegramRetryAfter as e:
+            logger.warning(f"FloodWait: Sleeping {e.retry_after}s")
+            await asyncio.sleep(e.retry_after)
+        except Exception as e:
+            # Telegram URL ni ololmadi (hajm, tur, CDN rad etdi) - yuklab yuboriladi
+            logger.info("Direct send failed for %s: %s", url, e)
+            break
+    if not sent_msg:
+        inc("direct_send_fallback")
+        return False
+
+    inc("direct_send")
+    file_id = extract_file_id(sent_msg, result.media_type)
+    if file_id:
+        await add_cached_file(url, file_id, result.media_type)
+        logger.info("Cached file_id for %s", url)
+    await progress.discard(loading_msg)
+    await safe_delete(loading_msg)
+    return True
+
+
+# ============== Upload Pipeline ==============
+
+# Yuklangan, Telegramga yuborilishini kutayotgan ishlar (cheklangan navbat)
+UPLOAD_QUEUE: asyncio.Queue = asyncio.Queue(maxsize=config.upload_queue_size)
+
+
+async def submit_upload(job: Callable[[], Awaitable[Any]], cleanup: Optional[Callable[[], None]] = None) -> asyncio.Future:
+    """
+    Upload ishini navbatga qo'yish, natija future orqali qaytadi.
+    Navbat to'la bo'lsa shu yerda kutiladi (backpressure).
+    cleanup - upload tugashi bilan chaqiriladi (vaqtinchalik fayllar).
+    Upload yuboruvchi kontekstida (trace, job) bajariladi.
+    """
+    future = asyncio.get_running_loop().create_future()
+    await UPLOAD_QUEUE.put((job, cleanup, future, contextvars.copy_context(), time.monotonic()))
+    return future
+
+
+async def upload_worker():
+    """Navbatdan upload ishlarini olib bajarish"""
+    while True:
+        job, cleanup, future, ctx, submitted = await UPLOAD_QUEUE.get()
+        try:
+            # Kutayotgan tomon bekor qilgan (Cancel) - upload boshlanmaydi
+            if future.cancelled():
+                continue
+            ctx.run(record_span, "upload_queue_wait", submitted)
+            job_task = asyncio.get_running_loop().create_task(traced_upload(job), context=ctx)
+            # Upload davomida bekor qilinsa - to'xtatiladi
+            future.add_done_callback(lambda f, task=job_task: task.cancel() if f.cancelled() else None)
+            res = await job_task
+            if not future.done():
+                future.set_result(res)
+        except asyncio.CancelledError:
+            # Ish o'zi CancelledError bergan yoki kutayotgan tomon bekor qilgan - worker ishlashda davom etadi;
+            # faqat workerning o'zi bekor qilinsa (shutdown) chiqiladi
+            if not future.done():
+                future.cancel()
+            if asyncio.current_task().cancelling():
+                raise
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
         finally:
-            # Cleanup (muhim!)
-            if result:
+            if cleanup:
+                cleanup()
+            UPLOAD_QUEUE.task_done()
+
+
+async def traced_upload(job: Callable[[], Awaitable[Any]]) -> Any:
+    with span("upload"):
+        return await job()
+
+
+def start_upload_workers():
+    for _ in range(config.upload_workers):
+        asyncio.create_task(upload_worker())
+    register_gauge("pipeline", lambda: {
+        "download_slots_free": DOWNLOAD_SEMAPHORE.free,
+        "upload_queue": UPLOAD_QUEUE.qsize(),
+        "upload_queue_max": UPLOAD_QUEUE.maxsize,
+        "upload_workers": config.upload_workers,
+    })
+
+
+# ============== Batch (bir nechta havola / playlist) ==============
+
+MEDIA_GROUP_LIMIT = 10  # Telegram: bitta albomda 2-10 ta element
+
+
+async def fetch_batch_item(url: str) -> Dict[str, Any]:
+    """
+    Batch elementini tayyorlash: kesh -> yuklash.
+    Xatolar exception emas, element ichida qaytariladi.
+    """
+    item = {'url': url, 'platform': detect_platform(url), 'cached': None, 'result': None, 'error': ''}
+    if not item['platform']:
+        item['error'] = "Bu platforma qo'llab-quvvatlanmaydi"
+        return item
+
+    cached = await get_cached_file(url)
+    if cached:
+        item['cached'] = cached
+        return item
+
+    supports = SUPPORTED_PLATFORMS[item['platform']].get('supports', ['video'])
+    media_type = supports[0] if supports else 'video'
+
+    async with DOWNLOAD_SEMAPHORE:
+        try:
+            result = await download_media(url, media_type)
+        except Exception as e:
+            logger.error(f"Batch item error: {e}")
+            result = DownloadResult(success=False, error=str(e)[:100])
+
+    if result.success:
+        known = await find_known_content(url, result)
+        if known:
+            item['cached'] = known
+            result.cleanup()
+        else:
+            item['result'] = result
+    else:
+        item['error'] = result.error or "Yuklab bo'lmadi"
+        result.cleanup()
+    return item
+
+
+def media_entries(item: Dict[str, Any]) -> List[tuple]:
+    """
+    Element -> [(media_type, media, caption), ...]
+    Albom (carousel) bir nechta entry beradi, caption faqat birinchisida.
+    """
+    platform_info = SUPPORTED_PLATFORMS.get(item['platform'], {})
+    emoji = platform_info.get('emoji', '📥')
+    name = platform_info.get('name', item['platform'])
+
+    if item['cached']:
+        cached = item['cached']
+        caption = f"{emoji} {escape_md(name)} via @tguzsavebot"
+        if cached.get('media_type') == 'group':
+            return [
+                (entry['media_type'], entry['file_id'], caption if i == 0 else None)
+                for i, entry in enumerate(cached.get('items', []))
+            ]
+        return [(cached.get('media_type', 'video'), cached['file_id'], caption)]
+
+    result = item['result']
+    caption = generate_caption(result, name, emoji)
+    if result.items:
+        return [
+            (sub.media_type, FSInputFile(sub.file_path), caption if i == 0 else None)
+            for i, sub in enumerate(result.items)
+        ]
+    return [(result.media_type, FSInputFile(result.file_path), caption)]
+
+
+def to_input_media(media_type: str, media: Any, caption: Optional[str]):
+    """Albom uchun InputMedia obyekti"""
+    if media_type == 'audio':
+        return InputMediaAudio(media=media, caption=caption, parse_mode=ParseMode.MARKDOWN_V2)
+    if media_type == 'image':
+        return InputMediaPhoto(media=media, caption=caption, parse_mode=ParseMode.MARKDOWN_V2)
+    return InputMediaVideo(media=media, caption=caption, parse_mode=ParseMode.MARKDOWN_V2, supports_streaming=True)
+
+
+async def send_media_entries(message: Message, entries: List[tuple],
+                             errors: Optional[List[Exception]] = None) -> List[Optional[str]]:
+    """
+    Entrylarni tartib bo'yicha albomlar (send_media_group) qilib yuborish.
+    Audio faqat audio bilan, rasm/video birga guruhlanadi (10 tadan).
+    Har bir entry uchun file_id qaytaradi (yuborilmagan bo'lsa None).
+    errors - har bir entry uchun yuborish xatosi (yuborilgan yoki sababsiz bo'lsa None).
+    """
+    file_ids: List[Optional[str]] = [None] * len(entries)
+
+    groups: List[tuple] = []
+    for i, (media_type, _, _) in enumerate(entries):
+        kind = 'audio' if media_type == 'audio' else 'visual'
+        if not groups or groups[-1][0] != kind or len(groups[-1][1]) >= MEDIA_GROUP_LIMIT:
+            groups.append((kind, []))
+        groups[-1][1].append(i)
+
+    for _, indexes in groups:
+        group_errors: List[Exception] = []
+        if len(indexes) == 1:
+            media_type, media, caption = entries[indexes[0]]
+            sent = await safe_send_media(
+                message,
+                'photo' if media_type == 'image' else media_type,
+                media,
+                errors=group_errors,
+                caption=caption,
+                parse_mode=ParseMode.MARKDOWN_V2
+            )
+            sent_messages = [sent] if sent else []
+        else:
+            sent_messages = await safe_send_media_group(
+                message, [to_input_media(*entries[i]) for i in indexes], errors=group_errors
+            ) or []
+
+        for i, sent in zip(indexes, sent_messages):
+            file_ids[i] = extract_file_id(sent, entries[i][0])
+        if errors is not None:
+            for i in indexes:
+                if file_ids[i] is None:
+                    errors[i] = group_errors[-1] if group_errors else None
+
+    return file_ids
+
+
+async def cache_sent_media(url: str, sent: List[tuple], content_hash: str = ""):
+    """[(media_type, file_id), ...] ni keshlash (bitta fayl yoki albom)"""
+    if len(sent) == 1:
+        media_type, file_id = sent[0]
+        await add_cached_file(url, file_id, media_type, content_hash)
+    else:
+        await add_cached_group(url, [
+            {'media_type': media_type, 'file_id': file_id} for media_type, file_id in sent
+        ])
+
+
+async def send_batch_items(message: Message, items: List[Dict[str, Any]]):
+    """Tayyor elementlarni yuborish va yangi file_id larni keshlash"""
+    entries, owners = [], []
+    for item in items:
+        if item['error']:
+            continue
+        for entry in media_entries(item):
+            entries.append(entry)
+            owners.append(item)
+
+    send_errors: List[Optional[Exception]] = [None] * len(entries)
+    file_ids = await send_media_entries(message, entries, send_errors)
+
+    # Natijalarni element bo'yicha yig'ish
+    sent_by_item: Dict[int, tuple] = {}
+    for (media_type, _, _), owner, file_id, error in zip(entries, owners, file_ids, send_errors):
+        _, sent, errors = sent_by_item.setdefault(id(owner), (owner, [], []))
+        sent.append((media_type, file_id))
+        if error is not None:
+            errors.append(error)
+
+    for owner, sent, errors in sent_by_item.values():
+        if any(file_id is None for _, file_id in sent):
+            owner['error'] = "Yuborishda xatolik"
+            if owner['cached']:
+                # Keyingi so'rov qayta yuklaydi va keshni yangilaydi
+                await handle_cached_send_failure(owner['url'], owner['cached'], errors[0] if errors else None)
+        elif not owner['cached']:
+            await cache_sent_media(owner['url'], sent, owner['result'].content_hash)
+        elif owner['cached'].get('known'):
+            await cache_known_content(owner['url'], owner['cached'])
+
+
+async def process_batch(message: Message, urls: List[str], t, throttle=None):
+    """
+    Bir xabardagi bir nechta havola / playlist:
+    elementlar parallel yuklanadi, natijalar tartib bilan albom qilib yuboriladi,
+    har bir element xatosi alohida ko'rsatiladi.
+    Har bir element bitta yuklash tokeni (birinchisi handlerda olingan); limitdan ortiqlari yuklanmaydi.
+    """
+    status_msg = await message.answer(t("preparing"), parse_mode=ParseMode.MARKDOWN_V2)
+
+    # Playlistlarni yoyish (umumiy limit bilan)
+    item_urls: List[str] = []
+    for url in urls:
+        remaining = config.batch_max_items - len(item_urls)
+        if remaining <= 0:
+            break
+        if is_playlist_url(url):
+            try:
+                item_urls.extend((await expand_playlist(url, remaining))[:remaining])
+            except Exception as e:
+                logger.warning(f"Playlist expand error: {e}")
+                item_urls.append(url)
+        else:
+            item_urls.append(url)
+
+    limited: List[str] = []
+    if throttle and len(item_urls) > 1:
+        allowed = 1 + throttle.allow_downloads(message.from_user.id, len(item_urls) - 1)
+        item_urls, limited = item_urls[:allowed], item_urls[allowed:]
+
+    await safe_edit(
+        status_msg,
+        t("batch_downloading", count=len(item_urls)),
+        parse_mode=ParseMode.MARKDOWN_V2
+    )
+
+    tasks = [asyncio.ensure_future(fetch_batch_item(url)) for url in item_urls]
+    submitted = False
+
+    def cleanup():
+        # Tugagan har bir element (boshqasi xato bersa yoki bekor qilinsa ham)
+        for task in tasks:
+            if task.done() and not task.cancelled() and task.exception() is None and task.result()['result']:
+                task.result()['result'].cleanup()
+
+    try:
+        items: List[Dict[str, Any]] = []
+        for url, item in zip(item_urls, await asyncio.gather(*tasks, return_exceptions=True)):
+            if isinstance(item, BaseException):
+                logger.error(f"Batch item error {url}: {item!r}")
+                item = {'url': url, 'platform': None, 'cached': None, 'result': None, 'error': "Yuklab bo'lmadi"}
+            items.append(item)
+        items.extend(
+            {'url': url, 'platform': None, 'cached': None, 'result': None, 'error': "Limit: keyinroq yuboring"}
+            for url in limited
+        )
+
+        try:
+            # Upload navbati orqali (fayllar yuborilgach darhol tozalanadi)
+            upload = await submit_upload(lambda: send_batch_items(message, items), cleanup=cleanup)
+            submitted = True
+            await upload
+        except Exception as e:
+            logger.error(f"Batch send error: {e}", exc_info=True)
+            for item in items:
+                item['error'] = item['error'] or "Yuborishda xatolik"
+    finally:
+        # Navbatga tushgan bo'lsa tozalashni upload_worker bajaradi
+        if not submitted:
+            cleanup()
+
+    # Hisobot
+    ok = sum(1 for item in items if not item['error'])
+    text = t("batch_done", ok=ok, total=len(items))
+    errors = [
+        f"❌ {i}\\. {escape_md(item['error'][:60])}"
+        for i, item in enumerate(items, 1) if item['error']
+    ]
+    if errors:
+        text += "\n\n" + "\n".join(errors)
+    await safe_edit(status_msg, text, parse_mode=ParseMode.MARKDOWN_V2)
+
+
+# ============== Inline Mode (@tguzsavebot <havola>) ==============
+
+INLINE_CACHE_TIME = 300  # Telegram tomonida keshlangan javoblar (sekund)
+
+# URL -> fon yuklash vazifasi (bir havola bir marta yuklanadi)
+_inline_fetch_tasks: Dict[str, asyncio.Task] = {}
+
+# URL -> link_id: har bir harf terilganda Mongo yozuvi va yangi fon yuklash bo'lmasin
+INLINE_DEBOUNCE_TTL = 600
+_inline_links = TTLCache(maxsize=10000, ttl=INLINE_DEBOUNCE_TTL)
+
+
+def inline_cached_results(cached: Dict[str, Any], platform: str) -> list:
+    """Keshdagi file_id lardan inline natijalar (albom bo'lsa har bir element alohida)"""
+    platform_info = SUPPORTED_PLATFORMS.get(platform, {})
+    name = platform_info.get('name', platform)
+    caption = f"{platform_info.get('emoji', '📥')} {name} via @tguzsavebot"
+
+    if cached.get('media_type') == 'group':
+        entries = [(entry['media_type'], entry['file_id']) for entry in cached.get('items', [])]
+    else:
+        entries = [(cached.get('media_type', 'video'), cached['file_id'])]
+
+    results = []
+    for i, (media_type, file_id) in enumerate(entries):
+        result_id = f"c{i}"
+        if media_type == 'audio':
+            results.append(InlineQueryResultCachedAudio(id=result_id, audio_file_id=file_id, caption=caption))
+        elif media_type == 'image':
+            results.append(InlineQueryResultCachedPhoto(id=result_id, photo_file_id=file_id, title=name, caption=caption))
+        else:
+            results.append(InlineQueryResultCachedVideo(id=result_id, video_file_id=file_id, title=name, caption=caption))
+    return results
+
+
+async def fetch_to_cache_chat(bot: Bot, url: str, platform: str) -> Optional[Dict[str, Any]]:
+    """
+    Inline rejim uchun fon yuklash: fayl CACHE_CHAT_ID ga yuboriladi,
+    olingan file_id lar keshga yoziladi. Kesh yozuvini qaytaradi (xato bo'lsa None).
+    """
+    supports = SUPPORTED_PLATFORMS.get(platform, {}).get('supports', ['video'])
+    media_type = supports[0] if supports else 'video'
+
+    result = None
+    try:
+        async with DOWNLOAD_SEMAPHORE:
+            result = await download_media(url, media_type, False)
+            if not result.success:
+                logger.warning(f"Inline fetch failed {url}: {result.error}")
+                result.cleanup()
+                return None
+
+            known = await find_known_content(url, result)
+            if known:
                 result.cleanup()
+                return known
+
+            upload = await submit_upload(lambda: upload_to_cache_chat(bot, url, result), cleanup=result.cleanup)
+        return await upload
+    except Exception as e:
+        logger.error(f"Inline fetch error {url}: {e}")
+        return None
+
+
+async def upload_to_cache_chat(bot: Bot, url: str, result: DownloadResult) -> Optional[Dict[str, Any]]:
+    """Faylni kesh chatiga yuborib file_id larni keshlash (upload worker ichida)"""
+    items = result.items or [result]
+    if len(items) > 1:
+        sent_messages = await bot.send_media_group(
+            config.cache_chat_id,
+            [to_input_media(item.media_type, FSInputFile(item.file_path), None) for item in items[:MEDIA_GROUP_LIMIT]]
+        )
+    else:
+        method = {
+            'audio': bot.send_audio,
+            'image': bot.send_photo,
+        }.get(result.media_type, bot.send_video)
+        sent_messages = [await method(config.cache_chat_id, FSInputFile(result.file_path))]
+
+    sent = [
+        (item.media_type, extract_file_id(msg, item.media_type))
+        for item, msg in zip(items, sent_messages)
+    ]
+    if not sent or not all(file_id for _, file_id in sent):
+        return None
+    await cache_sent_media(url, sent, result.content_hash)
+    return await get_cached_file(url)
+
+
+def start_inline_fetch(bot: Bot, url: str, platform: str) -> asyncio.Task:
+    """Fon yuklashni boshlash (shu URL uchun ishlayotgan vazifa bo'lsa o'shani qaytaradi)"""
+    task = _inline_fetch_tasks.get(url)
+    if task is None:
+        task = create_traced_task(fetch_to_cache_chat(bot, url, platform))
+        _inline_fetch_tasks[url] = task
+        task.add_done_callback(lambda _: _inline_fetch_tasks.pop(url, None))
+    return task
+
+
+@router.inline_query()
+async def handle_inline_query(inline_query: InlineQuery, t, throttle=None):
+    """
+    Inline so'rov: keshdagi file_id lar darhol qaytariladi (yangi yuklashsiz).
+    Keshda bo'lmasa fon yuklash boshlanadi va "yuklash uchun bosing" natijasi beriladi.
+    """
+    hint = InlineQueryResultsButton(text=t("inline_hint"), start_parameter="inline")
+    urls = extract_urls(inline_query.query, limit=1)
+    platform = detect_platform(urls[0]) if urls else None
+    if not platform:
+        await inline_query.answer([], cache_time=INLINE_CACHE_TIME, button=hint)
+        return
+
+    url = urls[0]
+    cached = await get_cached_file(url)
+    if cached:
+        try:
+            await inline_query.answer(
+                inline_cached_results(cached, platform),
+                cache_time=INLINE_CACHE_TIME,
+                is_personal=False
+            )
+            return
+        except TelegramBadRequest as e:
+            if not is_stale_file_id_error(e):
+                # "query is too old" va h.k. - file_id aybdor emas, so'rovga endi javob berib bo'lmaydi
+                logger.info(f"Inline answer failed {url}: {e}")
+                return
+            logger.warning(f"Inline cached answer failed {url}: {e}")
+            await handle_cached_send_failure(url, cached, e)
+            # Quyida keshda yo'qdek davom etadi
+
+    # Keshda yo'q - yuklangan fayl kesh chatiga yuboriladi (sozlanmagan bo'lsa botga yo'naltiriladi)
+    if not config.cache_chat_id:
+        await inline_query.answer([], cache_time=0, is_personal=True, button=hint)
+        return
+
+    # Bir URL uchun fon yuklash va link yozuvi TTL davomida bir marta
+    link_id = _inline_links.get(url)
+    if link_id is None:
+        if throttle and not throttle.allow_download(inline_query.from_user.id):
+            await inline_query.answer([], cache_time=0, is_personal=True, button=hint)
+            return
+        start_inline_fetch(inline_query.bot, url, platform)
+        link_id = await register_link(url, platform)
+        _inline_links.set(url, link_id)
+
+    platform_info = SUPPORTED_PLATFORMS[platform]
+    article = InlineQueryResultArticle(
+        id=f"fetch:{link_id}",
+        title=t("inline_fetch_title"),
+        description=t("inline_fetch_description"),
+        input_message_content=InputTextMessageContent(
+            message_text=f"{platform_info['emoji']} {platform_info['name']}\n{t('inline_fetching')}"
+        ),
+        # Tugma bo'lsa Telegram inline_message_id beradi (keyin media bilan almashtiriladi)
+        reply_markup=InlineKeyboardMarkup(inline_keyboard=[[
+            InlineKeyboardButton(text="📥 @tguzsavebot", url="https://t.me/tguzsavebot")
+        ]])
+    )
+    try:
+        await inline_query.answer([article], cache_time=0, is_personal=True, button=hint)
+    except TelegramBadRequest as e:
+        logger.info(f"Inline answer failed {url}: {e}")
+
+
+@router.chosen_inline_result(F.result_id.startswith("fetch:"))
+async def handle_chosen_inline_result(chosen: ChosenInlineResult, t):
+    """
+    "Yuklash uchun bosing" tanlanganda: fon yuklash tugashini kutib,
+    yuborilgan xabarni media bilan almashtirish (BotFather da inline feedback yoqilgan bo'lishi kerak)
+    """
+    if not chosen.inline_message_id:
+        return
+
+    link = await resolve_link(chosen.result_id.split(":", 1)[1])
+    cached = None
+    if link:
+        url, platform = link
+        cached = await get_cached_file(url) or await start_inline_fetch(chosen.bot, url, platform)
+
+    try:
+        if cached:
+            # Inline xabar bitta media bo'la oladi - albomning birinchi elementi
+            first = cached['items'][0] if cached.get('media_type') == 'group' else cached
+            platform_info = SUPPORTED_PLATFORMS.get(platform, {})
+            caption = f"{platform_info.get('emoji', '📥')} {platform_info.get('name', platform)} via @tguzsavebot"
+            media_type = first.get('media_type', 'video')
+            if media_type == 'audio':
+                media = InputMediaAudio(media=first['file_id'], caption=caption)
+            elif media_type == 'image':
+                media = InputMediaPhoto(media=first['file_id'], caption=caption)
+            else:
+                media = InputMediaVideo(media=first['file_id'], caption=caption, supports_streaming=True)
+            await chosen.bot.edit_message_media(inline_message_id=chosen.inline_message_id, media=media)
+            if cached.get('known'):
+                await cache_known_content(url, cached)
+        else:
+            await chosen.bot.edit_message_text(inline_message_id=chosen.inline_message_id, text=t("inline_fetch_failed"))
+    except TelegramBadRequest as e:
+        logger.warning(f"Inline message edit error: {e}")
+        if cached and is_stale_file_id_error(e):
+            await handle_cached_send_failure(url, cached, e)
 
 
 # ============== Callbacks ==============
 
 @router.callback_query(F.data.startswith("dl:"))
-async def handle_download(callback: CallbackQuery, state: FSMContext, t):
-    """Yuklash callback (optimized + FSM)"""
+async def handle_download(callback: CallbackQuery, state: FSMContext, t, throttle=None):
+    """Yuklash callback (dl:<action>:<link_id>)"""
+    if throttle and not throttle.allow_download(callback.from_user.id):
+        await callback.answer(t("rate_limit").replace("\\", ""), show_alert=True)
+        return
     await callback.answer()
     
-    action = callback.data.split(":")[1] if ":" in callback.data else "video"
+    parts = callback.data.split(":")
+    action = parts[1] if len(parts) > 1 else "video"
     
-    # Saqlangan URL (FSM)
-    data = await state.get_data()
-    url = data.get('url')
-    platform = data.get('platform', 'youtube')
+    if len(parts) > 2:
+        # Havola reestri (FSM siz)
+        link = await resolve_link(parts[2])
+        url, platform = link if link else (None, None)
+    else:
+        # Eski tugmalar (dl:video) - URL FSM da saqlangan
+        data = await state.get_data()
+        url = data.get('url')
+        platform = data.get('platform', 'youtube')
+        await state.clear()
     
     if not url:
         await safe_edit(
@@ -995,15 +1825,23 @@ async def handle_download(callback: CallbackQuery, state: FSMContext, t):
     # Xabarni o'chirish
     await safe_delete(callback.message)
     
-    # FSM tozalash
-    await state.clear()
-    
     # Media type va no_watermark
     no_watermark = (action == 'nowm')
     media_type = 'video' if action in ['video', 'nowm'] else 'audio'
     
-    # Yuklash
-    await process_download(callback.message, url, platform, media_type, t=t, no_watermark=no_watermark)
+    # Yuklash (alohida task - Cancel tugmasi bilan to'xtatiladi)
+    create_traced_task(process_download(callback.message, url, platform, media_type, t=t, no_watermark=no_watermark))
+
+
+@router.callback_query(F.data.startswith("job:cancel:"))
+async def handle_job_cancel(callback: CallbackQuery, t):
+    """Ishlayotgan yuklashni bekor qilish"""
+    job = get_job(callback.data.split(":", 2)[2])
+    if not job or job.chat_id != callback.message.chat.id:
+        await callback.answer(t("job_not_found"), show_alert=True)
+        return
+    job.cancel()
+    await callback.answer(t("job_cancelled").replace("\\", ""))
 
 
 @router.callback_query(F.data.startswith("q:"))
@@ -1179,23 +2017,94 @@ from aiohttp import web
 async def handle_health_check(request):
     return web.Response(text="I am alive!", status=200)
 
-async def start_web_server():
+async def handle_ready(request):
+    """Readiness: yt-dlp va extractorlar yuklangandan keyin"""
+    if not startup.ready:
+        return web.Response(text="warming up", status=503)
+    return web.Response(text="ready", status=200)
+
+async def handle_metrics(request):
+    from metrics import snapshot
+    return web.json_response(snapshot())
+
+async def handle_profile(request):
+    """/debug/profile?seconds=10 (X-Debug-Token sarlavhasi bilan) - collapsed stacklar"""
+    token = request.headers.get("X-Debug-Token", "")
+    if not config.debug_token or not hmac.compare_digest(token.encode(), config.debug_token.encode()):
+        raise web.HTTPNotFound()
+    try:
+        seconds = float(request.query.get("seconds", "10"))
+    except ValueError:
+        raise web.HTTPBadRequest(text="seconds")
+    seconds = max(1.0, min(seconds, config.profile_max_seconds))
+    stacks = await profile(seconds)
+    if stacks is None:
+        raise web.HTTPConflict(text="Profiling already in progress")
+    return web.Response(text=stacks)
+
+def create_web_app() -> web.Application:
+    """Health check (va webhook rejimida webhook handler) uchun aiohttp ilova"""
     app = web.Application()
     app.router.add_get('/', handle_health_check)
+    app.router.add_get('/ready', handle_ready)
+    app.router.add_get('/metrics', handle_metrics)
+    app.router.add_get('/debug/profile', handle_profile)
+    return app
+
+async def start_web_server(app: Optional[web.Application] = None) -> web.AppRunner:
+    app = app or create_web_app()
     runner = web.AppRunner(app)
     await runner.setup()
-    site = web.TCPSite(runner, '0.0.0.0', 7860)
+    site = web.TCPSite(runner, '0.0.0.0', config.web_port)
     await site.start()
-    logger.info("✅ Health check server started on port 7860")
+    logger.info(f"✅ Health check server started on port {config.web_port}")
+    return runner
+
+
+async def run_webhook(bot: Bot):
+    """
+    Webhook rejimi - health server bilan bir xil aiohttp ilovada.
+    Bir nechta replika load balancer ortida ishlashi mumkin (FSM storage umumiy).
+    """
+    from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+
+    app = create_web_app()
+    # X-Telegram-Bot-Api-Secret-Token sarlavhasi tekshiriladi
+    SimpleRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        secret_token=config.webhook_secret
+    ).register(app, path=config.webhook_path)
+    setup_application(app, dp, bot=bot)
+
+    runner = await start_web_server(app)
+
+    # Replikalar bir xil webhookni qayta-qayta o'rnatmasligi uchun
+    webhook_url = config.webhook_url.rstrip('/') + config.webhook_path
+    allowed_updates = dp.resolve_used_update_types()
+    info = await bot.get_webhook_info()
+    if info.url != webhook_url or set(info.allowed_updates or []) != set(allowed_updates):
+        await bot.set_webhook(
+            url=webhook_url,
+            secret_token=config.webhook_secret,
+            allowed_updates=allowed_updates
+        )
+        logger.info(f"🔗 Webhook o'rnatildi: {webhook_url}")
+
+    logger.info("🚀 Webhook rejimi ishga tushdi!")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
 
 
 async def main():
-    if not await system_startup_check():
-        logger.error("🛑 Startup checks failed! Exiting...")
-        return
+    # Loopni bloklagan kodni (masalan sinxron DNS yoki yt-dlp chaqiruvi) stack bilan ko'rsatadi
+    start_loop_monitor(config.loop_lag_threshold)
+
+    # yt-dlp importi va extractorlar - fon threadda, qolgan ishga tushirish bilan parallel
+    warm_task = asyncio.create_task(startup.phase("warm_downloader", asyncio.to_thread(warm_downloader)))
 
-    await init_db()
-    
     # Session creation (Singleton)
     session = IPv4Session()
     # IPv4Session o'zi ichida connector yaratadi (create_session override qilingan bot tomondan chaqiriladi)
@@ -1206,34 +2115,68 @@ async def main():
     # Middlewares
     from middlewares import SubscriptionMiddleware, ThrottlingMiddleware
     from i18n_middleware import I18nMiddleware
-    dp.update.middleware(ThrottlingMiddleware(limit=0.5))
+    if config.record_updates:
+        from update_recorder import UpdateRecorder
+        dp.update.outer_middleware(UpdateRecorder(config.record_updates, config.record_updates_limit))
+    if config.trace_slow_seconds >= 0:
+        from middlewares import TracingMiddleware
+        dp.update.outer_middleware(TracingMiddleware())
+    dp.update.middleware(ThrottlingMiddleware())
     dp.update.middleware(SubscriptionMiddleware())
     dp.update.middleware(I18nMiddleware())
-    
-    # Web server start
-    await start_web_server()
 
-    # Commands setup
-    await bot.set_my_commands([
-        BotCommand(command="start", description="Boshlash"),
-        BotCommand(command="settings", description="Sozlamalar"),
-        BotCommand(command="lang", description="Tilni o'zgartirish"),
-        BotCommand(command="help", description="Yordam"),
-    ])
-    
-    logger.info("🚀 Bot ishga tushdi!")
-    
     # Error Handler
     @dp.error()
     async def global_error_handler(event: ErrorEvent):
         logger.critical(f"Global error: {event.exception}", exc_info=True)
 
-    # Start polling
+    # Bir-biriga bog'liq bo'lmagan qadamlar parallel: DB ping, indexlar, buyruqlar
+    # return_exceptions - bitta qadam xatosi ham quyidagi "Exiting" yo'lidan o'tsin
+    results = await asyncio.gather(
+        startup.phase("startup_check", system_startup_check()),
+        startup.phase("init_db", init_db()),
+        startup.phase("set_commands", bot.set_my_commands([
+            BotCommand(command="start", description="Boshlash"),
+            BotCommand(command="settings", description="Sozlamalar"),
+            BotCommand(command="lang", description="Tilni o'zgartirish"),
+            BotCommand(command="help", description="Yordam"),
+        ])),
+        return_exceptions=True
+    )
+    checks_ok = results[0] is True
+    for name, result in zip(("startup_check", "init_db", "set_commands"), results):
+        if isinstance(result, BaseException):
+            logger.error(f"❌ Startup step {name} failed: {result!r}")
+            checks_ok = False
+    if not checks_ok:
+        logger.error("🛑 Startup checks failed! Exiting...")
+        return
+
+    # Telegramga yuborish workerlari (yuklashdan alohida)
+    start_upload_workers()
+
+    # Mashhur keshlangan fayllarni TTL tugashidan oldin yangilash
+    from cache_warmer import run_cache_warmer
+    asyncio.create_task(run_cache_warmer(bot))
+
+    # /ready - yt-dlp isitilgach (updatelar undan oldin ham qabul qilinadi)
+    asyncio.create_task(startup.ready_when(warm_task))
+
+    if config.run_mode == "webhook":
+        await run_webhook(bot)
+        return
+
+    # Web server start
+    await start_web_server()
+    
+    logger.info("🚀 Bot ishga tushdi!")
+
+    # Start polling (oldin o'rnatilgan webhook polling bilan to'qnashmasligi uchun)
+    await bot.delete_webhook()
     await dp.start_polling(bot)
 
 
 if __name__ == "__main__":
-    logging.basicConfig(level=logging.INFO, stream=sys.stdout)
     try:
         if sys.platform == 'win32':
              asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
@@ -0,0 +1,90 @@
+"""
+File ID keshini isitish - mashhur yozuvlar TTL tugashidan oldin tekshiriladi va uzaytiriladi
+Yozuvlar faqat yoshi bo'yicha emas, so'rovlar soni (hits) bo'yicha saqlanadi
+"""
+
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest
+
+from config import config
+from database import get_warm_candidates, touch_cached_file, invalidate_cached_file
+from metrics import inc
+
+logger = logging.getLogger(__name__)
+
+# TTL ning oxirgi shuncha qismida bo'lgan yozuvlar yangilanadi
+WARM_WINDOW = 0.25
+# Shu muddat ichida so'ralmagan yozuvlar isitilmaydi (eskirgan mashhurlik)
+ACTIVE_WINDOW = timedelta(days=7)
+CHECK_DELAY = 0.05  # get_file chaqiruvlari orasida (flood limit)
+
+
+async def validate_file_id(bot: Bot, file_id: str) -> Optional[bool]:
+    """
+    file_id hali ishlaydimi: True/False, aniqlab bo'lmasa None.
+    20MB dan katta fayllar uchun get_file "file is too big" qaytaradi - bu ham yaroqli degani.
+    """
+    try:
+        await bot.get_file(file_id)
+        return True
+    except TelegramBadRequest as e:
+        if "too big" in str(e).lower():
+            return True
+        return False
+    except Exception as e:
+        logger.debug(f"get_file error: {e}")
+        return None
+
+
+async def warm_entry(bot: Bot, entry: Dict[str, Any]) -> Optional[bool]:
+    """Bitta yozuvni tekshirish: yaroqli - uzaytirish, yaroqsiz - o'chirish"""
+    file_ids = [item['file_id'] for item in entry.get('items') or []] or [entry['file_id']]
+    for file_id in file_ids:
+        valid = await validate_file_id(bot, file_id)
+        if valid is None:
+            return None
+        if not valid:
+            await invalidate_cached_file(entry['url'], entry['file_id'])
+            inc("file_cache_warm_invalidated")
+            return False
+    await touch_cached_file(entry['url'])
+    inc("file_cache_warm_refreshed")
+    return True
+
+
+async def warm_cache_once(bot: Bot) -> Dict[str, int]:
+    """Eng mashhur N ta, tez orada o'chadigan yozuvni qayta tekshirish"""
+    now = datetime.now()
+    older_than = now - timedelta(seconds=config.file_cache_ttl * (1 - WARM_WINDOW))
+    entries = await get_warm_candidates(
+        older_than, now - ACTIVE_WINDOW, config.cache_warm_top_n, config.cache_warm_min_hits
+    )
+
+    stats = {"checked": len(entries), "refreshed": 0, "invalidated": 0}
+    for entry in entries:
+        valid = await warm_entry(bot, entry)
+        if valid:
+            stats["refreshed"] += 1
+        elif valid is False:
+            stats["invalidated"] += 1
+        await asyncio.sleep(CHECK_DELAY)
+    return stats
+
+
+async def run_cache_warmer(bot: Bot):
+    """Fon vazifasi - har CACHE_WARM_INTERVAL sekundda"""
+    while True:
+        await asyncio.sleep(config.cache_warm_interval)
+        try:
+            stats = await warm_cache_once(bot)
+            if stats["checked"]:
+                logger.info(f"🔥 Kesh isitildi: {stats}")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Cache warmer error: {e}")
@@ -4,6 +4,7 @@ YouTube, Instagram, TikTok va boshqa platformalardan yuklab beruvchi bot
 """
 
 import os
+import hashlib
 import logging
 from dataclasses import dataclass
 from typing import List
@@ -34,7 +35,78 @@ class BotConfig:
     # Timeouts
     download_timeout: int = 600       # 10 daqiqa (katta fayllar uchun)
     request_timeout: int = 120
-    
+    spotify_timeout: int = int(os.getenv("SPOTIFY_TIMEOUT", "120"))
+
+    # Parallel ishlar
+    spotify_concurrency: int = int(os.getenv("SPOTIFY_CONCURRENCY", "3"))
+    download_workers: int = int(os.getenv("DOWNLOAD_WORKERS", "16"))
+    download_concurrency: int = int(os.getenv("DOWNLOAD_CONCURRENCY", "100"))  # Bir vaqtdagi yuklashlar
+    upload_workers: int = int(os.getenv("UPLOAD_WORKERS", "8"))  # Telegramga bir vaqtdagi yuborishlar
+    upload_queue_size: int = int(os.getenv("UPLOAD_QUEUE_SIZE", "32"))  # To'lsa yuklashlar kutadi
+    batch_max_items: int = int(os.getenv("BATCH_MAX_ITEMS", "10"))  # Bir xabardagi havola/playlist elementlari
+
+    # To'g'ridan-to'g'ri fayllar HTTP Range bilan bir nechta ulanishda: bitta fayl uchun ulanishlar,
+    # bitta host uchun umumiy chegara; RANGE_MIN_MB dan kichik fayllar bitta oqimda
+    range_connections: int = int(os.getenv("RANGE_CONNECTIONS", "4"))
+    range_host_limit: int = int(os.getenv("RANGE_HOST_LIMIT", "16"))
+    range_min_mb: float = float(os.getenv("RANGE_MIN_MB", "4"))
+    # Kichik to'g'ridan-to'g'ri fayllar (Pinterest rasmlari, TikTok no-watermark) Telegramga URL
+    # sifatida yuboriladi - Telegram o'zi yuklaydi; 0 - o'chiq
+    direct_delivery: bool = os.getenv("DIRECT_DELIVERY", "1") != "0"
+
+    # File ID kesh: sliding TTL (har murojaatda yangilanadi) va mashhur yozuvlarni oldindan yangilash
+    file_cache_ttl: int = int(os.getenv("FILE_CACHE_TTL", "172800"))  # 48 soat
+    cache_warm_interval: int = int(os.getenv("CACHE_WARM_INTERVAL", "3600"))
+    cache_warm_top_n: int = int(os.getenv("CACHE_WARM_TOP_N", "500"))
+    cache_warm_min_hits: int = int(os.getenv("CACHE_WARM_MIN_HITS", "2"))
+
+    # Inline rejim: keshda yo'q fayllar shu chatga (yopiq kanal) yuklanib file_id olinadi
+    cache_chat_id: int = int(os.getenv("CACHE_CHAT_ID", "0"))
+
+    # Progress xabarlari: umumiy tahrir budjeti (sekundiga) va bitta xabar uchun minimal oraliq
+    progress_edit_rate: float = float(os.getenv("PROGRESS_EDIT_RATE", "20"))
+    progress_min_interval: float = float(os.getenv("PROGRESS_MIN_INTERVAL", "2"))
+
+    # Throttling (token bucket): rate - sekundiga (0 - cheklovsiz), burst - ketma-ket ruxsat
+    throttle_message_rate: float = float(os.getenv("THROTTLE_MESSAGE_RATE", "1"))
+    throttle_message_burst: float = float(os.getenv("THROTTLE_MESSAGE_BURST", "5"))
+    throttle_callback_rate: float = float(os.getenv("THROTTLE_CALLBACK_RATE", "2"))
+    throttle_callback_burst: float = float(os.getenv("THROTTLE_CALLBACK_BURST", "8"))
+    throttle_download_rate: float = float(os.getenv("THROTTLE_DOWNLOAD_RATE", "0.1"))  # 6 ta/daqiqa
+    throttle_download_burst: float = float(os.getenv("THROTTLE_DOWNLOAD_BURST", "5"))
+
+    # Ishga tushirish rejimi: "polling" (bitta jarayon) yoki "webhook" (N ta replika)
+    run_mode: str = os.getenv("RUN_MODE", "polling").lower()
+    web_port: int = int(os.getenv("PORT", "7860"))
+    webhook_url: str = os.getenv("WEBHOOK_URL", "")        # Tashqi bazaviy URL (https://...)
+    webhook_path: str = os.getenv("WEBHOOK_PATH", "/webhook")
+    webhook_secret: str = os.getenv("WEBHOOK_SECRET", "")
+
+    # FSM storage: "memory", "mongo" yoki "redis" (replikalar uchun umumiy bo'lishi kerak)
+    fsm_storage: str = os.getenv("FSM_STORAGE", "").lower()
+    redis_url: str = os.getenv("REDIS_URL", "")
+    fsm_state_ttl: int = int(os.getenv("FSM_STATE_TTL", "86400"))  # Tashlab ketilgan holatlar (1 kun)
+
+    # Updatelarni anonim yozib olish (benchmarks/replay.py uchun), bo'sh - o'chiq
+    record_updates: str = os.getenv("RECORD_UPDATES", "")
+    record_updates_limit: int = int(os.getenv("RECORD_UPDATES_LIMIT", "100000"))
+
+    # Logging: LOG_FORMAT=json|text, LOG_SAMPLE="downloader=0.1" (INFO yozuvlar ulushi),
+    # bir xil xato LOG_ERROR_INTERVAL sekundda bir marta
+    log_level: str = os.getenv("LOG_LEVEL", "INFO")
+    log_format: str = os.getenv("LOG_FORMAT", "text").lower()
+    log_sample: str = os.getenv("LOG_SAMPLE", "")
+    log_error_interval: float = float(os.getenv("LOG_ERROR_INTERVAL", "10"))
+
+    # Diagnostika: event loop shu vaqtdan (sekund) ko'p bloklansa stack logga yoziladi, 0 - o'chiq
+    loop_lag_threshold: float = float(os.getenv("LOOP_LAG_THRESHOLD", "0.5"))
+    profile_max_seconds: int = int(os.getenv("PROFILE_MAX_SECONDS", "60"))
+    # Tracing: update shu vaqtdan (sekund) uzoq davom etsa bosqichlari JSON qator bo'lib logga
+    # yoziladi; 0 - hammasi, manfiy - tracing o'chiq
+    trace_slow_seconds: float = float(os.getenv("TRACE_SLOW_SECONDS", "10"))
+    # Health serverdagi /debug/profile uchun token (bo'sh - endpoint o'chiq)
+    debug_token: str = os.getenv("DEBUG_TOKEN", "")
+
     # Sifat - MAKSIMAL
     default_video_quality: str = "1080p"  # Eng yuqori
     default_audio_quality: str = "320k"   # Eng yuqori
@@ -46,112 +118,142 @@ class BotConfig:
         
         if not self.token:
             raise ValueError("❌ BOT_TOKEN topilmadi! .env faylini tekshiring.")
-        
+
+        if self.run_mode not in ("polling", "webhook"):
+            raise ValueError(f"❌ Noto'g'ri RUN_MODE: {self.run_mode} (polling yoki webhook)")
+
+        if self.run_mode == "webhook":
+            if not self.webhook_url:
+                raise ValueError("❌ RUN_MODE=webhook uchun WEBHOOK_URL kerak!")
+            if not self.webhook_secret:
+                # Barcha replikalarda bir xil bo'lishi uchun tokendan hosil qilinadi
+                self.webhook_secret = hashlib.sha256(self.token.encode()).hexdigest()[:32]
+
+        if not self.fsm_storage:
+            # Holat restartlardan keyin ham saqlanadi va replikalar o'rtasida umumiy
+            self.fsm_storage = "mongo"
+
         logger.info("✅ Config yuklandi")
 
 
 # Qo'llab-quvvatlanadigan platformalar
+# hosts: hostname -> path regex (None - istalgan yo'l). Subdomenlar (www., m., vm.) ota domen
+# bo'yicha topiladi; marshrutlash platforms.py dagi reestr orqali.
+# fragments: HLS/DASH fragmentlarini parallel yuklash soni (yt-dlp concurrent_fragment_downloads)
 SUPPORTED_PLATFORMS = {
     'youtube': {
         'name': 'YouTube',
         'emoji': '🎬',
-        'patterns': ['youtube.com', 'youtu.be', 'youtube.com/shorts'],
+        'hosts': {'youtube.com': None, 'youtu.be': None},
+        'fragments': 4,
         'supports': ['video', 'audio', 'thumbnail']
     },
     'instagram': {
         'name': 'Instagram',
         'emoji': '📸',
-        'patterns': ['instagram.com/p/', 'instagram.com/reel/', 'instagram.com/stories/'],
+        'hosts': {'instagram.com': None},
+        'fragments': 4,
         'supports': ['video', 'image']
     },
     'tiktok': {
         'name': 'TikTok',
         'emoji': '🎵',
-        'patterns': ['tiktok.com', 'vm.tiktok.com'],
+        'hosts': {'tiktok.com': None},
         'supports': ['video', 'audio']
     },
     'twitter': {
         'name': 'Twitter/X',
         'emoji': '🐦',
-        'patterns': ['twitter.com', 'x.com'],
+        'hosts': {'twitter.com': None, 'x.com': None},
+        'fragments': 4,
         'supports': ['video', 'image']
     },
     'facebook': {
         'name': 'Facebook',
         'emoji': '📘',
-        'patterns': ['facebook.com', 'fb.watch'],
+        'hosts': {'facebook.com': None, 'fb.watch': None},
+        'fragments': 4,
         'supports': ['video']
     },
     'pinterest': {
         'name': 'Pinterest',
         'emoji': '📌',
-        'patterns': ['pinterest.com', 'pin.it'],
+        'hosts': {'pinterest.com': None, 'pin.it': None},
         'supports': ['image']
     },
     'spotify': {
         'name': 'Spotify',
         'emoji': '🎧',
-        'patterns': ['open.spotify.com/track', 'spotify.com/track'],
+        # Faqat treklar (download_spotify bitta trek yuklaydi; albom/playlist avval ham qo'llanmagan)
+        'hosts': {'spotify.com': r'^/(?:intl-[a-z]+/)?track/'},
         'supports': ['audio']
     },
     'soundcloud': {
         'name': 'SoundCloud',
         'emoji': '🔊',
-        'patterns': ['soundcloud.com'],
+        'hosts': {'soundcloud.com': None},
+        'fragments': 4,
         'supports': ['audio']
     },
     'vk': {
         'name': 'VK',
         'emoji': '📱',
-        'patterns': ['vk.com/video', 'vk.com/clip', 'vk.com/music'],
+        'hosts': {'vk.com': r'^/(?:video|clip|music)'},
+        'fragments': 8,
         'supports': ['video', 'audio']
     },
     'likee': {
         'name': 'Likee',
         'emoji': '🎭',
-        'patterns': ['likee.video', 'l.likee.video', 'likee.com'],
+        'hosts': {'likee.video': None, 'likee.com': None},
         'supports': ['video']
     },
     'dailymotion': {
         'name': 'Dailymotion',
         'emoji': '📺',
-        'patterns': ['dailymotion.com', 'dai.ly'],
+        'hosts': {'dailymotion.com': None, 'dai.ly': None},
+        'fragments': 8,
         'supports': ['video']
     },
     'vimeo': {
         'name': 'Vimeo',
         'emoji': '🎥',
-        'patterns': ['vimeo.com'],
+        'hosts': {'vimeo.com': None},
+        'fragments': 8,
         'supports': ['video']
     },
     'reddit': {
         'name': 'Reddit',
         'emoji': '🔴',
-        'patterns': ['reddit.com', 'redd.it', 'v.redd.it'],
+        'hosts': {'reddit.com': None, 'redd.it': None},
+        'fragments': 4,
         'supports': ['video', 'image']
     },
     'tumblr': {
         'name': 'Tumblr',
         'emoji': '📝',
-        'patterns': ['tumblr.com'],
+        'hosts': {'tumblr.com': None},
         'supports': ['video', 'image']
     },
     'twitch': {
         'name': 'Twitch',
         'emoji': '💜',
-        'patterns': ['twitch.tv/clip', 'clips.twitch.tv'],
+        'hosts': {'twitch.tv': r'^/(?:[^/]+/)?clip/', 'clips.twitch.tv': None},
+        'fragments': 8,
         'supports': ['video']
     },
     'okru': {
         'name': 'OK.ru',
         'emoji': '🟠',
-        'patterns': ['ok.ru', 'odnoklassniki.ru'],
+        'hosts': {'ok.ru': None, 'odnoklassniki.ru': None},
+        'fragments': 8,
         'supports': ['video']
     },
     'rutube': {
         'name': 'Rutube',
         'emoji': '🔵',
-        'patterns': ['rutube.ru'],
+        'hosts': {'rutube.ru': None},
+        'fragments': 8,
         'supports': ['video']
     }
 }
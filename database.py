@@ -1,10 +1,15 @@
 
+import asyncio
 import logging
 from datetime import datetime, timedelta
 from typing import Dict, List, Tuple
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument
+from pymongo.errors import OperationFailure
 
 from config import config
+from metrics import inc
+from tracing import traced
 
 # Logger setup
 logger = logging.getLogger(__name__)
@@ -14,24 +19,44 @@ client = AsyncIOMotorClient(config.mongo_uri)
 db = client[config.db_name]
 users_col = db['users']
 settings_col = db['settings']
+fsm_col = db['fsm']  # FSM holatlari (replikalar uchun umumiy)
 
 async def init_db():
-    """Ma'lumotlar bazasini tekshirish (MongoDB da o'zi avtomatik)"""
-    try:
-        # Ping the database
-        await client.admin.command('ping')
-        logger.info("✅ MongoDB ga ulanish muvaffaqiyatli!")
-        
-        # Index yaratish (tez ishlashi uchun)
-        await users_col.create_index("user_id", unique=True)
-        await settings_col.create_index("user_id", unique=True)
-        await downloads_col.create_index("url", unique=True)
-        # TTL Index - 48 soatdan keyin keshni tozalash
-        await downloads_col.create_index("timestamp", expireAfterSeconds=172800)
-        
-    except Exception as e:
-        logger.error(f"❌ MongoDB ga ulanishda xatolik: {e}")
+    """Indexlarni yaratish (parallel; ulanish system_startup_check da tekshiriladi)"""
 
+    async def ttl_index():
+        # TTL Index - oxirgi murojaatdan 48 soat o'tgach keshni tozalash (sliding)
+        try:
+            await downloads_col.create_index("timestamp", expireAfterSeconds=config.file_cache_ttl)
+        except OperationFailure:
+            # FILE_CACHE_TTL o'zgargan - mavjud indexni yangilash
+            await db.command("collMod", "downloads", index={
+                "keyPattern": {"timestamp": 1},
+                "expireAfterSeconds": config.file_cache_ttl
+            })
+
+    results = await asyncio.gather(
+        users_col.create_index("user_id", unique=True),
+        settings_col.create_index("user_id", unique=True),
+        downloads_col.create_index("url", unique=True),
+        ttl_index(),
+        # Kesh isituvchi uchun - eng ko'p so'ralganlar
+        downloads_col.create_index([("hits", -1)]),
+        # Bir xil kontent (boshqa URL) uchun file_id qidirish
+        downloads_col.create_index([("content_hash", 1), ("media_type", 1)], sparse=True),
+        # TTL Index - tashlab ketilgan FSM holatlari (expires_at vaqtida o'chadi)
+        fsm_col.create_index("expires_at", expireAfterSeconds=0),
+        # TTL Index - eski tugmalar uchun havolalar (24 soat)
+        links_col.create_index("created_at", expireAfterSeconds=86400),
+        return_exceptions=True
+    )
+    errors = [r for r in results if isinstance(r, Exception)]
+    if errors:
+        logger.error(f"❌ Index yaratishda xatolik: {errors[0]} ({len(errors)} ta)")
+    else:
+        logger.info("✅ MongoDB indexlari tayyor")
+
+@traced("db.add_user")
 async def add_user(user_id: int, username: str = None, full_name: str = None):
     """Yangi foydalanuvchi qo'shish yoki yangilash"""
     try:
@@ -71,6 +96,7 @@ async def add_user(user_id: int, username: str = None, full_name: str = None):
     except Exception as e:
         logger.error(f"Error adding user {user_id}: {e}")
 
+@traced("db.get_settings")
 async def get_settings(user_id: int) -> Dict:
     """Foydalanuvchi sozlamalarini olish"""
     try:
@@ -84,6 +110,7 @@ async def get_settings(user_id: int) -> Dict:
         logger.error(f"Error getting settings for {user_id}: {e}")
         return {"video_quality": "720p", "audio_quality": "128k"}
 
+@traced("db.update_settings")
 async def update_settings(user_id: int, key: str, value: str):
     """Sozlamalarni yangilash"""
     try:
@@ -95,19 +122,23 @@ async def update_settings(user_id: int, key: str, value: str):
     except Exception as e:
         logger.error(f"Error updating settings for {user_id}: {e}")
 
+@traced("db.get_users_count")
 async def get_users_count() -> int:
     """Jami foydalanuvchilar soni"""
     return await users_col.count_documents({})
 
+@traced("db.get_active_users_count")
 async def get_active_users_count() -> int:
     """Aktiv foydalanuvchilar soni"""
     return await users_col.count_documents({"is_active": True})
 
+@traced("db.get_new_users_today")
 async def get_new_users_today() -> int:
     """Bugungi yangi foydalanuvchilar"""
     today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
     return await users_col.count_documents({"joined_date": {"$gte": today}})
 
+@traced("db.get_all_users")
 async def get_all_users(active_only: bool = False) -> List[int]:
     """Barcha user ID larini olish (broadcast uchun)"""
     query = {"is_active": True} if active_only else {}
@@ -116,6 +147,7 @@ async def get_all_users(active_only: bool = False) -> List[int]:
     users = await cursor.to_list(length=None)
     return [user['user_id'] for user in users]
 
+@traced("db.get_last_users")
 async def get_last_users(limit: int = 10) -> List[Tuple[int, str, str, str]]:
     """Oxirgi qo'shilgan foydalanuvchilar"""
     cursor = users_col.find().sort("joined_date", -1).limit(limit)
@@ -131,6 +163,7 @@ async def get_last_users(limit: int = 10) -> List[Tuple[int, str, str, str]]:
         ))
     return result
 
+@traced("db.set_user_active")
 async def set_user_active(user_id: int, is_active: bool):
     """User statusini o'zgartirish (bloklaganda)"""
     try:
@@ -141,6 +174,7 @@ async def set_user_active(user_id: int, is_active: bool):
     except Exception as e:
         logger.error(f"Error setting user {user_id} active={is_active}: {e}")
 
+@traced("db.set_user_language")
 async def set_user_language(user_id: int, lang: str):
     """Foydalanuvchi tilini o'zgartirish"""
     await users_col.update_one(
@@ -149,6 +183,7 @@ async def set_user_language(user_id: int, lang: str):
         upsert=True
     )
 
+@traced("db.get_user_language")
 async def get_user_language(user_id: int) -> str:
     """Foydalanuvchi tilini olish"""
     user = await users_col.find_one({"user_id": user_id})
@@ -160,6 +195,7 @@ async def get_user_language(user_id: int) -> str:
 
 channels_col = db['channels']
 
+@traced("db.add_channel")
 async def add_channel(channel_id: int, title: str, username: str, invite_link: str):
     """Kanal qo'shish (Majburiy obuna uchun)"""
     try:
@@ -181,6 +217,7 @@ async def add_channel(channel_id: int, title: str, username: str, invite_link: s
         logger.error(f"Error adding channel {channel_id}: {e}")
         return False
 
+@traced("db.remove_channel")
 async def remove_channel(channel_id: int):
     """Kanalni o'chirish"""
     try:
@@ -197,6 +234,7 @@ _channels_cache = None
 _channels_cache_time = 0
 CACHE_TTL = 60  # seconds
 
+@traced("db.get_channels")
 async def get_channels() -> List[Dict]:
     """Barcha kanallarni olish (Cached)"""
     global _channels_cache, _channels_cache_time
@@ -221,30 +259,169 @@ async def get_channels() -> List[Dict]:
 
 downloads_col = db['downloads']
 
-async def add_cached_file(url: str, file_id: str, media_type: str):
+@traced("db.add_cached_file")
+async def add_cached_file(url: str, file_id: str, media_type: str, content_hash: str = ""):
     """Fayl ID sini keshlab qo'yish"""
+    try:
+        fields = {
+            "file_id": file_id,
+            "media_type": media_type,
+            "send_failures": 0,
+            "timestamp": datetime.now()
+        }
+        if content_hash:
+            fields["content_hash"] = content_hash
+        await downloads_col.update_one(
+            {"url": url},
+            {"$set": fields, "$unset": {"items": ""}},
+            upsert=True
+        )
+    except Exception as e:
+        logger.error(f"Error caching file {url}: {e}")
+
+@traced("db.add_cached_group")
+async def add_cached_group(url: str, items: List[Dict]):
+    """Albom (carousel) file_id larini keshlash - [{"file_id", "media_type"}, ...]"""
     try:
         await downloads_col.update_one(
             {"url": url},
             {"$set": {
-                "file_id": file_id,
-                "media_type": media_type,
+                "file_id": items[0]["file_id"],
+                "media_type": "group",
+                "items": items,
+                "send_failures": 0,
                 "timestamp": datetime.now()
             }},
             upsert=True
         )
     except Exception as e:
-        logger.error(f"Error caching file {url}: {e}")
+        logger.error(f"Error caching group {url}: {e}")
 
+@traced("db.get_cached_file")
 async def get_cached_file(url: str) -> Dict:
-    """Keshlangan faylni olish"""
+    """
+    Keshlangan faylni olish.
+    Har bir topilishda hits oshadi va timestamp yangilanadi (sliding TTL) - bitta so'rovda.
+    """
     try:
-        data = await downloads_col.find_one({"url": url})
-        if data:
-            # 24 soatdan oshgan bo'lsa, eskirgan deb hisoblash mumkin (ixtiyoriy)
-            # Lekin file_id lar odatda uzoq vaqt ishlaydi
-            return data
-        return None
+        now = datetime.now()
+        data = await downloads_col.find_one_and_update(
+            {"url": url},
+            {"$inc": {"hits": 1}, "$set": {"timestamp": now, "last_hit": now}},
+            return_document=ReturnDocument.AFTER
+        )
+        inc("file_cache_hits" if data else "file_cache_misses")
+        return data
     except Exception as e:
         logger.error(f"Error getting cached file {url}: {e}")
         return None
+
+@traced("db.get_cached_by_hash")
+async def get_cached_by_hash(content_hash: str, media_type: str) -> Dict:
+    """Bir xil kontentli (boshqa URL dan yuklangan) keshlangan fayl"""
+    try:
+        return await downloads_col.find_one({"content_hash": content_hash, "media_type": media_type})
+    except Exception as e:
+        logger.error(f"Error getting cached hash {content_hash}: {e}")
+        return None
+
+@traced("db.get_warm_candidates")
+async def get_warm_candidates(older_than: datetime, active_since: datetime, limit: int, min_hits: int) -> List[Dict]:
+    """Tez orada o'chadigan, lekin hali so'ralayotgan eng mashhur yozuvlar"""
+    cursor = downloads_col.find(
+        {
+            "timestamp": {"$lt": older_than},
+            "last_hit": {"$gte": active_since},
+            "hits": {"$gte": min_hits},
+        },
+        {"url": 1, "file_id": 1, "media_type": 1, "items": 1, "hits": 1}
+    ).sort("hits", -1).limit(limit)
+    return await cursor.to_list(length=limit)
+
+@traced("db.touch_cached_file")
+async def touch_cached_file(url: str):
+    """Yozuv muddatini uzaytirish (hits o'zgarmaydi)"""
+    try:
+        await downloads_col.update_one({"url": url}, {"$set": {"timestamp": datetime.now()}})
+    except Exception as e:
+        logger.error(f"Error touching cached file {url}: {e}")
+
+@traced("db.invalidate_cached_file")
+async def invalidate_cached_file(url: str, file_id: str) -> bool:
+    """
+    Yaroqsiz file_id ni keshdan o'chirish.
+    Faqat shu file_id hali ham turgan bo'lsa o'chiriladi - parallel qayta yozilgan yangi yozuvga tegmaydi.
+    """
+    try:
+        res = await downloads_col.delete_one({"url": url, "file_id": file_id})
+        if res.deleted_count:
+            inc("file_cache_invalidated")
+            logger.info(f"Cache invalidated for {url}")
+        return bool(res.deleted_count)
+    except Exception as e:
+        logger.error(f"Error invalidating cached file {url}: {e}")
+        return False
+
+@traced("db.invalidate_file_id")
+async def invalidate_file_id(file_id: str) -> int:
+    """
+    Telegram rad etgan file_id ni barcha URL lardan o'chirish.
+    Kontent dedup bir file_id ni bir nechta URL ga yozadi - faqat bittasini o'chirish yetmaydi.
+    """
+    try:
+        res = await downloads_col.delete_many({"file_id": file_id})
+        if res.deleted_count:
+            inc("file_cache_invalidated", res.deleted_count)
+            logger.info(f"Cache invalidated for file_id ({res.deleted_count} URLs)")
+        return res.deleted_count
+    except Exception as e:
+        logger.error(f"Error invalidating file_id: {e}")
+        return 0
+
+@traced("db.record_cached_send_failure")
+async def record_cached_send_failure(url: str, file_id: str, max_failures: int) -> bool:
+    """
+    Keshdan yuborishdagi vaqtinchalik xatoni hisoblash.
+    max_failures ga yetganda yozuv o'chiriladi (True qaytaradi).
+    """
+    inc("file_cache_send_failures")
+    try:
+        doc = await downloads_col.find_one_and_update(
+            {"url": url, "file_id": file_id},
+            {"$inc": {"send_failures": 1}},
+            projection={"send_failures": 1},
+            return_document=ReturnDocument.AFTER
+        )
+    except Exception as e:
+        logger.error(f"Error recording send failure {url}: {e}")
+        return False
+    if doc and doc.get("send_failures", 0) >= max_failures:
+        return await invalidate_cached_file(url, file_id)
+    return False
+
+
+# ============== Link Registry (callback payloadlar uchun) ==============
+
+links_col = db['links']
+
+@traced("db.save_link")
+async def save_link(link_id: str, url: str, platform: str):
+    """Qisqa ID -> URL yozuvini saqlash"""
+    try:
+        await links_col.insert_one({
+            "_id": link_id,
+            "url": url,
+            "platform": platform,
+            "created_at": datetime.now()
+        })
+    except Exception as e:
+        logger.error(f"Error saving link {link_id}: {e}")
+
+@traced("db.get_link")
+async def get_link(link_id: str) -> Dict:
+    """Qisqa ID bo'yicha URL ni olish"""
+    try:
+        return await links_col.find_one({"_id": link_id})
+    except Exception as e:
+        logger.error(f"Error getting link {link_id}: {e}")
+        return None
@@ -0,0 +1,240 @@
+"""
+Umumiy DNS qatlami - Google/Cloudflare DNS orqali, keshlangan
+Hugging Face Spaces da tizim DNS i ishonchsiz bo'lgani uchun
+
+- In-memory TTL kesh (yozuv TTL i bo'yicha, min/max bilan cheklangan)
+- Negativ kesh (topilmagan domenlar qisqa muddatga eslab qolinadi)
+- Bir xil domen uchun parallel so'rovlar birlashtiriladi (dedup)
+- Ham patch qilingan socket.getaddrinfo, ham aiohttp resolverlari ishlatadi
+"""
+
+import asyncio
+import socket
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from aiohttp.abc import AbstractResolver
+
+from cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+NAMESERVERS = ['8.8.8.8', '1.1.1.1']
+MIN_TTL = 30
+MAX_TTL = 600
+NEGATIVE_TTL = 30
+
+original_getaddrinfo = socket.getaddrinfo
+
+
+def _is_ip(host: str) -> bool:
+    for family in (socket.AF_INET, socket.AF_INET6):
+        try:
+            socket.inet_pton(family, host)
+            return True
+        except (OSError, ValueError):
+            pass
+    return False
+
+
+class DNSCache:
+    """A-record resolver: kesh + negativ kesh + so'rovlarni birlashtirish"""
+
+    def __init__(self, nameservers: List[str] = NAMESERVERS, maxsize: int = 4096):
+        self.nameservers = nameservers
+        # host -> [ip, ...]; bo'sh ro'yxat = negativ yozuv
+        self._cache = TTLCache(maxsize=maxsize, ttl=MAX_TTL)
+        self._lock = threading.Lock()
+        self._inflight_sync: Dict[str, threading.Event] = {}
+        self._inflight_async: Dict[str, asyncio.Future] = {}
+        self._sync_resolver = None
+        self._async_resolver = None
+        self.stats = {'hits': 0, 'misses': 0, 'negative_hits': 0, 'errors': 0}
+
+    # --- Backends ---
+
+    def _get_sync_resolver(self):
+        if self._sync_resolver is None:
+            import dns.resolver
+            resolver = dns.resolver.Resolver(configure=False)
+            resolver.nameservers = self.nameservers
+            resolver.lifetime = 5
+            self._sync_resolver = resolver
+        return self._sync_resolver
+
+    def _query_sync(self, host: str) -> Tuple[List[str], int]:
+        # TCP ni yoqish (UDP bloklangan bo'lishi mumkin)
+        answers = self._get_sync_resolver().resolve(host, 'A', tcp=True)
+        return [r.to_text() for r in answers], answers.rrset.ttl
+
+    async def _query_async(self, host: str) -> Tuple[List[str], int]:
+        try:
+            import aiodns
+        except ImportError:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, self._query_sync, host)
+
+        if self._async_resolver is None:
+            self._async_resolver = aiodns.DNSResolver(nameservers=self.nameservers)
+        resolver = self._async_resolver
+        if not hasattr(resolver, 'query_dns'):
+            # aiodns < 4 (pycares < 5) - query() hali eskirmagan
+            answers = await resolver.query(host, 'A')
+            ttl = min((a.ttl for a in answers), default=MIN_TTL)
+            return [a.host for a in answers], ttl
+
+        # aiodns 4: query() eskirgan; javobda CNAME yozuvlari ham bo'lishi mumkin
+        result = await resolver.query_dns(host, 'A')
+        records = [r for r in result.answer if hasattr(r.data, 'addr')]
+        ttl = min((r.ttl for r in records), default=MIN_TTL)
+        return [r.data.addr for r in records], ttl
+
+    def _store(self, host: str, ips: List[str], ttl: int):
+        ttl = max(MIN_TTL, min(ttl, MAX_TTL)) if ips else NEGATIVE_TTL
+        self._cache.set(host, ips, ttl=ttl)
+
+    def _lookup(self, host: str) -> Optional[List[str]]:
+        ips = self._cache.get(host)
+        if ips is not None:
+            self.stats['hits' if ips else 'negative_hits'] += 1
+        return ips
+
+    # --- Public API ---
+
+    def resolve_sync(self, host: str) -> List[str]:
+        """Sinxron resolve (threadlar uchun). Topilmasa bo'sh ro'yxat."""
+        host = host.lower().rstrip('.')
+        ips = self._lookup(host)
+        if ips is not None:
+            return ips
+
+        with self._lock:
+            event = self._inflight_sync.get(host)
+            owner = event is None
+            if owner:
+                event = self._inflight_sync[host] = threading.Event()
+
+        if not owner:
+            event.wait(timeout=10)
+            ips = self._cache.get(host)
+            return ips or []
+
+        self.stats['misses'] += 1
+        try:
+            try:
+                ips, ttl = self._query_sync(host)
+            except Exception as e:
+                logger.debug("DNS resolve failed for %s: %s", host, e)
+                self.stats['errors'] += 1
+                ips, ttl = [], NEGATIVE_TTL
+            self._store(host, ips, ttl)
+            return ips
+        finally:
+            with self._lock:
+                self._inflight_sync.pop(host, None)
+            event.set()
+
+    async def resolve(self, host: str) -> List[str]:
+        """Asinxron resolve (aiohttp uchun). Topilmasa bo'sh ro'yxat."""
+        host = host.lower().rstrip('.')
+        ips = self._lookup(host)
+        if ips is not None:
+            return ips
+
+        future = self._inflight_async.get(host)
+        if future is not None:
+            return await asyncio.shield(future)
+
+        self.stats['misses'] += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight_async[host] = future
+        try:
+            try:
+                ips, ttl = await self._query_async(host)
+            except Exception as e:
+                logger.debug("DNS resolve failed for %s: %s", host, e)
+                self.stats['errors'] += 1
+                ips, ttl = [], NEGATIVE_TTL
+            self._store(host, ips, ttl)
+            future.set_result(ips)
+            return ips
+        except BaseException:
+            # Egasi bekor qilindi - kutayotganlar tizim DNS iga fallback qiladi
+            if not future.done():
+                future.set_result([])
+            raise
+        finally:
+            self._inflight_async.pop(host, None)
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+
+dns_cache = DNSCache()
+
+
+class CachedResolver(AbstractResolver):
+    """aiohttp uchun resolver - umumiy dns_cache orqali (faqat IPv4)"""
+
+    async def resolve(self, host: str, port: int = 0, family: int = socket.AF_INET) -> List[Dict]:
+        if _is_ip(host):
+            ips = [host]
+        else:
+            ips = await dns_cache.resolve(host)
+            if not ips:
+                # Tizim DNS iga fallback
+                loop = asyncio.get_running_loop()
+                infos = await loop.run_in_executor(
+                    None, original_getaddrinfo, host, port, socket.AF_INET, socket.SOCK_STREAM
+                )
+                ips = [info[4][0] for info in infos]
+
+        return [
+            {
+                'hostname': host,
+                'host': ip,
+                'port': port,
+                'family': socket.AF_INET,
+                'proto': 0,
+                'flags': socket.AI_NUMERICHOST,
+            }
+            for ip in ips
+        ]
+
+    async def close(self) -> None:
+        pass
+
+
+def custom_getaddrinfo(host, port, family=0, type=0, proto=0, flags=0):
+    """socket.getaddrinfo o'rnini bosuvchi (yt-dlp va boshqa sinxron kod uchun)"""
+    if host is None or family not in (0, socket.AF_INET):
+        return original_getaddrinfo(host, port, family, type, proto, flags)
+
+    if isinstance(host, bytes):
+        host = host.decode('idna')
+    if host == 'localhost' or _is_ip(host):
+        return original_getaddrinfo(host, port, family, type, proto, flags)
+
+    ips = dns_cache.resolve_sync(host)
+    if not ips:
+        # Fallback
+        return original_getaddrinfo(host, port, family, type, proto, flags)
+
+    results = []
+    for ip in ips:
+        results.extend(original_getaddrinfo(ip, port, socket.AF_INET, type, proto, flags))
+    return results
+
+
+def install_getaddrinfo_patch() -> bool:
+    """socket.getaddrinfo ni keshlangan resolver bilan almashtirish"""
+    try:
+        import dns.resolver  # noqa: F401
+    except ImportError:
+        logger.warning("⚠️ dnspython not found! DNS patching skipped.")
+        return False
+
+    socket.getaddrinfo = custom_getaddrinfo
+    logger.info("✅ socket.getaddrinfo patched with cached Google DNS (TCP enabled)!")
+    return True
@@ -5,26 +5,168 @@ Media Downloader - YouTube, Instagram, TikTok, Twitter yuklash
 import os
 import re
 import asyncio
-import tempfile
 import shutil
+import hashlib
+import time
 import logging
 import functools
-from typing import Optional, Dict, Any, List, Tuple, Callable
-from dataclasses import dataclass
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, List, Tuple, Callable, Awaitable
+from dataclasses import dataclass, field
 from urllib.parse import urlparse
 
 import aiohttp
 
-from config import config, SUPPORTED_PLATFORMS, REAL_USER_AGENT
+from config import config, REAL_USER_AGENT
+from cache import TTLCache
+from jobs import current_job, make_temp_dir
+from platforms import registry
+from range_fetch import FetchResult, RangeFetchError, fetch_to_file
+from tracing import annotate, current_trace, span, Trace
+from ydl_pool import ydl_pool
 
 logger = logging.getLogger(__name__)
 
+# Bloklovchi ishlar (yt-dlp) uchun umumiy thread pool - event loop bloklanmasligi uchun
+DOWNLOAD_EXECUTOR = ThreadPoolExecutor(max_workers=config.download_workers, thread_name_prefix="download")
+EXECUTOR_WAIT_SPAN_MIN = 0.005  # Bundan qisqa navbat kutishlari trace ga yozilmaydi
+
+
+async def run_blocking(func: Callable, *args, **kwargs):
+    """Bloklovchi funksiyani DOWNLOAD_EXECUTOR da bajarish (contextvars bilan)"""
+    loop = asyncio.get_running_loop()
+    ctx = contextvars.copy_context()
+    submitted = time.monotonic()
+
+    def call():
+        # Executor navbatida kutish (workerlar band bo'lsa) - sezilarlisi trace ga yoziladi
+        trace = current_trace.get()
+        if trace and time.monotonic() - submitted >= EXECUTOR_WAIT_SPAN_MIN:
+            trace.add_span("executor_wait", submitted, time.monotonic())
+        return func(*args, **kwargs)
+
+    future = DOWNLOAD_EXECUTOR.submit(ctx.run, call)
+    job = current_job.get()
+    if job:
+        # Bekor qilinsa job papkalari shu ish tugagandan keyin o'chiriladi
+        job.track(future)
+    return await asyncio.wrap_future(future, loop=loop)
+
+
+# Joriy yuklashning yt-dlp progress hooki (run_blocking konteksti orqali executor threadga o'tadi)
+progress_hook_var: contextvars.ContextVar[Optional[Callable[[Dict[str, Any]], None]]] = contextvars.ContextVar(
+    "progress_hook", default=None
+)
+PROGRESS_HOOK_INTERVAL = 1.0  # yt-dlp hooki juda tez-tez chaqiriladi
+
+# Joriy yuklash uchun to'g'ridan-to'g'ri URL ni qaytarishga ruxsat (download_media(direct=True))
+direct_delivery_var: contextvars.ContextVar[bool] = contextvars.ContextVar("direct_delivery", default=False)
+
+
+def _with_hooks(ydl_opts: Dict[str, Any]) -> Dict[str, Any]:
+    """Joriy kontekstdagi progress hooki va bekor qilish tekshiruvi (job) qo'shiladi"""
+    hooks = list(ydl_opts.get('progress_hooks', []))
+    pp_hooks = list(ydl_opts.get('postprocessor_hooks', []))
+    hook = progress_hook_var.get()
+    if hook:
+        hooks.append(hook)
+    job = current_job.get()
+    if job:
+        # Bekor qilinsa keyingi progress chaqiruvida yoki ffmpeg boshlanishidan oldin to'xtaydi
+        hooks.append(job.hook)
+        pp_hooks.append(job.hook)
+    trace = current_trace.get()
+    if trace:
+        fetch_hook, pp_hook = _trace_hooks(trace)
+        hooks.append(fetch_hook)
+        pp_hooks.append(pp_hook)
+    if hooks or pp_hooks:
+        ydl_opts = {**ydl_opts, 'progress_hooks': hooks, 'postprocessor_hooks': pp_hooks}
+    return ydl_opts
+
+
+def _trace_hooks(trace: Trace) -> Tuple[Callable, Callable]:
+    """yt-dlp hooklaridan bosqichlar: fetch (baytlarni yuklash) va postprocess.<nomi> (merge, convert)"""
+    started: Dict[str, float] = {}
+
+    def fetch_hook(d: Dict[str, Any]):
+        status = d.get('status')
+        if status == 'downloading':
+            started.setdefault('fetch', time.monotonic())
+        elif status in ('finished', 'error') and 'fetch' in started:
+            trace.add_span(
+                "fetch", started.pop('fetch'), time.monotonic(),
+                bytes=d.get('total_bytes') or d.get('downloaded_bytes'),
+                error=status if status == 'error' else None
+            )
+
+    def pp_hook(d: Dict[str, Any]):
+        name = f"postprocess.{d.get('postprocessor')}"
+        if d.get('status') == 'started':
+            started[name] = time.monotonic()
+        elif d.get('status') == 'finished' and name in started:
+            trace.add_span(name, started.pop(name), time.monotonic())
+
+    return fetch_hook, pp_hook
+
+
+def _ydl_extract(ydl_opts: Dict[str, Any], url: str, download: bool = True) -> Dict[str, Any]:
+    """yt-dlp extract_info (sinxron, executor ichida chaqiriladi)"""
+    # Playlistlar alohida yoyiladi (expand_playlist), bu yerda faqat bitta element
+    ydl_opts.setdefault('noplaylist', True)
+    with span("ydl.extract_info", download=download):
+        with ydl_pool.acquire(_with_hooks(ydl_opts)) as ydl:
+            return ydl.extract_info(url, download=download)
+
+
+def _ydl_process(ydl_opts: Dict[str, Any], info: Dict[str, Any]) -> Dict[str, Any]:
+    """Oldin olingan info (masalan playlist entry) bo'yicha yuklash (sinxron)"""
+    with span("ydl.process"):
+        with ydl_pool.acquire(_with_hooks(ydl_opts)) as ydl:
+            return ydl.process_ie_result(info, download=True)
+
+
+def format_progress(d: Dict[str, Any]) -> str:
+    """yt-dlp progress lug'ati -> "⬇️ 45% • 2.1 MB/s • 0:12" """
+    total = d.get('total_bytes') or d.get('total_bytes_estimate')
+    downloaded = d.get('downloaded_bytes') or 0
+    parts = [f"⬇️ {downloaded * 100 / total:.0f}%" if total else f"⬇️ {downloaded / (1024 * 1024):.1f} MB"]
+    if d.get('speed'):
+        parts.append(f"{d['speed'] / (1024 * 1024):.1f} MB/s")
+    if d.get('eta') is not None:
+        minutes, seconds = divmod(int(d['eta']), 60)
+        parts.append(f"{minutes}:{seconds:02d}")
+    return " • ".join(parts)
+
+
+def make_progress_hook(progress_callback: Callable[[str], Awaitable[Any]]) -> Callable[[Dict[str, Any]], None]:
+    """
+    yt-dlp hooki (executor threadida) -> progress_callback (event loopda).
+    Sekundiga ko'pi bilan bitta yangilanish loopga uzatiladi.
+    """
+    loop = asyncio.get_running_loop()
+    state = {'last': 0.0}
+
+    def hook(d: Dict[str, Any]):
+        if d.get('status') != 'downloading':
+            return
+        now = time.monotonic()
+        if now - state['last'] < PROGRESS_HOOK_INTERVAL:
+            return
+        state['last'] = now
+        asyncio.run_coroutine_threadsafe(progress_callback(format_progress(d)), loop)
+
+    return hook
+
+
 def get_connector():
-    """Google va Cloudflare DNS bilan connector"""
-    from aiohttp import TCPConnector, AsyncResolver
+    """Google va Cloudflare DNS bilan connector (umumiy DNS kesh orqali)"""
+    from aiohttp import TCPConnector
     import socket
-    resolver = AsyncResolver(nameservers=["8.8.8.8", "1.1.1.1"])
-    return TCPConnector(family=socket.AF_INET, ssl=True, resolver=resolver)
+    from dns_resolver import CachedResolver
+    return TCPConnector(family=socket.AF_INET, ssl=True, resolver=CachedResolver())
 
 
 @dataclass
@@ -40,6 +182,9 @@ class DownloadResult:
     size_mb: float = 0
     thumbnail: bytes = None
     error: str = ""
+    items: List["DownloadResult"] = field(default_factory=list)  # Albom (carousel) elementlari
+    content_hash: str = ""  # Kontent xeshi (boshqa URL dagi bir xil fayllar uchun)
+    direct_url: str = ""  # Fayl yuklanmagan - Telegram o'zi shu URL dan oladi (file_path bo'sh)
     
     def cleanup(self):
         """Vaqtinchalik fayllarni tozalash"""
@@ -50,8 +195,30 @@ class DownloadResult:
                 pass
 
 
+CONTENT_HASH_CHUNK = 1024 * 1024  # Boshidan va oxiridan 1MB
+
+
+def content_fingerprint(path: str) -> str:
+    """
+    Tezkor kontent xeshi: hajm + birinchi va oxirgi 1MB (butun faylni o'qimasdan).
+    Davomiylik qo'shilmaydi - turli platformalar metadatasi bir xil faylga har xil qiymat beradi.
+    """
+    size = os.path.getsize(path)
+    digest = hashlib.blake2b(str(size).encode(), digest_size=16)
+    with open(path, 'rb') as f:
+        digest.update(f.read(CONTENT_HASH_CHUNK))
+        if size > 2 * CONTENT_HASH_CHUNK:
+            f.seek(-CONTENT_HASH_CHUNK, os.SEEK_END)
+        digest.update(f.read(CONTENT_HASH_CHUNK))
+    return digest.hexdigest()
+
+
 # Pre-compiled regex patterns
 URL_PATTERN = re.compile(r'https?://[^\s<>"{}|\\^`\[\]]+')
+PLAYLIST_URL_PATTERN = re.compile(
+    r'(youtube\.com/playlist\?|soundcloud\.com/[^/]+/sets/|vk\.com/(music/)?(playlist|album))',
+    re.IGNORECASE
+)
 
 def safe_download(platform_name: str):
     """
@@ -85,22 +252,10 @@ def safe_download(platform_name: str):
     return decorator
 
 
-# Optimized detect_platform
 def detect_platform(url: str) -> Optional[str]:
-    """URL dan platformani aniqlash (optimized)"""
-    url_lower = url.lower()
-    
-    # Fast checks for common platforms
-    if 'youtube' in url_lower or 'youtu.be' in url_lower: return 'youtube'
-    if 'instagram' in url_lower: return 'instagram'
-    if 'tiktok' in url_lower: return 'tiktok'
-    
-    for platform_id, platform_info in SUPPORTED_PLATFORMS.items():
-        for pattern in platform_info['patterns']:
-            if pattern in url_lower:
-                return platform_id
-    
-    return None
+    """URL dan platformani aniqlash (hostname + path, platforms.registry)"""
+    platform = registry.resolve(url)
+    return platform.id if platform else None
 
 
 def extract_url(text: str) -> Optional[str]:
@@ -111,12 +266,60 @@ def extract_url(text: str) -> Optional[str]:
     return None
 
 
+def extract_urls(text: str, limit: int = 10) -> List[str]:
+    """Matndan barcha URL larni ajratib olish (takrorlarsiz, tartib saqlanadi)"""
+    urls = []
+    for match in URL_PATTERN.finditer(text):
+        url = match.group(0)
+        if url not in urls:
+            urls.append(url)
+            if len(urls) >= limit:
+                break
+    return urls
+
+
+def is_playlist_url(url: str) -> bool:
+    """Playlist / albom havolasimi (bir nechta elementga yoyiladi)"""
+    return bool(PLAYLIST_URL_PATTERN.search(url))
+
+
+async def expand_playlist(url: str, limit: int) -> List[str]:
+    """
+    Playlist elementlarining URL larini olish (yuklamasdan, extract_flat).
+    Playlist bo'lmasa [url] qaytaradi.
+    """
+    ydl_opts = {
+        'quiet': True,
+        'no_warnings': True,
+        'extract_flat': 'in_playlist',
+        'playlistend': limit,
+        'noplaylist': False,
+        'socket_timeout': config.request_timeout,
+        'force_ipv4': True,
+        'user_agent': REAL_USER_AGENT,
+    }
+    info = await run_blocking(_ydl_extract, ydl_opts, url, False)
+    if not info or info.get('_type') != 'playlist':
+        return [url]
+
+    urls = []
+    for entry in info.get('entries') or []:
+        if not entry:
+            continue
+        entry_url = entry.get('webpage_url') or entry.get('url')
+        if entry_url and entry_url.startswith('http'):
+            urls.append(entry_url)
+        if len(urls) >= limit:
+            break
+    return urls or [url]
+
+
 async def download_youtube(url: str, media_type: str = "video") -> DownloadResult:
     """
     YouTube'dan video yoki audio yuklash (MAKSIMAL SIFAT)
     Bot detection bypass bilan
     """
-    temp_dir = tempfile.mkdtemp()
+    temp_dir = make_temp_dir()
     
     # YouTube bot detection ni chetlab o'tish uchun client kombinatsiyalari
     client_configs = [
@@ -127,14 +330,13 @@ async def download_youtube(url: str, media_type: str = "video") -> DownloadResul
     
     for client_attempt, clients in enumerate(client_configs):
         try:
-            import yt_dlp
-            
             base_opts = {
                 'quiet': True,
                 'no_warnings': True,
                 'socket_timeout': config.download_timeout,
                 'force_ipv4': True,
                 'user_agent': REAL_USER_AGENT,
+                **fragment_opts('youtube'),
                 'extractor_args': {
                     'youtube': {
                         'player_client': clients,
@@ -171,11 +373,10 @@ async def download_youtube(url: str, media_type: str = "video") -> DownloadResul
                 }
             
             # Info + Download bir vaqtda
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(url, download=True)
-                title = info.get('title', 'Video')
-                duration = info.get('duration', 0)
-                video_id = info.get('id', '')
+            info = await run_blocking(_ydl_extract, ydl_opts, url)
+            title = info.get('title', 'Video')
+            duration = info.get('duration', 0)
+            video_id = info.get('id', '')
             
             # Fayl topish
             actual_path = None
@@ -252,30 +453,260 @@ async def download_youtube(url: str, media_type: str = "video") -> DownloadResul
 
 
 
+INSTAGRAM_SHORTCODE_RE = re.compile(r'instagram\.com/(?:[^/?#]+/)?(?:p|reels?|tv)/([A-Za-z0-9_-]+)')
+_instaloader = None
+_instaloader_lock = threading.Lock()
+
+
+def _get_instaloader():
+    """Umumiy Instaloader obyekti - lock faqat yaratishda (tarmoq so'rovlari lock siz)"""
+    global _instaloader
+    if _instaloader is None:
+        import instaloader
+        with _instaloader_lock:
+            if _instaloader is None:
+                _instaloader = instaloader.Instaloader(
+                    quiet=True,
+                    user_agent=REAL_USER_AGENT,
+                    download_pictures=False,
+                    download_videos=False,
+                    save_metadata=False,
+                    max_connection_attempts=1,
+                )
+    return _instaloader
+
+
+def _instagram_sidecar_nodes(shortcode: str) -> List[Tuple[str, str]]:
+    """
+    instaloader orqali carousel elementlari: [(media_type, url), ...]
+    Carousel bo'lmasa bo'sh ro'yxat (sinxron, executor ichida).
+    """
+    import instaloader
+
+    post = instaloader.Post.from_shortcode(_get_instaloader().context, shortcode)
+    if post.typename != 'GraphSidecar':
+        return []
+    return [
+        ('video', node.video_url) if node.is_video else ('image', node.display_url)
+        for node in post.get_sidecar_nodes()
+    ]
+
+
+async def _fetch_direct(session: aiohttp.ClientSession, url: str, path: str,
+                        headers: Optional[Dict[str, str]] = None, max_bytes: int = 0) -> FetchResult:
+    """
+    To'g'ridan-to'g'ri fayl URL ini yuklash (katta fayllar Range bilan bir nechta ulanishda).
+    Progress yt-dlp hooki formatida yuboriladi - foydalanuvchi bir xil progress ko'radi.
+    """
+    hook = progress_hook_var.get()
+    started = time.monotonic()
+
+    def on_progress(downloaded: int, total: int):
+        elapsed = time.monotonic() - started
+        speed = downloaded / elapsed if elapsed > 0 else None
+        hook({
+            'status': 'downloading', 'downloaded_bytes': downloaded, 'total_bytes': total or None,
+            'speed': speed, 'eta': (total - downloaded) / speed if total and speed else None,
+        })
+
+    with span("fetch", direct=True) as fetch_span:
+        result = await fetch_to_file(session, url, path, headers=headers, max_bytes=max_bytes,
+                                     on_progress=on_progress if hook else None)
+        fetch_span.set(bytes=result.size, connections=result.connections)
+    return result
+
+
+# Telegram URL orqali o'zi yuklab oladigan fayllar: tur va hajm limiti (Bot API: rasm 5MB, boshqalar 20MB)
+DIRECT_URL_LIMITS = {
+    'image': (('image/jpeg', 'image/png'), 5 * 1024 * 1024),
+    'video': (('video/mp4',), 20 * 1024 * 1024),
+}
+
+
+async def probe_direct(session: aiohttp.ClientSession, url: str, media_type: str,
+                       headers: Optional[Dict[str, str]] = None) -> Optional[Tuple[str, int]]:
+    """
+    HEAD so'rovi: fayl Telegram URL orqali oladigan turda va limit ichida bo'lsa (yakuniy URL, hajm).
+    Hajm noma'lum yoki server HEAD ni qo'llamasa - None (odatdagi yuklash).
+    """
+    content_types, limit = DIRECT_URL_LIMITS[media_type]
+    try:
+        async with session.head(url, headers=headers, allow_redirects=True,
+                                timeout=aiohttp.ClientTimeout(total=10)) as resp:
+            if resp.status != 200:
+                return None
+            content_type = resp.headers.get('Content-Type', '').split(';')[0].strip().lower()
+            size = resp.content_length or 0
+            final_url = str(resp.url)
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        logger.debug("Direct probe failed %s: %s", url[:80], e)
+        return None
+    if content_type not in content_types or not 0 < size <= limit:
+        return None
+    return final_url, size
+
+
+def _progressive_target(ydl_opts: Dict[str, Any], info: Dict[str, Any]) -> Optional[str]:
+    """
+    Tanlangan format bitta oddiy HTTP fayl bo'lsa (HLS/DASH, merge va cookie siz) - yoziladigan yo'l.
+    Aks holda None - yuklashni yt-dlp ning o'zi qiladi.
+    """
+    if info.get('_type', 'video') != 'video' or info.get('requested_formats'):
+        return None
+    if info.get('protocol') not in ('http', 'https') or not info.get('url') or info.get('cookies'):
+        return None
+    template = ydl_opts.get('outtmpl')
+    if not isinstance(template, str):
+        return None
+    path = template.replace('%(ext)s', info.get('ext') or 'mp4')
+    return None if '%(' in path else path
+
+
+async def _ydl_download(ydl_opts: Dict[str, Any], url: str) -> Dict[str, Any]:
+    """
+    yt-dlp bilan ma'lumot olish va yuklash. Progressiv MP4 (format 'best') baytlari yt-dlp ning
+    bitta oqimi o'rniga Range bilan bir nechta ulanishda olinadi; xato bo'lsa yt-dlp ning o'zi yuklaydi.
+    """
+    info = await run_blocking(_ydl_extract, ydl_opts, url, False)
+    path = _progressive_target(ydl_opts, info)
+    if path:
+        try:
+            async with aiohttp.ClientSession(connector=get_connector()) as session:
+                await _fetch_direct(session, info['url'], path, headers=info.get('http_headers'),
+                                    max_bytes=ydl_opts.get('max_filesize') or 0)
+            return info
+        except (aiohttp.ClientError, asyncio.TimeoutError, RangeFetchError) as e:
+            logger.info("Direct fetch failed, using yt-dlp: %s", e)
+    return await run_blocking(_ydl_process, ydl_opts, info)
+
+
+def fragment_opts(platform: str) -> Dict[str, Any]:
+    """HLS/DASH fragmentlarini parallel yuklash (platformaga mos soni, SUPPORTED_PLATFORMS 'fragments')"""
+    entry = registry.get(platform)
+    fragments = entry.fragments if entry else 1
+    return {'concurrent_fragment_downloads': fragments} if fragments > 1 else {}
+
+
+def _collect_items(paths: List[Tuple[str, str]], platform: str, title: str) -> List[DownloadResult]:
+    """[(media_type, path), ...] -> albom elementlari (temp_dir ota natijada)"""
+    return [
+        DownloadResult(
+            success=True,
+            platform=platform,
+            media_type=media_type,
+            file_path=path,
+            title=title,
+            size_mb=os.path.getsize(path) / (1024 * 1024)
+        )
+        for media_type, path in paths
+        if path and os.path.exists(path)
+    ]
+
+
+def _album_result(items: List[DownloadResult], platform: str, temp_dir: str, title: str) -> DownloadResult:
+    """Albom elementlaridan bitta natija (birinchi element asosiy fayl)"""
+    return DownloadResult(
+        success=True,
+        platform=platform,
+        media_type=items[0].media_type,
+        file_path=items[0].file_path,
+        temp_dir=temp_dir,
+        title=title,
+        size_mb=sum(item.size_mb for item in items),
+        items=items
+    )
+
+
+async def _download_instagram_sidecar(nodes: List[Tuple[str, str]], temp_dir: str) -> List[DownloadResult]:
+    """Carousel elementlarini parallel yuklash (tartib saqlanadi)"""
+    async def fetch(index: int, media_type: str, media_url: str):
+        ext = 'mp4' if media_type == 'video' else 'jpg'
+        path = os.path.join(temp_dir, f"media_{index:02d}.{ext}")
+        try:
+            await fetch_to_file(session, media_url, path)
+            return media_type, path
+        except Exception as e:
+            logger.warning(f"Instagram carousel item {index} error: {e}")
+            return media_type, None
+
+    async with aiohttp.ClientSession(connector=get_connector()) as session:
+        paths = await asyncio.gather(*(
+            fetch(i, media_type, media_url) for i, (media_type, media_url) in enumerate(nodes)
+        ))
+    return _collect_items(paths, 'instagram', 'Instagram')
+
+
 async def download_instagram(url: str) -> DownloadResult:
-    """Instagram'dan video/rasm yuklash"""
+    """
+    Instagram'dan video/rasm yuklash
+    Carousel (bir nechta rasm/video) bo'lsa barcha elementlar parallel yuklanadi
+    va natija.items orqali bitta albom sifatida qaytariladi
+    """
     try:
-        import yt_dlp
-        
-        temp_dir = tempfile.mkdtemp()
-        output_path = os.path.join(temp_dir, "media")
+        temp_dir = make_temp_dir()
         
+        # yt-dlp (playlist entrylari bo'lsa - parallel)
         ydl_opts = {
             # MAKSIMAL SIFAT
             'format': 'bestvideo[ext=mp4]+bestaudio[ext=m4a]/bestvideo+bestaudio/best',
-            'outtmpl': output_path + '.%(ext)s',
+            'outtmpl': os.path.join(temp_dir, "media.%(ext)s"),
             'quiet': True,
             'no_warnings': True,
             'socket_timeout': config.download_timeout,
             'merge_output_format': 'mp4',
             'force_ipv4': True,
             'user_agent': REAL_USER_AGENT,
+            **fragment_opts('instagram'),
             'max_filesize': 50 * 1024 * 1024,  # 50MB limit
+            'noplaylist': False,
         }
         
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(url, download=True)
-            title = info.get('title', 'Instagram')[:50]
+        info, extract_error = None, None
+        try:
+            info = await run_blocking(_ydl_extract, ydl_opts, url, False)
+        except Exception as e:
+            # Faqat rasmli postlarni yt-dlp ololmaydi - post turi noma'lum
+            extract_error = e
+        entries = [e for e in (info.get('entries') or []) if e] if info and info.get('_type') == 'playlist' else []
+        
+        # Carousel (instaloader - rasmlar ham): yt-dlp carousel ko'rsatsa yoki post turi noma'lum bo'lsa
+        match = INSTAGRAM_SHORTCODE_RE.search(url)
+        if match and (info is None or info.get('_type') == 'playlist'):
+            try:
+                nodes = await run_blocking(_instagram_sidecar_nodes, match.group(1))
+            except Exception as e:
+                logger.debug(f"instaloader sidecar error: {e}")
+                nodes = []
+            if len(nodes) > 1:
+                items = await _download_instagram_sidecar(nodes, temp_dir)
+                if items:
+                    return _album_result(items, 'instagram', temp_dir, 'Instagram')
+        if info is None:
+            raise extract_error
+        title = (info.get('title') or 'Instagram')[:50]
+        
+        if len(entries) > 1:
+            async def fetch_entry(index: int, entry: Dict[str, Any]):
+                opts = {**ydl_opts, 'outtmpl': os.path.join(temp_dir, f"media_{index:02d}.%(ext)s")}
+                try:
+                    await run_blocking(_ydl_process, opts, entry)
+                except Exception as e:
+                    logger.warning(f"Instagram entry {index} error: {e}")
+                    return 'video', None
+                for f in sorted(os.listdir(temp_dir)):
+                    if f.startswith(f"media_{index:02d}.") and f.endswith(('.mp4', '.webm')):
+                        return 'video', os.path.join(temp_dir, f)
+                return 'video', None
+            
+            paths = await asyncio.gather(*(fetch_entry(i, e) for i, e in enumerate(entries)))
+            items = _collect_items(paths, 'instagram', title)
+            if items:
+                return _album_result(items, 'instagram', temp_dir, title)
+            shutil.rmtree(temp_dir, ignore_errors=True)
+            return DownloadResult(success=False, platform='instagram', error="Media topilmadi")
+        
+        # Bitta media - allaqachon olingan info bilan yuklash
+        await run_blocking(_ydl_process, ydl_opts, entries[0] if entries else info)
         
         # Fayl topish
         actual_path = None
@@ -291,6 +722,7 @@ async def download_instagram(url: str) -> DownloadResult:
                 media_type = 'image'
         
         if not actual_path or not os.path.exists(actual_path):
+            shutil.rmtree(temp_dir, ignore_errors=True)
             return DownloadResult(success=False, platform='instagram', error="Media topilmadi")
         
         file_size = os.path.getsize(actual_path) / (1024 * 1024)
@@ -315,9 +747,7 @@ async def download_instagram(url: str) -> DownloadResult:
 async def download_twitter(url: str) -> DownloadResult:
     """Twitter/X dan video/rasm yuklash"""
     try:
-        import yt_dlp
-        
-        temp_dir = tempfile.mkdtemp()
+        temp_dir = make_temp_dir()
         output_path = os.path.join(temp_dir, "media")
         
         ydl_opts = {
@@ -330,12 +760,12 @@ async def download_twitter(url: str) -> DownloadResult:
             'merge_output_format': 'mp4',
             'force_ipv4': True,
             'user_agent': REAL_USER_AGENT,
+            **fragment_opts('twitter'),
             'max_filesize': 50 * 1024 * 1024,  # 50MB limit
         }
         
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(url, download=True)
-            title = info.get('title', 'Twitter')[:50]
+        info = await run_blocking(_ydl_extract, ydl_opts, url)
+        title = info.get('title', 'Twitter')[:50]
         
         # Fayl topish
         actual_path = None
@@ -375,7 +805,7 @@ async def download_twitter(url: str) -> DownloadResult:
 async def download_pinterest(url: str) -> DownloadResult:
     """Pinterest'dan rasm/video yuklash"""
     try:
-        temp_dir = tempfile.mkdtemp()
+        temp_dir = make_temp_dir()
         
         # Pinterest sahifasini olish va rasm URL ni topish
         async with aiohttp.ClientSession(connector=get_connector()) as session:
@@ -415,37 +845,50 @@ async def download_pinterest(url: str) -> DownloadResult:
                     shutil.rmtree(temp_dir, ignore_errors=True)
                     return DownloadResult(success=False, platform='pinterest', error="Rasm topilmadi")
                 
-                # Rasm yuklash
-                async with session.get(img_url, headers=headers, timeout=aiohttp.ClientTimeout(total=30)) as img_resp:
-                    if img_resp.status != 200:
+                # Kichik rasm - Telegram o'zi oladi, yuklash shart emas
+                if direct_delivery_var.get():
+                    probed = await probe_direct(session, img_url, 'image', headers)
+                    if probed:
                         shutil.rmtree(temp_dir, ignore_errors=True)
-                        return DownloadResult(success=False, platform='pinterest', error="Rasm yuklanmadi")
-                    
-                    # Fayl kengaytmasini aniqlash
-                    ext = '.jpg'
-                    content_type = img_resp.headers.get('content-type', '')
-                    if 'png' in content_type:
-                        ext = '.png'
-                    elif 'webp' in content_type:
-                        ext = '.webp'
-                    elif 'gif' in content_type:
-                        ext = '.gif'
-                    
-                    output_path = os.path.join(temp_dir, f"pinterest{ext}")
-                    with open(output_path, 'wb') as f:
-                        f.write(await img_resp.read())
-                    
-                    file_size = os.path.getsize(output_path) / (1024 * 1024)
-                    
-                    return DownloadResult(
-                        success=True,
-                        platform='pinterest',
-                        media_type='image',
-                        file_path=output_path,
-                        temp_dir=temp_dir,
-                        title='Pinterest',
-                        size_mb=file_size
-                    )
+                        return DownloadResult(
+                            success=True,
+                            platform='pinterest',
+                            media_type='image',
+                            direct_url=probed[0],
+                            title='Pinterest',
+                            size_mb=probed[1] / (1024 * 1024)
+                        )
+                
+                # Rasm yuklash (kengaytma Content-Type dan keyin aniqlanadi)
+                raw_path = os.path.join(temp_dir, "pinterest")
+                try:
+                    fetched = await _fetch_direct(session, img_url, raw_path, headers=headers)
+                except aiohttp.ClientResponseError:
+                    shutil.rmtree(temp_dir, ignore_errors=True)
+                    return DownloadResult(success=False, platform='pinterest', error="Rasm yuklanmadi")
+                
+                # Fayl kengaytmasini aniqlash
+                ext = '.jpg'
+                content_type = fetched.content_type
+                if 'png' in content_type:
+                    ext = '.png'
+                elif 'webp' in content_type:
+                    ext = '.webp'
+                elif 'gif' in content_type:
+                    ext = '.gif'
+                
+                output_path = os.path.join(temp_dir, f"pinterest{ext}")
+                os.replace(raw_path, output_path)
+                
+                return DownloadResult(
+                    success=True,
+                    platform='pinterest',
+                    media_type='image',
+                    file_path=output_path,
+                    temp_dir=temp_dir,
+                    title='Pinterest',
+                    size_mb=fetched.size / (1024 * 1024)
+                )
         
     except Exception as e:
         logger.error(f"Pinterest download error: {e}")
@@ -454,7 +897,8 @@ async def download_pinterest(url: str) -> DownloadResult:
         return DownloadResult(success=False, platform='pinterest', error=str(e)[:100])
 
 
-async def download_media(url: str, media_type: str = "video", no_watermark: bool = False, progress_callback=None) -> DownloadResult:
+async def download_media(url: str, media_type: str = "video", no_watermark: bool = False, progress_callback=None,
+                         direct: bool = False) -> DownloadResult:
     """
     Asosiy yuklash funksiyasi - platformani aniqlaydi va yuklaydi
     
@@ -463,6 +907,7 @@ async def download_media(url: str, media_type: str = "video", no_watermark: bool
         media_type: 'video' yoki 'audio'
         no_watermark: TikTok uchun watermark olib tashlash
         progress_callback: Progress callback funksiyasi
+        direct: Kichik to'g'ridan-to'g'ri fayllar yuklanmaydi - natijada faqat direct_url
     """
     platform = detect_platform(url)
     
@@ -472,41 +917,46 @@ async def download_media(url: str, media_type: str = "video", no_watermark: bool
             error="Bu platforma qo'llab-quvvatlanmaydi"
         )
     
-    logger.info(f"Downloading from {platform}: {url[:50]}")
+    logger.info("Downloading from %s: %.50s", platform, url)
+    annotate(platform=platform, media_type=media_type, url=url)
     
+    direct_token = direct_delivery_var.set(direct)
+    hook_token = None
     if progress_callback:
         await progress_callback("📥 Yuklanmoqda...")
+        # yt-dlp dagi haqiqiy progress (foiz, tezlik, ETA)
+        hook_token = progress_hook_var.set(make_progress_hook(progress_callback))
+    
+    try:
+        with span("download", platform=platform) as download_span:
+            result = await _download_platform(url, platform, media_type, no_watermark, progress_callback)
+            download_span.set(success=result.success, size_mb=round(result.size_mb, 1) or None,
+                              direct=bool(result.direct_url) or None)
+    finally:
+        direct_delivery_var.reset(direct_token)
+        if hook_token:
+            progress_hook_var.reset(hook_token)
     
-    # Platform-specific download
-    if platform == 'youtube':
-        return await download_youtube(url, media_type)
-    elif platform == 'tiktok':
-        return await download_tiktok(url, no_watermark)
-    elif platform == 'instagram':
-        return await download_instagram(url)
-    elif platform == 'twitter':
-        return await download_twitter(url)
-    elif platform == 'facebook':
-        return await download_twitter(url)
-    elif platform == 'pinterest':
-        return await download_pinterest(url)
-    elif platform == 'spotify':
-        return await download_spotify(url)
-    elif platform == 'soundcloud':
-        return await download_soundcloud(url)
-    elif platform == 'vk':
-        return await download_vk(url)
-    elif platform == 'likee':
-        return await download_likee(url)
-    # Yangi platformalar - universal download
-    elif platform in ['dailymotion', 'vimeo', 'reddit', 'tumblr', 'twitch', 'okru', 'rutube']:
-        return await download_generic(url, platform)
-    else:
+    # Kontent xeshi (albomlar uchun emas)
+    if result.success and not result.items and result.file_path:
+        try:
+            with span("fingerprint"):
+                result.content_hash = await run_blocking(content_fingerprint, result.file_path)
+        except OSError as e:
+            logger.debug(f"Content hash error: {e}")
+    return result
+
+
+async def _download_platform(url: str, platform: str, media_type: str, no_watermark: bool, progress_callback) -> DownloadResult:
+    """Platformaga mos yuklovchini chaqirish (registry da ro'yxatdan o'tgan)"""
+    entry = registry.get(platform)
+    if not entry or not entry.downloader:
         return DownloadResult(
             success=False,
             platform=platform,
             error="Bu platforma hali qo'shilmagan"
         )
+    return await entry.downloader(url, media_type, no_watermark, progress_callback)
 
 
 async def download_generic(url: str, platform: str) -> DownloadResult:
@@ -515,9 +965,7 @@ async def download_generic(url: str, platform: str) -> DownloadResult:
     Dailymotion, Vimeo, Reddit, Tumblr, Twitch, OK.ru, Rutube uchun
     """
     try:
-        import yt_dlp
-        
-        temp_dir = tempfile.mkdtemp()
+        temp_dir = make_temp_dir()
         output_path = os.path.join(temp_dir, "media.%(ext)s")
         
         ydl_opts = {
@@ -534,13 +982,13 @@ async def download_generic(url: str, platform: str) -> DownloadResult:
             },
             'force_ipv4': True,
             'user_agent': REAL_USER_AGENT,
+            **fragment_opts(platform),
             'max_filesize': 50 * 1024 * 1024,  # 50MB limit
         }
         
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(url, download=True)
-            title = info.get('title', platform.capitalize())[:50]
-            duration = info.get('duration', 0)
+        info = await run_blocking(_ydl_extract, ydl_opts, url)
+        title = info.get('title', platform.capitalize())[:50]
+        duration = info.get('duration', 0)
         
         # Fayl topish
         actual_path = None
@@ -589,9 +1037,7 @@ async def download_generic(url: str, platform: str) -> DownloadResult:
 async def download_soundcloud(url: str) -> DownloadResult:
     """SoundCloud'dan musiqa yuklash"""
     try:
-        import yt_dlp
-        
-        temp_dir = tempfile.mkdtemp()
+        temp_dir = make_temp_dir()
         output_path = os.path.join(temp_dir, "audio.mp3")
         
         ydl_opts = {
@@ -607,13 +1053,13 @@ async def download_soundcloud(url: str) -> DownloadResult:
             'socket_timeout': config.download_timeout,
             'force_ipv4': True,
             'user_agent': REAL_USER_AGENT,
+            **fragment_opts('soundcloud'),
             'max_filesize': 50 * 1024 * 1024,  # 50MB limit
         }
         
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(url, download=True)
-            title = info.get('title', 'SoundCloud')[:50]
-            duration = info.get('duration', 0)
+        info = await run_blocking(_ydl_extract, ydl_opts, url)
+        title = info.get('title', 'SoundCloud')[:50]
+        duration = info.get('duration', 0)
         
         # Fayl topish
         actual_path = None
@@ -648,9 +1094,7 @@ async def download_soundcloud(url: str) -> DownloadResult:
 async def download_vk(url: str) -> DownloadResult:
     """VK'dan video/musiqa yuklash"""
     try:
-        import yt_dlp
-        
-        temp_dir = tempfile.mkdtemp()
+        temp_dir = make_temp_dir()
         output_path = os.path.join(temp_dir, "media")
         
         ydl_opts = {
@@ -661,12 +1105,12 @@ async def download_vk(url: str) -> DownloadResult:
             'socket_timeout': config.download_timeout,
             'force_ipv4': True,
             'user_agent': REAL_USER_AGENT,
+            **fragment_opts('vk'),
         }
         
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(url, download=True)
-            title = info.get('title', 'VK')[:50]
-            duration = info.get('duration', 0)
+        info = await _ydl_download(ydl_opts, url)
+        title = info.get('title', 'VK')[:50]
+        duration = info.get('duration', 0)
         
         # Fayl topish
         actual_path = None
@@ -710,9 +1154,7 @@ async def download_vk(url: str) -> DownloadResult:
 async def download_likee(url: str) -> DownloadResult:
     """Likee'dan video yuklash"""
     try:
-        import yt_dlp
-        
-        temp_dir = tempfile.mkdtemp()
+        temp_dir = make_temp_dir()
         output_path = os.path.join(temp_dir, "video.mp4")
         
         ydl_opts = {
@@ -723,13 +1165,13 @@ async def download_likee(url: str) -> DownloadResult:
             'socket_timeout': config.download_timeout,
             'force_ipv4': True,
             'user_agent': REAL_USER_AGENT,
+            **fragment_opts('likee'),
             'max_filesize': 50 * 1024 * 1024,  # 50MB limit
         }
         
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(url, download=True)
-            title = info.get('title', 'Likee')[:50]
-            duration = info.get('duration', 0)
+        info = await _ydl_download(ydl_opts, url)
+        title = info.get('title', 'Likee')[:50]
+        duration = info.get('duration', 0)
         
         # Fayl topish
         actual_path = None
@@ -773,9 +1215,7 @@ async def download_tiktok(url: str, no_watermark: bool = False) -> DownloadResul
         no_watermark: Watermark olib tashlash (API orqali)
     """
     try:
-        import yt_dlp
-        
-        temp_dir = tempfile.mkdtemp()
+        temp_dir = make_temp_dir()
         output_path = os.path.join(temp_dir, "video.mp4")
         
         # No watermark - API orqali
@@ -790,25 +1230,37 @@ async def download_tiktok(url: str, no_watermark: bool = False) -> DownloadResul
                             if data.get('code') == 0:
                                 video_url = data.get('data', {}).get('play')
                                 if video_url:
-                                    async with session.get(video_url, timeout=60) as video_resp:
-                                        if video_resp.status == 200:
-                                            with open(output_path, 'wb') as f:
-                                                f.write(await video_resp.read())
-                                            
-                                            title = data.get('data', {}).get('title', 'TikTok')[:50]
-                                            duration = data.get('data', {}).get('duration', 0)
-                                            file_size = os.path.getsize(output_path) / (1024 * 1024)
-                                            
-                                            return DownloadResult(
-                                                success=True,
-                                                platform='tiktok',
-                                                media_type='video',
-                                                file_path=output_path,
-                                                temp_dir=temp_dir,
-                                                title=title + " (no watermark)",
-                                                duration=duration,
-                                                size_mb=file_size
-                                            )
+                                    title = data.get('data', {}).get('title', 'TikTok')[:50]
+                                    duration = data.get('data', {}).get('duration', 0)
+                                    
+                                    # Kichik video - Telegram o'zi oladi, yuklash shart emas
+                                    probed = None
+                                    if direct_delivery_var.get():
+                                        probed = await probe_direct(session, video_url, 'video', headers)
+                                    if probed:
+                                        shutil.rmtree(temp_dir, ignore_errors=True)
+                                        return DownloadResult(
+                                            success=True,
+                                            platform='tiktok',
+                                            media_type='video',
+                                            direct_url=probed[0],
+                                            title=title + " (no watermark)",
+                                            duration=duration,
+                                            size_mb=probed[1] / (1024 * 1024)
+                                        )
+                                    
+                                    fetched = await _fetch_direct(session, video_url, output_path, headers=headers)
+                                    
+                                    return DownloadResult(
+                                        success=True,
+                                        platform='tiktok',
+                                        media_type='video',
+                                        file_path=output_path,
+                                        temp_dir=temp_dir,
+                                        title=title + " (no watermark)",
+                                        duration=duration,
+                                        size_mb=fetched.size / (1024 * 1024)
+                                    )
             except Exception as e:
                 logger.warning(f"TikTok no-watermark API error: {e}, falling back to yt-dlp")
         
@@ -821,13 +1273,13 @@ async def download_tiktok(url: str, no_watermark: bool = False) -> DownloadResul
             'socket_timeout': config.download_timeout,
             'force_ipv4': True,
             'user_agent': REAL_USER_AGENT,
+            **fragment_opts('tiktok'),
             'max_filesize': 50 * 1024 * 1024,  # 50MB limit
         }
         
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(url, download=True)
-            title = info.get('title', 'TikTok Video')[:50]
-            duration = info.get('duration', 0)
+        info = await _ydl_download(ydl_opts, url)
+        title = info.get('title', 'TikTok Video')[:50]
+        duration = info.get('duration', 0)
         
         actual_path = None
         for f in os.listdir(temp_dir):
@@ -861,65 +1313,225 @@ async def download_tiktok(url: str, no_watermark: bool = False) -> DownloadResul
         return DownloadResult(success=False, platform='tiktok', error=str(e)[:100])
 
 
-async def download_spotify(url: str) -> DownloadResult:
+# ============== Spotify (spotdl) ==============
+
+SPOTIFY_SEMAPHORE = asyncio.Semaphore(config.spotify_concurrency)
+SPOTIFY_TRACK_RE = re.compile(r'/track/([A-Za-z0-9]{22})')
+PROGRESS_PERCENT_RE = re.compile(r'(\d{1,3})%')
+
+# Spotify track ID -> topilgan audio manba (spotdl qidiruv natijasi)
+# Mashhur treklar uchun sekin qidiruv bosqichini o'tkazib yuborish imkonini beradi
+_spotify_source_cache = TTLCache(maxsize=4096, ttl=7 * 24 * 3600)
+
+
+async def run_subprocess(
+    args: List[str],
+    timeout: float,
+    on_line: Optional[Callable[[str], Any]] = None
+) -> Tuple[int, str]:
+    """
+    Tashqi dasturni event loopni bloklamasdan ishga tushirish.
+    Timeout yoki bekor qilinganda jarayon o'ldiriladi.
+    stdout qatorlari (\\r bilan yangilanadigan progress ham) on_line ga uzatiladi.
+    """
+    proc = await asyncio.create_subprocess_exec(
+        *args,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.STDOUT,
+    )
+    output: List[str] = []
+
+    async def _pump():
+        buffer = ""
+        while True:
+            chunk = await proc.stdout.read(4096)
+            if not chunk:
+                break
+            buffer += chunk.decode('utf-8', errors='replace')
+            *lines, buffer = re.split(r'[\r\n]', buffer)
+            for line in lines:
+                if not line.strip():
+                    continue
+                output.append(line)
+                if on_line:
+                    res = on_line(line)
+                    if asyncio.iscoroutine(res):
+                        await res
+        if buffer.strip():
+            output.append(buffer)
+
+    try:
+        await asyncio.wait_for(_pump(), timeout=timeout)
+        returncode = await asyncio.wait_for(proc.wait(), timeout=5)
+    finally:
+        if proc.returncode is None:
+            try:
+                proc.kill()
+            except ProcessLookupError:
+                pass
+            await proc.wait()
+
+    return returncode, "\n".join(output[-50:])
+
+
+def _read_spotify_save_file(save_file: str) -> Optional[Dict[str, Any]]:
+    """
+    spotdl --save-file natijasidan topilgan audio manba.
+    Natija: {'source': youtube_url, 'title': ..., 'duration': ...}
+    """
+    if not os.path.exists(save_file):
+        return None
+    import json
+    with open(save_file, 'r', encoding='utf-8') as f:
+        songs = json.load(f)
+    os.remove(save_file)
+
+    if not songs or not songs[0].get('download_url'):
+        return None
+
+    song = songs[0]
+    artists = ", ".join(song.get('artists') or [])
+    name = song.get('name') or 'Spotify Track'
+    return {
+        'source': song['download_url'],
+        'title': f"{artists} - {name}" if artists else name,
+        'duration': int(song.get('duration') or 0),
+    }
+
+
+def _find_audio_file(directory: str) -> Optional[str]:
+    for f in os.listdir(directory):
+        if f.endswith(('.mp3', '.m4a', '.opus', '.webm')):
+            return os.path.join(directory, f)
+    return None
+
+
+async def download_spotify(url: str, progress_callback=None) -> DownloadResult:
     """
     Spotify'dan musiqa yuklash
-    spotdl kutubxonasi orqali
+    spotdl orqali (asinxron subprocess, timeout va navbat bilan).
+    Har bir urinish bitta spotdl jarayoni: keshdagi manba bilan yoki qidiruv + yuklash
+    (topilgan manba --save-file orqali keyingi so'rovlar uchun keshlanadi).
     """
+    temp_dir = make_temp_dir()
     try:
-        temp_dir = tempfile.mkdtemp()
-        
-        # spotdl orqali yuklash
-        try:
-            import subprocess
-            result = subprocess.run(
-                ['spotdl', url, '--output', temp_dir],
-                capture_output=True,
-                text=True,
-                timeout=120
-            )
-        except FileNotFoundError:
-            # spotdl o'rnatilmagan - yt-dlp orqali urinish
-            import yt_dlp
-            
-            ydl_opts = {
-                'format': 'bestaudio/best',
-                'outtmpl': os.path.join(temp_dir, 'audio.%(ext)s'),
-                'quiet': True,
-                'no_warnings': True,
-            }
-            
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(url, download=True)
-                title = info.get('title', 'Spotify Track')[:50]
-        
-        # Fayl topish
-        actual_path = None
-        for f in os.listdir(temp_dir):
-            if f.endswith(('.mp3', '.m4a', '.opus', '.webm')):
-                actual_path = os.path.join(temp_dir, f)
-                break
-        
+        match = SPOTIFY_TRACK_RE.search(url)
+        track_id = match.group(1) if match else None
+        title = None
+        duration = 0
+
+        async def on_line(line: str):
+            if not progress_callback:
+                return
+            pct = PROGRESS_PERCENT_RE.search(line)
+            if pct:
+                await progress_callback(f"🎧 Yuklanmoqda {min(int(pct.group(1)), 100)}%")
+
+        async with SPOTIFY_SEMAPHORE:
+            try:
+                resolved = _spotify_source_cache.get(track_id) if track_id else None
+                if resolved:
+                    logger.info("Spotify source cache hit: %s", track_id)
+                    # "manba|spotify" formatida spotdl qidiruvni o'tkazib yuboradi
+                    try:
+                        returncode, output = await run_subprocess(
+                            ['spotdl', 'download', f"{resolved['source']}|{url}", '--output', temp_dir],
+                            timeout=config.spotify_timeout,
+                            on_line=on_line
+                        )
+                    except asyncio.TimeoutError:
+                        returncode, output = -1, "timeout"
+                    if returncode == 0 and _find_audio_file(temp_dir):
+                        title = resolved['title']
+                        duration = resolved['duration']
+                    else:
+                        # Manba ishlamay qolgan bo'lishi mumkin - qidiruv yo'liga o'tiladi
+                        logger.warning("spotdl cached source failed (%s): %s", returncode, output[-200:])
+                        _spotify_source_cache.pop(track_id)
+                        resolved = None
+                        shutil.rmtree(temp_dir, ignore_errors=True)
+                        os.makedirs(temp_dir, exist_ok=True)
+
+                if not resolved:
+                    save_file = os.path.join(temp_dir, "track.spotdl")
+                    returncode, output = await run_subprocess(
+                        ['spotdl', 'download', url, '--output', temp_dir, '--save-file', save_file],
+                        timeout=config.spotify_timeout,
+                        on_line=on_line
+                    )
+                    if returncode != 0:
+                        logger.warning("spotdl exited with %s: %s", returncode, output[-200:])
+                    resolved = _read_spotify_save_file(save_file)
+                    if resolved:
+                        title = resolved['title']
+                        duration = resolved['duration']
+                        if track_id and returncode == 0:
+                            _spotify_source_cache.set(track_id, resolved)
+            except FileNotFoundError:
+                # spotdl o'rnatilmagan - yt-dlp orqali urinish (executor da)
+                ydl_opts = {
+                    'format': 'bestaudio/best',
+                    'outtmpl': os.path.join(temp_dir, 'audio.%(ext)s'),
+                    'quiet': True,
+                    'no_warnings': True,
+                }
+                info = await run_blocking(_ydl_extract, ydl_opts, url)
+                title = (info or {}).get('title', 'Spotify Track')
+
+        actual_path = _find_audio_file(temp_dir)
         if not actual_path:
+            shutil.rmtree(temp_dir, ignore_errors=True)
             return DownloadResult(success=False, platform='spotify', error="Audio topilmadi. spotdl o'rnatilmagan bo'lishi mumkin.")
-        
+
         file_size = os.path.getsize(actual_path) / (1024 * 1024)
-        
-        # Fayl nomidan title olish
-        title = os.path.splitext(os.path.basename(actual_path))[0][:50]
-        
+
+        # Fayl nomidan title olish (agar metadata bo'lmasa)
+        if not title:
+            title = os.path.splitext(os.path.basename(actual_path))[0]
+
         return DownloadResult(
             success=True,
             platform='spotify',
             media_type='audio',
             file_path=actual_path,
             temp_dir=temp_dir,
-            title=title,
+            title=title[:50],
+            duration=duration,
             size_mb=file_size
         )
-        
+
+    except asyncio.CancelledError:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        raise
+    except asyncio.TimeoutError:
+        logger.error("Spotify download timeout: %s", url[:50])
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        return DownloadResult(success=False, platform='spotify', error="Vaqt tugadi (timeout)")
     except Exception as e:
         logger.error(f"Spotify download error: {e}")
-        if 'temp_dir' in locals():
-            shutil.rmtree(temp_dir, ignore_errors=True)
+        shutil.rmtree(temp_dir, ignore_errors=True)
         return DownloadResult(success=False, platform='spotify', error=str(e)[:100])
+
+
+# Platforma yuklovchilari - (url, media_type, no_watermark, progress_callback)
+_PLATFORM_DOWNLOADERS = {
+    'youtube': lambda url, media_type, no_watermark, progress: download_youtube(url, media_type),
+    'tiktok': lambda url, media_type, no_watermark, progress: download_tiktok(url, no_watermark),
+    'instagram': lambda url, media_type, no_watermark, progress: download_instagram(url),
+    'twitter': lambda url, media_type, no_watermark, progress: download_twitter(url),
+    'facebook': lambda url, media_type, no_watermark, progress: download_twitter(url),
+    'pinterest': lambda url, media_type, no_watermark, progress: download_pinterest(url),
+    'spotify': lambda url, media_type, no_watermark, progress: download_spotify(url, progress),
+    'soundcloud': lambda url, media_type, no_watermark, progress: download_soundcloud(url),
+    'vk': lambda url, media_type, no_watermark, progress: download_vk(url),
+    'likee': lambda url, media_type, no_watermark, progress: download_likee(url),
+}
+for _platform_id, _downloader in _PLATFORM_DOWNLOADERS.items():
+    registry.set_downloader(_platform_id, _downloader)
+
+# Qolgan platformalar - universal yt-dlp yuklash
+for _platform_id in ('dailymotion', 'vimeo', 'reddit', 'tumblr', 'twitch', 'okru', 'rutube'):
+    registry.set_downloader(
+        _platform_id,
+        lambda url, media_type, no_watermark, progress, platform=_platform_id: download_generic(url, platform),
+    )
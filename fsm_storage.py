@@ -0,0 +1,209 @@
+"""
+FSM storage - bir nechta bot replikalari o'rtasida umumiy holat
+DownloadState / BroadcastState webhook rejimida istalgan replikada ishlashi uchun
+"""
+
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from itertools import islice
+from typing import Any, Dict, Optional
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StorageKey, StateType
+from aiogram.fsm.storage.memory import MemoryStorage
+from pymongo import DeleteOne, UpdateOne
+
+from cache import TTLCache
+from config import config
+from metrics import inc
+
+logger = logging.getLogger(__name__)
+
+
+def build_key(key: StorageKey) -> str:
+    """StorageKey -> satr (bot:chat:user[:thread][:business][:destiny])"""
+    parts = [str(key.bot_id), str(key.chat_id), str(key.user_id)]
+    if key.thread_id:
+        parts.append(f"t{key.thread_id}")
+    business_connection_id = getattr(key, "business_connection_id", None)
+    if business_connection_id:
+        parts.append(f"b{business_connection_id}")
+    if key.destiny != "default":
+        parts.append(key.destiny)
+    return ":".join(parts)
+
+
+class MongoStorage(BaseStorage):
+    """
+    MongoDB (motor) asosidagi FSM storage.
+    Har qanday motor-mos kolleksiya bilan ishlaydi (test uchun lokal stand-in ham).
+    Hujjat: {_id: key, state: str|None, data: dict, expires_at: datetime}
+
+    - expires_at + TTL index: tashlab ketilgan holatlar avtomatik o'chadi
+    - Issiq kalitlar uchun cheklangan o'qish keshi (LRU + TTL)
+    - Yozuvlar flush_delay davomida birlashtiriladi (set_state + set_data = 1 ta yozuv)
+    - Bo'shatilgan holat (state=None, data={}) hujjati o'chiriladi
+    - Flushlar lock bilan ketma-ket (eski yozuv yangisidan keyin tushmaydi),
+      xato bo'lsa navbat qaytariladi va qayta urinish rejalashtiriladi
+    - Qayta urinish kutilayotganda navbat max_pending dan oshmaydi (eng eskilari tashlanadi)
+      va yozish yo'lida sinxron flush qilinmaydi
+    """
+
+    RETRY_DELAY_MIN = 1
+    RETRY_DELAY_MAX = 60
+
+    def __init__(
+        self,
+        collection,
+        state_ttl: int = 86400,
+        cache_size: int = 10000,
+        cache_ttl: float = 30,
+        flush_delay: float = 0.2,
+        max_pending: int = 1000
+    ):
+        self.collection = collection
+        self.state_ttl = state_ttl
+        self.flush_delay = flush_delay
+        self.max_pending = max_pending
+        # key -> {"state": ..., "data": ...} (to'liq ma'lum bo'lgan hujjatlar)
+        self._cache = TTLCache(maxsize=cache_size, ttl=cache_ttl)
+        # key -> hali yozilmagan maydonlar
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+        self._retry_delay = self.RETRY_DELAY_MIN
+        self._retry_pending = False
+
+    async def _load(self, key: str) -> Dict[str, Any]:
+        doc = self._cache.get(key)
+        if doc is not None:
+            return doc
+
+        raw = await self.collection.find_one({"_id": key}, {"state": 1, "data": 1})
+        doc = {
+            "state": raw.get("state") if raw else None,
+            "data": dict(raw.get("data") or {}) if raw else {},
+        }
+        # Yozilmagan o'zgarishlar DB dagidan ustun
+        doc.update(self._pending.get(key, {}))
+        self._cache.set(key, doc)
+        return doc
+
+    async def _write(self, key: str, field: str, value: Any) -> None:
+        doc = self._cache.get(key)
+        if doc is not None:
+            doc[field] = value
+        # Oxirgi yozilgan kalit navbat oxiriga (tashlashda eng eskisi ketadi)
+        self._pending[key] = {**self._pending.pop(key, {}), field: value}
+
+        if self._retry_pending:
+            # DB ishlamayapti - lock ortida kutmaymiz, qayta urinish taski yozadi
+            self._trim_pending()
+        elif len(self._pending) >= self.max_pending:
+            # Xotira cheklangan - darhol yozish
+            await self.flush()
+        else:
+            self._schedule_flush(self.flush_delay)
+
+    def _trim_pending(self) -> None:
+        """Navbatni max_pending gacha qisqartirish (eng eski kalitlar tashlanadi)"""
+        overflow = len(self._pending) - self.max_pending
+        if overflow <= 0:
+            return
+        for key in list(islice(self._pending, overflow)):
+            del self._pending[key]
+            # Keshdagi yozilmagan qiymat endi DB dan o'qiladi
+            self._cache.pop(key)
+        inc("fsm_pending_dropped", overflow)
+        logger.warning(f"FSM pending queue full, dropped {overflow} oldest keys")
+
+    def _schedule_flush(self, delay: float) -> None:
+        task = self._flush_task
+        if task is None or task.done() or task is asyncio.current_task():
+            self._flush_task = asyncio.create_task(self._delayed_flush(delay))
+
+    async def _delayed_flush(self, delay: float) -> None:
+        await asyncio.sleep(delay)
+        await self.flush()
+
+    async def flush(self) -> None:
+        """Yig'ilgan yozuvlarni bitta bulk_write bilan MongoDB ga yozish"""
+        async with self._flush_lock:
+            await self._flush()
+
+    async def _flush(self) -> None:
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+
+        expires_at = datetime.now() + timedelta(seconds=self.state_ttl)
+        ops = []
+        for key, fields in pending.items():
+            if fields.get("state", 0) is None and fields.get("data", 0) == {}:
+                ops.append(DeleteOne({"_id": key}))
+            else:
+                ops.append(UpdateOne(
+                    {"_id": key},
+                    {"$set": {**fields, "expires_at": expires_at}},
+                    upsert=True
+                ))
+        try:
+            await self.collection.bulk_write(ops, ordered=False)
+            self._retry_delay = self.RETRY_DELAY_MIN
+            self._retry_pending = False
+        except Exception as e:
+            logger.error(f"FSM flush error ({len(ops)} keys), retry in {self._retry_delay:.1f}s: {e}")
+            # Qayta urinish (yangiroq yozuvlar ustun), kechikish har safar ikki barobar
+            merged = {key: {**fields, **self._pending.pop(key, {})} for key, fields in pending.items()}
+            merged.update(self._pending)
+            self._pending = merged
+            self._trim_pending()
+            self._retry_pending = True
+            self._schedule_flush(self._retry_delay)
+            self._retry_delay = min(self._retry_delay * 2, self.RETRY_DELAY_MAX)
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        value = state.state if isinstance(state, State) else state
+        await self._write(build_key(key), "state", value)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        doc = await self._load(build_key(key))
+        return doc["state"]
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        await self._write(build_key(key), "data", dict(data))
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        doc = await self._load(build_key(key))
+        return dict(doc["data"])
+
+    async def close(self) -> None:
+        # Mongo client database.py da boshqariladi; faqat navbatni yozib qo'yamiz
+        if self._flush_task and not self._flush_task.done():
+            await self._flush_task
+        await self.flush()
+
+
+def create_storage() -> BaseStorage:
+    """config.fsm_storage bo'yicha storage yaratish"""
+    if config.fsm_storage == "redis":
+        if not config.redis_url:
+            raise ValueError("❌ FSM_STORAGE=redis uchun REDIS_URL kerak!")
+        from aiogram.fsm.storage.redis import RedisStorage
+        logger.info("🗄 FSM storage: Redis")
+        return RedisStorage.from_url(config.redis_url)
+
+    if config.fsm_storage == "mongo":
+        from database import fsm_col
+        logger.info("🗄 FSM storage: MongoDB")
+        return MongoStorage(
+            fsm_col,
+            state_ttl=config.fsm_state_ttl,
+            # Replikalar bir-birining yozuvlarini tez ko'rishi uchun kesh qisqa
+            cache_ttl=30 if config.run_mode == "polling" else 2
+        )
+
+    if config.run_mode == "webhook":
+        logger.warning("⚠️ FSM storage: memory - replikalar holatni bo'lisha olmaydi!")
+    return MemoryStorage()
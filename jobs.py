@@ -0,0 +1,132 @@
+"""
+Yuklash ishlari reestri - Cancel tugmasi orqali bekor qilish uchun
+Bekor qilish ikki yo'l bilan yetkaziladi:
+- asyncio task.cancel() - aiohttp oqimlari, subprocesslar (spotdl), semaphore va navbatlar
+- threading.Event - executor ichidagi yt-dlp (progress va postprocessor hooklari)
+Papkalar executor ishlari tugagach o'chiriladi (thread hali yozayotgan bo'lishi mumkin)
+"""
+
+import asyncio
+import concurrent.futures
+import contextvars
+import logging
+import secrets
+import shutil
+import tempfile
+import threading
+from typing import Any, Dict, List, Optional, Set
+
+from aiogram.types import Message
+
+from metrics import inc, register_gauge
+
+logger = logging.getLogger(__name__)
+
+
+class DownloadCancelled(Exception):
+    """Foydalanuvchi yuklashni bekor qildi"""
+
+
+class Job:
+    """Bitta yuklash ishi (process_download task i)"""
+
+    def __init__(self, chat_id: int, task: Optional[asyncio.Task]):
+        self.id = secrets.token_urlsafe(6)
+        self.chat_id = chat_id
+        self.task = task
+        self.message: Optional[Message] = None  # Progress xabari
+        self.temp_dirs: List[str] = []
+        # threading.Event - executor threadlaridan ham tekshiriladi
+        self._cancel_event = threading.Event()
+        # Hali ishlayotgan executor ishlari - papkalar ular tugagach o'chiriladi
+        self._running: Set[concurrent.futures.Future] = set()
+        self._released = False
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel_event.is_set()
+
+    def check(self):
+        """Bekor qilingan bo'lsa DownloadCancelled (executor ichida ham ishlaydi)"""
+        if self._cancel_event.is_set():
+            raise DownloadCancelled()
+
+    def hook(self, d: Dict[str, Any]):
+        """yt-dlp progress_hooks / postprocessor_hooks uchun"""
+        self.check()
+
+    def cancel(self):
+        self._cancel_event.set()
+        if self.task and not self.task.done():
+            self.task.cancel()
+        inc("jobs_cancelled")
+
+    def track(self, future: concurrent.futures.Future):
+        """Executor ishini kuzatish (run_blocking) - release() uning tugashini kutadi"""
+        with self._lock:
+            self._running.add(future)
+        future.add_done_callback(self._untrack)
+
+    def _untrack(self, future: concurrent.futures.Future):
+        # Executor threadida chaqiriladi: oxirgi ish tugasa kechiktirilgan o'chirish
+        with self._lock:
+            self._running.discard(future)
+            idle = self._released and not self._running
+        if idle:
+            self._remove_dirs()
+
+    def release(self):
+        """
+        Vaqtinchalik papkalarni o'chirish. yt-dlp threadi hali yozayotgan bo'lsa
+        (bekor qilish keyingi hookda sezildi) - o'chirish u tugagach bajariladi.
+        """
+        with self._lock:
+            self._released = True
+            busy = bool(self._running)
+        if not busy:
+            self._remove_dirs()
+
+    def _remove_dirs(self):
+        with self._lock:
+            paths, self.temp_dirs = self.temp_dirs, []
+        for path in paths:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+_jobs: Dict[str, Job] = {}
+current_job: contextvars.ContextVar[Optional[Job]] = contextvars.ContextVar("current_job", default=None)
+
+register_gauge("jobs", lambda: {"active": len(_jobs)})
+
+
+def start_job(chat_id: int) -> Job:
+    """Joriy task uchun job yaratish (contextvar orqali downloaderlarga ko'rinadi)"""
+    job = Job(chat_id, asyncio.current_task())
+    _jobs[job.id] = job
+    current_job.set(job)
+    return job
+
+
+def finish_job(job: Job):
+    _jobs.pop(job.id, None)
+
+
+def get_job(job_id: str) -> Optional[Job]:
+    return _jobs.get(job_id)
+
+
+def raise_if_cancelled():
+    """Joriy job bekor qilingan bo'lsa DownloadCancelled"""
+    job = current_job.get()
+    if job:
+        job.check()
+
+
+def make_temp_dir() -> str:
+    """tempfile.mkdtemp() - joriy job bekor qilinsa papka darhol o'chiriladi"""
+    path = tempfile.mkdtemp()
+    job = current_job.get()
+    if job:
+        job.temp_dirs.append(path)
+    return path
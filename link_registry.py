@@ -0,0 +1,49 @@
+"""
+Qisqa ID li havolalar reestri - inline tugmalar uchun
+URL callback_data ichiga sig'maydi (Telegram limiti 64 bayt), shuning uchun
+har bir havolaga qisqa ID beriladi: "dl:video:<id>"
+
+- Xotirada cheklangan LRU (tezkor, O(1))
+- MongoDB fallback (restart va boshqa replikalar uchun)
+"""
+
+import secrets
+from typing import Optional, Tuple
+
+from cache import TTLCache
+from database import save_link, get_link
+
+LINK_TTL = 86400  # 24 soat (links_col TTL index bilan bir xil)
+CALLBACK_DATA_LIMIT = 64
+
+_links = TTLCache(maxsize=50000, ttl=LINK_TTL)
+
+
+async def register_link(url: str, platform: str) -> str:
+    """Havolani ro'yxatga olish va qisqa ID qaytarish"""
+    link_id = secrets.token_urlsafe(6)  # 8 belgi
+    _links.set(link_id, (url, platform))
+    await save_link(link_id, url, platform)
+    return link_id
+
+
+async def resolve_link(link_id: str) -> Optional[Tuple[str, str]]:
+    """Qisqa ID -> (url, platform). Topilmasa None."""
+    item = _links.get(link_id)
+    if item:
+        return item
+
+    doc = await get_link(link_id)
+    if not doc:
+        return None
+    item = (doc['url'], doc['platform'])
+    _links.set(link_id, item)
+    return item
+
+
+def callback_data(action: str, link_id: str) -> str:
+    """Callback payload yaratish (64 bayt limitini tekshirgan holda)"""
+    data = f"dl:{action}:{link_id}"
+    if len(data.encode()) > CALLBACK_DATA_LIMIT:
+        raise ValueError(f"callback_data too long: {data}")
+    return data
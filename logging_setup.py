@@ -0,0 +1,206 @@
+"""
+Bloklanmaydigan logging: event loop faqat yozuvni navbatga qo'yadi (QueueHandler),
+stdout ga yozish va formatlash alohida threadda (QueueListener).
+
+- JSON (LOG_FORMAT=json) yoki oddiy matn
+- Lazy formatting: %-uslubdagi argumentlar listener threadda formatlanadi
+- Sampling: issiq loggerlardagi INFO/DEBUG yozuvlarning har N-tasidan bittasi (LOG_SAMPLE)
+- Xatolar rate limit: bir xil xato sekundlar ichida takrorlansa bittasi, qolganlari sanaladi
+- Navbat to'lsa (stdout sekin) yozuvlar tashlanadi - loop hech qachon kutmaydi
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from metrics import inc
+from tracing import trace_id
+
+LOG_QUEUE_SIZE = 10_000
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - [%(trace_id)s] %(message)s'
+
+
+class JsonFormatter(logging.Formatter):
+    """Bitta yozuv - bitta JSON qator"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        # extra={"payload": {...}} - tuzilgan ma'lumot (masalan trace) alohida maydonlar sifatida
+        payload.update(getattr(record, "payload", None) or {})
+        trace = getattr(record, "trace_id", "-")
+        if trace != "-":
+            payload["trace_id"] = trace
+        suppressed = getattr(record, "suppressed", 0)
+        if suppressed:
+            payload["suppressed"] = suppressed
+        if record.exc_info:
+            payload["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            payload["exc"] = record.exc_text
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        text = super().format(record)
+        extra = getattr(record, "payload", None)
+        if extra:
+            text = f"{text} {json.dumps(extra, ensure_ascii=False, default=str)}"
+        suppressed = getattr(record, "suppressed", 0)
+        return f"{text} (+{suppressed} suppressed)" if suppressed else text
+
+
+class SamplingFilter(logging.Filter):
+    """
+    LOG_SAMPLE="downloader=0.1,bot=0.5" - logger (va uning bolalari) INFO/DEBUG yozuvlaridan
+    shu ulush o'tadi. Har bir xabar shabloni (record.msg) uchun alohida hisoblagich -
+    kam uchraydigan xabarlar ko'p uchraydiganlari orasida yo'qolib ketmaydi.
+    """
+
+    MAX_KEYS = 5000
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        # Eng uzun prefiks birinchi (downloader.youtube > downloader)
+        self.rates = sorted(rates.items(), key=lambda item: -len(item[0]))
+        self._every: Dict[str, int] = {}
+        self._counts: Dict[Tuple[str, str], int] = {}
+
+    def _every_for(self, name: str) -> int:
+        every = self._every.get(name)
+        if every is None:
+            every = 1
+            for prefix, rate in self.rates:
+                if name == prefix or name.startswith(prefix + "."):
+                    every = max(1, round(1 / rate)) if rate > 0 else 0
+                    break
+            self._every[name] = every
+        return every
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        every = self._every_for(record.name)
+        if every == 1:
+            return True
+        if every == 0:
+            return False
+        key = (record.name, str(record.msg))
+        count = self._counts.get(key, 0)
+        if not count and len(self._counts) >= self.MAX_KEYS:
+            # f-string xabarlar har safar yangi kalit - xotira cheklanadi
+            self._counts.clear()
+        self._counts[key] = count + 1
+        return count % every == 0
+
+
+class ErrorRateLimitFilter(logging.Filter):
+    """
+    ERROR va undan yuqori: bir xil (logger, shablon, exception turi) `interval` sekundda bir marta.
+    Oraliqda bostirilganlar soni keyingi o'tgan yozuvga `suppressed` sifatida qo'shiladi.
+    """
+
+    MAX_KEYS = 5000
+
+    def __init__(self, interval: float):
+        super().__init__()
+        self.interval = interval
+        self._state: Dict[Tuple[str, str, str], list] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno < logging.ERROR or self.interval <= 0:
+            return True
+        exc_type = record.exc_info[0].__name__ if record.exc_info and record.exc_info[0] else ""
+        # f-string xabarlar har xil - shablon sifatida boshi olinadi
+        key = (record.name, str(record.msg)[:60], exc_type)
+        now = time.monotonic()
+        with self._lock:
+            state = self._state.get(key)
+            if state is None or now - state[0] >= self.interval:
+                record.suppressed = state[1] if state else 0
+                if len(self._state) >= self.MAX_KEYS:
+                    self._state.clear()
+                self._state[key] = [now, 0]
+                return True
+            state[1] += 1
+        inc("log_errors_suppressed")
+        return False
+
+
+class TraceIdFilter(logging.Filter):
+    """Correlation ID yozuv yaratilgan kontekstda olinadi (listener threadda contextvar yo'q)"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.trace_id = trace_id()
+        return True
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """Formatlashsiz navbatga qo'yish; navbat to'la bo'lsa yozuv tashlanadi"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Standart prepare() xabarni shu yerda (loopda) formatlaydi - listenerga qoldiriladi.
+        # Traceback esa darhol matnga: navbatda frame lar (va ularning o'zgaruvchilari) ushlanib qolmasin.
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            inc("log_dropped")
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def parse_sample_rates(spec: str) -> Dict[str, float]:
+    rates = {}
+    for part in spec.split(","):
+        name, _, rate = part.strip().partition("=")
+        if name and rate:
+            try:
+                rates[name] = float(rate)
+            except ValueError:
+                pass
+    return rates
+
+
+def setup_logging(level: str = "INFO", fmt: str = "text", sample: str = "", error_interval: float = 10):
+    """Root loggerni navbatli pipelinega o'tkazish (bir marta)"""
+    global _listener
+    if _listener:
+        return
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter(TEXT_FORMAT))
+
+    queue_handler = NonBlockingQueueHandler(queue.Queue(maxsize=LOG_QUEUE_SIZE))
+    queue_handler.addFilter(SamplingFilter(parse_sample_rates(sample)))
+    queue_handler.addFilter(ErrorRateLimitFilter(error_interval))
+    queue_handler.addFilter(TraceIdFilter())
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level.upper())
+
+    _listener = logging.handlers.QueueListener(queue_handler.queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    # Chiqishda navbatdagi yozuvlar yozib bo'linadi
+    atexit.register(_listener.stop)
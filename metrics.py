@@ -0,0 +1,35 @@
+"""
+Oddiy ichki metrikalar - hisoblagichlar va gauge lar
+Health server dagi /metrics orqali JSON ko'rinishida beriladi
+"""
+
+import logging
+from collections import defaultdict
+from typing import Any, Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+_counters: Dict[str, float] = defaultdict(int)
+_gauges: Dict[str, Callable[[], Any]] = {}
+
+
+def inc(name: str, value: float = 1):
+    """Hisoblagichni oshirish"""
+    _counters[name] += value
+
+
+def register_gauge(name: str, func: Callable[[], Any]):
+    """Chaqirilganda joriy qiymatni qaytaradigan gauge ro'yxatdan o'tkazish"""
+    _gauges[name] = func
+
+
+def snapshot() -> Dict[str, Any]:
+    """Barcha metrikalar (JSON ga mos)"""
+    gauges = {}
+    for name, func in _gauges.items():
+        try:
+            gauges[name] = func()
+        except Exception as e:
+            logger.debug(f"Gauge {name} error: {e}")
+            gauges[name] = None
+    return {"counters": dict(_counters), "gauges": gauges}
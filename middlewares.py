@@ -1,4 +1,7 @@
+import sys
+import time
 import logging
+from collections import OrderedDict
 from typing import Callable, Dict, Any, Awaitable, Union, List
 from aiogram import BaseMiddleware
 from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
@@ -6,9 +9,39 @@ from aiogram.enums import ChatMemberStatus
 
 from database import get_channels
 from config import config
+from metrics import register_gauge
+from tracing import Trace, current_trace, span
 
 logger = logging.getLogger(__name__)
 
+class TracingMiddleware(BaseMiddleware):
+    """
+    dp.update.outer_middleware - har bir update uchun Trace (correlation ID).
+    Handler boshlagan background tasklar (create_traced_task) tugagach trace yopiladi.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[Any, Dict[str, Any]], Awaitable[Any]],
+        event: Any,
+        data: Dict[str, Any]
+    ) -> Any:
+        user = data.get("event_from_user")
+        trace = Trace(
+            getattr(event, "event_type", "update"),
+            update_id=getattr(event, "update_id", None),
+            user_id=user.id if user else None,
+        )
+        data["trace"] = trace
+        token = current_trace.set(trace)
+        trace.hold()
+        try:
+            return await handler(event, data)
+        finally:
+            current_trace.reset(token)
+            trace.release()
+
+
 class SubscriptionMiddleware(BaseMiddleware):
     async def __call__(
         self,
@@ -34,15 +67,16 @@ class SubscriptionMiddleware(BaseMiddleware):
         
         not_subscribed = []
         
-        for ch in channels:
-            try:
-                member = await bot.get_chat_member(chat_id=ch['channel_id'], user_id=user.id)
-                if member.status in [ChatMemberStatus.LEFT, ChatMemberStatus.KICKED]:
-                    not_subscribed.append(ch)
-            except Exception as e:
-                logger.error(f"Error checking subscription for {ch['channel_id']}: {e}")
-                # Agar bot kanal admini bo'lmasa yoki boshqa xato bo'lsa, o'tkazib yuboramiz (user aybi emas)
-                continue
+        with span("subscription_check", channels=len(channels)):
+            for ch in channels:
+                try:
+                    member = await bot.get_chat_member(chat_id=ch['channel_id'], user_id=user.id)
+                    if member.status in [ChatMemberStatus.LEFT, ChatMemberStatus.KICKED]:
+                        not_subscribed.append(ch)
+                except Exception as e:
+                    logger.error(f"Error checking subscription for {ch['channel_id']}: {e}")
+                    # Agar bot kanal admini bo'lmasa yoki boshqa xato bo'lsa, o'tkazib yuboramiz (user aybi emas)
+                    continue
                 
         if not not_subscribed:
             return await handler(event, data)
@@ -77,10 +111,131 @@ class SubscriptionMiddleware(BaseMiddleware):
         return await handler(event, data)
 
 
+class RateLimiter:
+    """
+    Token bucket limiter (har bir user uchun alohida chelak).
+    rate - sekundiga tiklanadigan tokenlar, burst - chelak sig'imi; rate <= 0 - cheklovsiz.
+
+    Xotira cheklangan: chelaklar oxirgi foydalanish tartibida (LRU) saqlanadi,
+    to'lib bo'lgan (ya'ni yangi chelakdan farqsiz) chelaklar davriy ravishda o'chiriladi.
+    """
+
+    # OrderedDict yozuvi + [tokens, updated] ro'yxati uchun taxminiy hajm (bayt)
+    ENTRY_SIZE = 200
+
+    def __init__(self, rate: float, burst: float, max_keys: int = 100_000, sweep_interval: float = 30):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self.sweep_interval = sweep_interval
+        self.unlimited = rate <= 0
+        # Shu vaqtdan keyin bo'sh turgan chelak yana to'la bo'ladi
+        self.idle_ttl = 0 if self.unlimited else burst / rate
+        self._buckets: "OrderedDict[int, list]" = OrderedDict()
+        self._last_sweep = time.monotonic()
+        self.allowed = 0
+        self.rejected = 0
+
+    def _bucket(self, key: int) -> list:
+        """Kalit chelagi, o'tgan vaqt uchun tokenlar qo'shilgan holda"""
+        now = time.monotonic()
+        if now - self._last_sweep > self.sweep_interval:
+            self._sweep(now)
+
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = [self.burst, now]
+            self._buckets[key] = bucket
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        else:
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            self._buckets.move_to_end(key)
+        return bucket
+
+    def consume(self, key: int, cost: float = 1.0) -> bool:
+        """Token olishga urinish. Limit oshgan bo'lsa False."""
+        if self.unlimited:
+            self.allowed += 1
+            return True
+        bucket = self._bucket(key)
+        if bucket[0] >= cost:
+            bucket[0] -= cost
+            self.allowed += 1
+            return True
+        self.rejected += 1
+        return False
+
+    def consume_up_to(self, key: int, count: int) -> int:
+        """count tagacha butun token olish (har biri bitta ish uchun); olinganlar soni"""
+        if self.unlimited:
+            self.allowed += count
+            return count
+        bucket = self._bucket(key)
+        granted = min(count, int(bucket[0]))
+        bucket[0] -= granted
+        self.allowed += granted
+        self.rejected += count - granted
+        return granted
+
+    def _sweep(self, now: float):
+        """Uzoq vaqt ishlatilmagan chelaklarni o'chirish (eng eskilari boshida)"""
+        self._last_sweep = now
+        deadline = now - self.idle_ttl
+        while self._buckets:
+            key, bucket = next(iter(self._buckets.items()))
+            if bucket[1] > deadline:
+                break
+            del self._buckets[key]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "keys": len(self._buckets),
+            "memory_bytes": sys.getsizeof(self._buckets) + len(self._buckets) * self.ENTRY_SIZE,
+            "allowed": self.allowed,
+            "rejected": self.rejected,
+        }
+
+
 class ThrottlingMiddleware(BaseMiddleware):
-    def __init__(self, limit: float = 0.5):
-        self.limit = limit
-        self.storage: Dict[int, float] = {}
+    """
+    Spamdan himoya - xabarlar va callbacklar uchun alohida token bucket lar.
+    Yuklash ishlari uchun budjet handlerlarga data["throttle"] orqali beriladi.
+    """
+
+    def __init__(
+        self,
+        message_rate: float = config.throttle_message_rate,
+        message_burst: float = config.throttle_message_burst,
+        callback_rate: float = config.throttle_callback_rate,
+        callback_burst: float = config.throttle_callback_burst,
+        download_rate: float = config.throttle_download_rate,
+        download_burst: float = config.throttle_download_burst,
+    ):
+        self.messages = RateLimiter(message_rate, message_burst)
+        self.callbacks = RateLimiter(callback_rate, callback_burst)
+        self.downloads = RateLimiter(download_rate, download_burst)
+        register_gauge("throttle", self.stats)
+
+    def allow_download(self, user_id: int) -> bool:
+        """Yangi yuklash ishini boshlashga ruxsat bormi"""
+        if user_id in config.admin_ids:
+            return True
+        return self.downloads.consume(user_id)
+
+    def allow_downloads(self, user_id: int, count: int) -> int:
+        """Bir nechta yuklash (batch elementlari) - har biri bitta token; ruxsat berilganlar soni"""
+        if user_id in config.admin_ids:
+            return count
+        return self.downloads.consume_up_to(user_id, count)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "messages": self.messages.stats(),
+            "callbacks": self.callbacks.stats(),
+            "downloads": self.downloads.stats(),
+        }
 
     async def __call__(
         self,
@@ -89,6 +244,7 @@ class ThrottlingMiddleware(BaseMiddleware):
         data: Dict[str, Any]
     ) -> Any:
         
+        data["throttle"] = self
         user = data.get("event_from_user")
         
         if not user:
@@ -97,14 +253,12 @@ class ThrottlingMiddleware(BaseMiddleware):
         # Adminlar uchun limit yo'q
         if user.id in config.admin_ids:
             return await handler(event, data)
-            
-        import time
-        now = time.time()
-        last_request = self.storage.get(user.id, 0)
-        
-        if now - last_request < self.limit:
+
+        is_callback = isinstance(event, CallbackQuery) or getattr(event, "callback_query", None) is not None
+        limiter = self.callbacks if is_callback else self.messages
+
+        if not limiter.consume(user.id):
             # Silent drop (spamdan himoya)
             return
 
-        self.storage[user.id] = now
         return await handler(event, data)
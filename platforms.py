@@ -0,0 +1,101 @@
+"""
+Platformalar reestri: URL -> platforma hostname bo'yicha dict lookup (subdomenlar uchun ota domenlar)
+va platformaning shu host uchun path regexi orqali aniqlanadi.
+
+Oldingi substring qidiruvidan farqi: 'x.com' endi 'box.com' ga, 'ok.ru' esa boshqa
+havolalar ichidagi matnga mos kelmaydi - faqat haqiqiy hostname solishtiriladi.
+"""
+
+import re
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Pattern, Tuple
+
+from config import SUPPORTED_PLATFORMS
+
+# scheme://[userinfo@]host[:port] - urlsplit dan bir necha barobar tez; path - qolgan qism
+_URL_RE = re.compile(r'[a-z][a-z0-9+.-]*://(?:[^@/?#\s]*@)?([^:/?#\s]+)(?::\d*)?', re.IGNORECASE)
+
+# Ko'rilgan hostname -> nomzodlar (host matndan keladi - to'lsa tozalanadi)
+HOST_CACHE_SIZE = 4096
+
+# (url, media_type, no_watermark, progress_callback) -> DownloadResult
+Downloader = Callable[[str, str, bool, Any], Awaitable[Any]]
+
+
+@dataclass
+class Platform:
+    id: str
+    name: str
+    emoji: str
+    supports: List[str]
+    hosts: Dict[str, Optional[Pattern[str]]]
+    fragments: int = 1
+    downloader: Optional[Downloader] = None
+
+
+class PlatformRegistry:
+    def __init__(self):
+        self._platforms: Dict[str, Platform] = {}
+        self._hosts: Dict[str, List[Tuple[Optional[Pattern[str]], Platform]]] = {}
+        self._host_cache: Dict[str, List[Tuple[Optional[Pattern[str]], Platform]]] = {}
+
+    def register(self, platform_id: str, info: Dict[str, Any], downloader: Optional[Downloader] = None) -> Platform:
+        """info - SUPPORTED_PLATFORMS yozuvi (name, emoji, hosts, supports, fragments)"""
+        hosts = {
+            host.lower(): re.compile(path, re.IGNORECASE) if path else None
+            for host, path in info['hosts'].items()
+        }
+        platform = Platform(
+            id=platform_id,
+            name=info.get('name', platform_id),
+            emoji=info.get('emoji', '📥'),
+            supports=info.get('supports', ['video']),
+            hosts=hosts,
+            fragments=info.get('fragments', 1),
+            downloader=downloader,
+        )
+        self._platforms[platform_id] = platform
+        for host, path_re in hosts.items():
+            self._hosts.setdefault(host, []).append((path_re, platform))
+        self._host_cache.clear()
+        return platform
+
+    def set_downloader(self, platform_id: str, downloader: Downloader):
+        self._platforms[platform_id].downloader = downloader
+
+    def get(self, platform_id: str) -> Optional[Platform]:
+        return self._platforms.get(platform_id)
+
+    def _candidates(self, host: str) -> List[Tuple[Optional[Pattern[str]], Platform]]:
+        """Host va uning ota domenlari uchun (path regex, platforma) - aniqrog'i oldin"""
+        host = host.lower().rstrip('.')
+        found = []
+        # www.youtube.com -> youtube.com, vm.tiktok.com -> tiktok.com (TLD ning o'zi tekshirilmaydi)
+        while True:
+            found.extend(self._hosts.get(host, ()))
+            dot = host.find('.')
+            if dot < 0 or host.find('.', dot + 1) < 0:
+                return found
+            host = host[dot + 1:]
+
+    def resolve(self, url: str) -> Optional[Platform]:
+        match = _URL_RE.match(url)
+        if not match:
+            return None
+        host = match.group(1)
+        candidates = self._host_cache.get(host)
+        if candidates is None:
+            if len(self._host_cache) >= HOST_CACHE_SIZE:
+                self._host_cache.clear()
+            candidates = self._host_cache[host] = self._candidates(host)
+        if candidates:
+            path = url[match.end():] or "/"
+            for path_re, platform in candidates:
+                if path_re is None or path_re.match(path):
+                    return platform
+        return None
+
+
+registry = PlatformRegistry()
+for _platform_id, _info in SUPPORTED_PLATFORMS.items():
+    registry.register(_platform_id, _info)
@@ -0,0 +1,141 @@
+"""
+Event loop bloklanishini kuzatish va production uchun sampling profiler
+
+- LoopMonitor: event loop har `interval` da "heartbeat" yangilaydi, watchdog thread esa
+  heartbeat `threshold` dan ko'p kechiksa loop threadining joriy stackini (sys._current_frames)
+  logga yozadi - ya'ni aynan nima loopni bloklayotganini ko'rsatadi.
+- sample_stacks: barcha threadlarni N sekund davomida `hz` chastotada namuna olib,
+  flamegraph.pl / speedscope uchun "collapsed stack" formatida qaytaradi.
+"""
+
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+
+from metrics import inc, register_gauge
+
+logger = logging.getLogger(__name__)
+
+# Stack yozuvidagi maksimal freymlar (log juda uzun bo'lmasligi uchun)
+MAX_STACK_FRAMES = 40
+
+
+class LoopMonitor:
+    """Heartbeat (loop ichida) + watchdog thread (loop tashqarisida)"""
+
+    def __init__(self, threshold: float = 0.5, interval: float = 0.1):
+        self.threshold = threshold
+        self.interval = interval
+        self.max_lag = 0.0
+        self.stalls = 0
+        self._beat = time.monotonic()
+        self._loop_thread_id: Optional[int] = None
+        self._reported_beat = 0.0
+        self._stop = threading.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._loop_thread_id = threading.get_ident()
+        self._beat = time.monotonic()
+        self._task = asyncio.get_running_loop().create_task(self._heartbeat())
+        threading.Thread(target=self._watch, name="loop-watchdog", daemon=True).start()
+        register_gauge("event_loop", lambda: {
+            "max_lag_ms": round(self.max_lag * 1000, 1), "stalls": self.stalls
+        })
+        logger.info(f"🩺 Event loop monitor: threshold {self.threshold * 1000:.0f} ms")
+
+    def stop(self):
+        self._stop.set()
+
+    async def _heartbeat(self):
+        while not self._stop.is_set():
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = now - expected
+            if lag > self.max_lag:
+                self.max_lag = lag
+            self._beat = now
+
+    def _watch(self):
+        while not self._stop.wait(self.interval / 2):
+            beat = self._beat
+            blocked = time.monotonic() - beat
+            # Bitta bloklanish uchun bitta yozuv
+            if blocked < self.threshold or beat == self._reported_beat:
+                continue
+            self._reported_beat = beat
+            self.stalls += 1
+            inc("event_loop_stalls")
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            stack = "".join(traceback.format_stack(frame, limit=MAX_STACK_FRAMES))
+            logger.warning(f"🐢 Event loop {blocked * 1000:.0f} ms bloklandi, joriy stack:\n{stack}")
+
+
+def _collapse(frame, thread_name: str) -> str:
+    parts = []
+    depth = 0
+    while frame is not None and depth < 128:
+        code = frame.f_code
+        parts.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{code.co_firstlineno})")
+        frame = frame.f_back
+        depth += 1
+    parts.append(thread_name)
+    return ";".join(reversed(parts))
+
+
+def sample_stacks(seconds: float, hz: float = 100, include_idle: bool = False) -> str:
+    """
+    Blocking - executor/threadda chaqiriladi.
+    Natija: har qatorda "thread;f1;f2;... count" (Brendan Gregg collapsed format).
+    """
+    own_id = threading.get_ident()
+    period = 1 / hz
+    counts: Counter = Counter()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        names: Dict[int, str] = {t.ident: t.name for t in threading.enumerate()}
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_id:
+                continue
+            # Bo'sh kutayotgan threadlar (selector, queue.get) odatda shovqin
+            if not include_idle and frame.f_code.co_name in ("select", "poll", "wait", "_worker", "get"):
+                continue
+            counts[_collapse(frame, names.get(thread_id, str(thread_id)))] += 1
+        time.sleep(period)
+    return "\n".join(f"{stack} {n}" for stack, n in counts.most_common())
+
+
+_profile_lock = asyncio.Lock()
+
+
+async def profile(seconds: float, hz: float = 100) -> Optional[str]:
+    """Bir vaqtda bitta profil; band bo'lsa None"""
+    if _profile_lock.locked():
+        return None
+    async with _profile_lock:
+        inc("profiles_taken")
+        logger.info(f"🔬 Profiling {seconds}s @ {hz} Hz")
+        # Alohida thread - yuklash executori to'lgan bo'lsa ham ishlaydi va uni band qilmaydi
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="profiler") as executor:
+            return await asyncio.get_running_loop().run_in_executor(executor, sample_stacks, seconds, hz)
+
+
+loop_monitor: Optional[LoopMonitor] = None
+
+
+def start_loop_monitor(threshold: float) -> Optional[LoopMonitor]:
+    global loop_monitor
+    if threshold <= 0:
+        return None
+    loop_monitor = LoopMonitor(threshold=threshold)
+    loop_monitor.start()
+    return loop_monitor
@@ -0,0 +1,157 @@
+"""
+Progress xabarlarini markazlashgan tahrirlash
+Har bir xabar uchun faqat oxirgi holat saqlanadi (oraliq holatlar tashlab yuboriladi),
+tahrirlar umumiy sekundiga budjet bilan yuboriladi - yuklash jarayoni hech qachon kutmaydi.
+"""
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+from aiogram.types import Message
+
+from config import config
+from metrics import register_gauge
+
+logger = logging.getLogger(__name__)
+
+MessageKey = Tuple[int, int]
+
+
+class ProgressRenderer:
+    """
+    update() - sinxron va O(1): faqat navbatdagi matnni almashtiradi.
+    Fon vazifasi tayyor xabarlarni (min_interval o'tgan) budjet doirasida tahrirlaydi.
+    TelegramRetryAfter bo'lsa barcha tahrirlar to'xtatiladi (joblar emas).
+    discard() ketayotgan tahrirni kutadi - u yakuniy matn ustiga yozilmaydi.
+    """
+
+    TICK = 0.1
+    PRUNE_INTERVAL = 60  # discard() chaqirilmagan xabarlar izini tozalash
+    DISCARD_TIMEOUT = 5  # Osilib qolgan tahrir shundan keyin bekor qilinadi
+
+    def __init__(self, edits_per_second: float, min_interval: float):
+        self.rate = edits_per_second
+        self.min_interval = min_interval
+        self._pending: "OrderedDict[MessageKey, Tuple[Message, str, Dict[str, Any]]]" = OrderedDict()
+        self._last_edit: Dict[MessageKey, float] = {}
+        self._inflight: Dict[MessageKey, asyncio.Task] = {}
+        self._tokens = edits_per_second
+        self._paused_until = 0.0
+        self._last_prune = time.monotonic()
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self.edits = 0
+        self.dropped = 0
+        self.errors = 0
+        register_gauge("progress", self.stats)
+
+    @staticmethod
+    def _key(message: Message) -> MessageKey:
+        return message.chat.id, message.message_id
+
+    def update(self, message: Message, text: str, **kwargs):
+        """Xabarning yangi holati (oldingi yuborilmagan holat bekor bo'ladi)"""
+        key = self._key(message)
+        if key in self._pending:
+            self.dropped += 1
+        self._pending[key] = (message, text, kwargs)
+        self._ensure_running()
+        self._wakeup.set()
+
+    async def discard(self, message: Message):
+        """
+        Xabar yakuniy holatga o'tdi (o'chirildi/natija) - navbatdagi tahrirni bekor qilish.
+        Yuborilayotgan tahrir tugashini kutadi, shundan keyingi yakuniy tahrir ustiga yozilmaydi.
+        """
+        key = self._key(message)
+        self._pending.pop(key, None)
+        self._last_edit.pop(key, None)
+        task = self._inflight.get(key)
+        if task is not None and not task.done():
+            _, not_done = await asyncio.wait({task}, timeout=self.DISCARD_TIMEOUT)
+            if not_done:
+                task.cancel()
+
+    def _ensure_running(self):
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        last = time.monotonic()
+        while True:
+            if not self._pending:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+            await asyncio.sleep(self.TICK)
+
+            now = time.monotonic()
+            self._tokens = min(self.rate, self._tokens + (now - last) * self.rate)
+            last = now
+            if now - self._last_prune > self.PRUNE_INTERVAL:
+                self._prune(now)
+            if now < self._paused_until:
+                continue
+
+            batch = []
+            for key in list(self._pending):
+                if self._tokens < 1:
+                    break
+                if now - self._last_edit.get(key, 0) < self.min_interval:
+                    continue
+                batch.append(self._pending.pop(key))
+                self._last_edit[key] = now
+                self._tokens -= 1
+
+            if batch:
+                loop = asyncio.get_running_loop()
+                tasks = []
+                for message, text, kwargs in batch:
+                    task = loop.create_task(self._edit(message, text, kwargs))
+                    self._inflight[self._key(message)] = task
+                    tasks.append(task)
+                await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _prune(self, now: float):
+        self._last_prune = now
+        deadline = now - self.PRUNE_INTERVAL
+        for key in [k for k, t in self._last_edit.items() if t < deadline and k not in self._pending]:
+            del self._last_edit[key]
+
+    async def _edit(self, message: Message, text: str, kwargs: Dict[str, Any]):
+        key = self._key(message)
+        try:
+            if key not in self._last_edit:
+                return  # Task boshlanguncha discard() qilindi
+            await message.edit_text(text, **kwargs)
+            self.edits += 1
+        except TelegramRetryAfter as e:
+            # Faqat renderer kutadi; oxirgi holat keyingi imkoniyatda yuboriladi
+            self._paused_until = time.monotonic() + e.retry_after
+            if key in self._last_edit:  # discard() qilinmagan bo'lsa
+                self._pending.setdefault(key, (message, text, kwargs))
+        except TelegramBadRequest as e:
+            if "message is not modified" not in str(e):
+                self.errors += 1
+                logger.debug(f"Progress edit error: {e}")
+        except Exception as e:
+            self.errors += 1
+            logger.debug(f"Progress edit error: {e}")
+        finally:
+            self._inflight.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pending": len(self._pending),
+            "tracked": len(self._last_edit),
+            "edits": self.edits,
+            "dropped": self.dropped,
+            "errors": self.errors,
+        }
+
+
+progress = ProgressRenderer(config.progress_edit_rate, config.progress_min_interval)
@@ -0,0 +1,263 @@
+"""
+Segmentli HTTP yuklash: bitta fayl HTTP Range orqali K ta ulanishda parallel olinadi
+va oldindan ajratilgan (preallocate) faylga o'z joyiga yoziladi.
+
+- Birinchi so'rov "bytes=0-" - qo'shimcha HEAD/probe yo'q: javobdan umumiy hajm olinadi,
+  shu oqim birinchi segmentni o'qiydi, qolganlari parallel so'raladi
+- Server Range ni qo'llamasa (200) yoki fayl kichik bo'lsa - odatdagi bitta oqim
+- Bitta hostga umumiy ulanishlar soni cheklangan (RANGE_HOST_LIMIT) - CDN bizni bloklamasin
+- Xato bo'lsa qisman fayl o'chiriladi (keyingi fallback eski faylni "tayyor" deb o'ylamasin)
+"""
+
+import asyncio
+import logging
+import os
+import re
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import aiohttp
+
+from config import config, REAL_USER_AGENT
+from jobs import raise_if_cancelled
+from metrics import inc, register_gauge
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 256 * 1024
+SEGMENT_RETRIES = 1  # Uzilgan segment qolgan joyidan yana bir marta so'raladi
+CONTENT_RANGE_RE = re.compile(r'bytes\s+(\d+)-(\d+)/(\d+|\*)')
+
+
+class RangeFetchError(Exception):
+    """Server javobi kutilgandek emas (Range, hajm yoki limit)"""
+
+
+@dataclass
+class FetchResult:
+    size: int
+    content_type: str = ""
+    connections: int = 1
+
+
+class HostLimiter:
+    """Host bo'yicha bir vaqtdagi ulanishlar (barcha yuklashlar uchun umumiy)"""
+
+    def __init__(self, limit: int):
+        self.limit = max(1, limit)
+        # host -> [semaphore, foydalanuvchilar soni]; bo'shagan host o'chiriladi
+        self._slots: Dict[str, list] = {}
+        self.active = 0
+
+    @asynccontextmanager
+    async def slot(self, host: str) -> AsyncIterator[None]:
+        entry = self._slots.get(host)
+        if entry is None:
+            entry = self._slots[host] = [asyncio.Semaphore(self.limit), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                self.active += 1
+                try:
+                    yield
+                finally:
+                    self.active -= 1
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                self._slots.pop(host, None)
+
+
+host_limiter = HostLimiter(config.range_host_limit)
+register_gauge("range_fetch", lambda: {"connections": host_limiter.active, "hosts": len(host_limiter._slots)})
+
+
+def plan_segments(total: int, connections: int, min_segment: int) -> List[Tuple[int, int]]:
+    """[start, end] (end kiradi) segmentlar; har biri kamida min_segment bayt"""
+    count = max(1, min(connections, total // max(1, min_segment)))
+    size = -(-total // count)
+    return [(start, min(start + size, total) - 1) for start in range(0, total, size)]
+
+
+def _parse_content_range(value: str) -> Optional[Tuple[int, int, int]]:
+    match = CONTENT_RANGE_RE.match(value or "")
+    if not match or match.group(3) == '*':
+        return None
+    return int(match.group(1)), int(match.group(2)), int(match.group(3))
+
+
+def _preallocate(fd: int, size: int):
+    try:
+        os.posix_fallocate(fd, 0, size)
+    except (AttributeError, OSError):
+        # fallocate yo'q (macOS, ba'zi FS lar) - hech bo'lmasa hajm belgilanadi
+        os.ftruncate(fd, size)
+
+
+class _Writer:
+    """Fayl descriptoriga offset bo'yicha yozish, umumiy progress va hajm limiti"""
+
+    def __init__(self, fd: int, total: int, max_bytes: int, on_progress: Optional[Callable[[int, int], None]]):
+        self.fd = fd
+        self.total = total
+        self.max_bytes = max_bytes
+        self.written = 0
+        self.on_progress = on_progress
+
+    def write(self, offset: int, data: bytes):
+        view = memoryview(data)
+        while view:
+            n = os.pwrite(self.fd, view, offset)
+            view = view[n:]
+            offset += n
+        self.written += len(data)
+        if self.max_bytes and self.written > self.max_bytes:
+            raise RangeFetchError(f"File too large: > {self.max_bytes} bytes")
+        if self.on_progress:
+            self.on_progress(self.written, self.total)
+
+
+class _Range:
+    """Yuklanishi kerak bo'lgan oraliq [start, end]; start har chunkdan keyin suriladi (uzilsa davomidan)"""
+
+    __slots__ = ("start", "end")
+
+    def __init__(self, start: int, end: Optional[int]):
+        self.start = start
+        self.end = end
+
+    @property
+    def pending(self) -> bool:
+        return self.end is None or self.start <= self.end
+
+
+async def _read_range(resp: aiohttp.ClientResponse, writer: _Writer, rng: _Range):
+    """Javob tanasidan rng oralig'ini (end=None - oxirigacha) yozish"""
+    async for chunk in resp.content.iter_chunked(CHUNK_SIZE):
+        raise_if_cancelled()
+        if rng.end is not None:
+            chunk = chunk[:rng.end + 1 - rng.start]
+        writer.write(rng.start, chunk)
+        rng.start += len(chunk)
+        if not rng.pending:
+            break
+
+
+async def _fetch_segment(session: aiohttp.ClientSession, url: str, headers: Dict[str, str],
+                         host: str, writer: _Writer, rng: _Range, timeout: aiohttp.ClientTimeout):
+    attempt = 0
+    while rng.pending:
+        try:
+            async with host_limiter.slot(host):
+                range_header = f'bytes={rng.start}-{rng.end}'
+                async with session.get(url, headers={**headers, 'Range': range_header}, timeout=timeout) as resp:
+                    resp.raise_for_status()
+                    content_range = _parse_content_range(resp.headers.get('Content-Range', ''))
+                    if resp.status != 206 or not content_range or content_range[0] != rng.start:
+                        raise RangeFetchError(f"{range_header} not honoured (HTTP {resp.status})")
+                    await _read_range(resp, writer, rng)
+            if rng.pending:
+                raise aiohttp.ClientPayloadError(f"Segment ended early at {rng.start}")
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            attempt += 1
+            if attempt > SEGMENT_RETRIES:
+                raise
+            inc("range_segment_retries")
+
+
+async def _cancel_all(tasks: List["asyncio.Future"]):
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def fetch_to_file(
+    session: aiohttp.ClientSession,
+    url: str,
+    path: str,
+    headers: Optional[Dict[str, str]] = None,
+    max_bytes: int = 0,
+    connections: Optional[int] = None,
+    on_progress: Optional[Callable[[int, int], None]] = None,
+) -> FetchResult:
+    """
+    URL ni faylga yuklash. connections - bitta fayl uchun ulanishlar (default RANGE_CONNECTIONS),
+    max_bytes - hajm limiti (0 - cheksiz), on_progress(yuklangan, jami) - har chunkda.
+    """
+    headers = {'User-Agent': REAL_USER_AGENT, **(headers or {})}
+    headers.pop('Range', None)
+    connections = connections or config.range_connections
+    min_split = int(config.range_min_mb * 1024 * 1024)
+    timeout = aiohttp.ClientTimeout(total=config.download_timeout, sock_read=config.request_timeout)
+    host = urlsplit(url).hostname or ""
+
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    tasks: List[asyncio.Future] = []
+    ok = False
+    try:
+        # Slot faqat o'qish davomida ushlanadi (boshqa segmentlarni kutayotganda emas) - deadlock bo'lmaydi
+        async with host_limiter.slot(host):
+            async with session.get(url, headers={**headers, 'Range': 'bytes=0-'}, timeout=timeout) as resp:
+                resp.raise_for_status()
+                content_type = resp.headers.get('Content-Type', '')
+                content_range = _parse_content_range(resp.headers.get('Content-Range', ''))
+                if resp.status != 206 or not content_range or content_range[0] != 0:
+                    # Range qo'llanmaydi - butun tana bitta oqimda
+                    content_range = None
+                total = content_range[2] if content_range else (resp.content_length or 0)
+                if max_bytes and total > max_bytes:
+                    raise RangeFetchError(f"File too large: {total} > {max_bytes} bytes")
+
+                if not content_range or total < min_split or connections < 2:
+                    writer = _Writer(fd, total, max_bytes, on_progress)
+                    await _read_range(resp, writer, _Range(0, None))
+                    size = writer.written
+                    if total and size != total:
+                        raise aiohttp.ClientPayloadError(f"Incomplete body: {size}/{total}")
+                    ok = True
+                    return FetchResult(size=size, content_type=content_type)
+
+                _preallocate(fd, total)
+                writer = _Writer(fd, total, max_bytes, on_progress)
+                # Redirect (masalan API -> CDN) har segment uchun takrorlanmasin
+                url = str(resp.url)
+                host = urlsplit(url).hostname or host
+                segments = plan_segments(total, connections, min_split // 2)
+                # Ba'zi CDN lar "0-" so'roviga ham qisqaroq oraliq qaytaradi - qolgani alohida segment
+                first = _Range(0, min(segments[0][1], content_range[1]))
+                rest = [_Range(start, end) for start, end in segments[1:]]
+                if first.end < segments[0][1]:
+                    rest.insert(0, _Range(first.end + 1, segments[0][1]))
+
+                tasks = [
+                    asyncio.ensure_future(_fetch_segment(session, url, headers, host, writer, rng, timeout))
+                    for rng in rest
+                ]
+                try:
+                    await _read_range(resp, writer, first)
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    logger.debug("First range stream broke at %s: %s", first.start, e)
+                # Birinchi ulanish o'z segmentidan keyin uziladi (tananing qolganini o'qimaslik uchun)
+                resp.close()
+
+        if first.pending:
+            # Birinchi oqim erta tugadi - qolgani oddiy segment sifatida
+            tasks.append(asyncio.ensure_future(_fetch_segment(session, url, headers, host, writer, first, timeout)))
+        await asyncio.gather(*tasks)
+        if writer.written != total:
+            raise RangeFetchError(f"Incomplete file: {writer.written}/{total}")
+        inc("range_fetch_segmented")
+        ok = True
+        return FetchResult(size=total, content_type=content_type, connections=len(rest) + 1)
+    finally:
+        if not ok:
+            # Bitta segment xato bersa (yoki bekor qilinsa) qolganlari darhol to'xtatiladi
+            await _cancel_all(tasks)
+        os.close(fd)
+        if not ok:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
@@ -0,0 +1,73 @@
+"""
+Ishga tushirish bosqichlari: mustaqil qadamlar parallel, yt-dlp fon threadda oldindan yuklanadi.
+Bosqich vaqtlari logga va /metrics ga ("startup" gauge) yoziladi;
+/ready faqat yt-dlp isitilgandan keyin 200 qaytaradi.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Dict
+
+from metrics import register_gauge
+
+logger = logging.getLogger(__name__)
+
+# Eng ko'p ishlatiladigan extractorlar (yt-dlp ie_key) - birinchi so'rovda yaratilmasin
+WARM_EXTRACTORS = (
+    "Youtube", "Instagram", "TikTok", "Twitter", "Facebook", "Pinterest", "Soundcloud",
+    "VK", "Likee", "Dailymotion", "Vimeo", "Reddit", "Tumblr", "TwitchClips", "Odnoklassniki", "Rutube",
+)
+
+
+class Startup:
+    def __init__(self):
+        self.started = time.monotonic()
+        self.phases: Dict[str, float] = {}
+        self.ready = False
+        self.ready_after_ms: float = 0
+        register_gauge("startup", lambda: {
+            "ready": self.ready, "ready_after_ms": self.ready_after_ms, "phases_ms": self.phases
+        })
+
+    async def phase(self, name: str, awaitable: Awaitable[Any]) -> Any:
+        """Bosqichni bajarish va vaqtini yozish"""
+        started = time.monotonic()
+        try:
+            return await awaitable
+        finally:
+            self.phases[name] = round((time.monotonic() - started) * 1000, 1)
+            logger.info(f"⏱️ Startup {name}: {self.phases[name]} ms")
+
+    def set_ready(self):
+        self.ready = True
+        self.ready_after_ms = round((time.monotonic() - self.started) * 1000, 1)
+        phases = ", ".join(f"{name}={ms}" for name, ms in self.phases.items())
+        logger.info(f"✅ Ready after {self.ready_after_ms} ms ({phases})")
+
+    async def ready_when(self, *tasks: Awaitable[Any]):
+        """Berilgan bosqichlar (masalan isitish) tugagach tayyor deb belgilash"""
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.set_ready()
+
+
+def warm_downloader():
+    """
+    Blocking - fon threadda. yt_dlp importi (extractor reestri) va asosiy extractorlar
+    shu yerda yuklanadi, birinchi yuklash esa tayyor modulni oladi.
+    """
+    import yt_dlp
+
+    with yt_dlp.YoutubeDL({'quiet': True, 'no_warnings': True}) as ydl:
+        for ie_key in WARM_EXTRACTORS:
+            try:
+                ydl.get_info_extractor(ie_key)
+            except Exception as e:
+                logger.debug(f"Warm extractor {ie_key}: {e}")
+    try:
+        import instaloader  # noqa: F401 (Instagram albomlari uchun, ixtiyoriy)
+    except ImportError:
+        pass
+
+
+startup = Startup()
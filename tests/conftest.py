@@ -0,0 +1,17 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# config.py tokensiz import qilinmaydi
+os.environ.setdefault("BOT_TOKEN", "123456:TEST")
+sys.path.insert(0, ROOT)
+
+
+@pytest.fixture
+def fake_db():
+    """database.py kolleksiyalari xotiradagi stand-inlar bilan (benchmarks.fakes)"""
+    from benchmarks.fakes import install_fake_database
+    return install_fake_database()
@@ -0,0 +1,120 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import bot
+
+
+class FakeMessage:
+    def __init__(self, user_id: int = 1):
+        self.from_user = SimpleNamespace(id=user_id)
+        self.edits = []
+
+    async def answer(self, text, **kwargs):
+        return self
+
+    async def edit_text(self, text, **kwargs):
+        self.edits.append(text)
+
+
+def t(key, **kwargs):
+    return f"{key}{kwargs}"
+
+
+@pytest.fixture
+def pipeline(monkeypatch):
+    """Yuklash va Telegram o'rniga: elementlar tayyor, yuborilganlar yoziladi"""
+    sent = []
+
+    async def fetch(url):
+        return {'url': url, 'platform': 'x', 'cached': None, 'result': None, 'error': ''}
+
+    async def send(message, items):
+        sent.append([item['url'] for item in items if not item['error']])
+
+    async def submit(job, cleanup=None):
+        future = asyncio.get_running_loop().create_future()
+        try:
+            future.set_result(await job())
+        finally:
+            if cleanup:
+                cleanup()
+        return future
+
+    monkeypatch.setattr(bot, "fetch_batch_item", fetch)
+    monkeypatch.setattr(bot, "send_batch_items", send)
+    monkeypatch.setattr(bot, "submit_upload", submit)
+    return sent
+
+
+def test_batch_charges_one_download_token_per_item(pipeline):
+    from middlewares import ThrottlingMiddleware
+
+    throttle = ThrottlingMiddleware(download_rate=0.001, download_burst=5)
+    message = FakeMessage()
+    urls = [f"https://youtu.be/{i}" for i in range(8)]
+    # Birinchi element handlerda hisoblanadi
+    assert throttle.allow_download(message.from_user.id)
+
+    asyncio.run(bot.process_batch(message, urls, t=t, throttle=throttle))
+
+    assert pipeline == [urls[:5]]
+    assert "'ok': 5, 'total': 8" in message.edits[-1]
+    assert message.edits[-1].count("Limit") == 3
+    assert throttle.allow_downloads(message.from_user.id, 1) == 0
+
+
+class FakeResult:
+    def __init__(self):
+        self.cleaned = False
+
+    def cleanup(self):
+        self.cleaned = True
+
+
+def test_batch_keeps_order_and_cleans_up_when_an_item_raises(pipeline, monkeypatch):
+    results = {}
+
+    async def fetch(url):
+        if url.endswith("/boom"):
+            raise RuntimeError("boom")
+        await asyncio.sleep(0.01 if url.endswith("/1") else 0)
+        results[url] = FakeResult()
+        return {'url': url, 'platform': 'x', 'cached': None, 'result': results[url], 'error': ''}
+
+    monkeypatch.setattr(bot, "fetch_batch_item", fetch)
+    message = FakeMessage()
+    urls = ["https://youtu.be/1", "https://youtu.be/boom", "https://youtu.be/3"]
+
+    asyncio.run(bot.process_batch(message, urls, t=t))
+
+    assert pipeline == [["https://youtu.be/1", "https://youtu.be/3"]]
+    assert all(result.cleaned for result in results.values())
+    assert "'ok': 2, 'total': 3" in message.edits[-1]
+    assert "2\\. Yuklab bo'lmadi" in message.edits[-1]
+
+
+def test_media_entries_grouped_by_kind_and_limit(monkeypatch):
+    calls = []
+
+    def sent(media_type, n):
+        file = SimpleNamespace(file_id=str(n))
+        return SimpleNamespace(video=file, audio=file, photo=[file], document=None)
+
+    async def send_one(message, media_type, media, errors=None, **kwargs):
+        calls.append((media_type, 1))
+        return sent(media_type, media)
+
+    async def send_group(message, media, errors=None):
+        calls.append(("group", len(media)))
+        return [sent(m.type, m.media) for m in media]
+
+    monkeypatch.setattr(bot, "safe_send_media", send_one)
+    monkeypatch.setattr(bot, "safe_send_media_group", send_group)
+    entries = [("video", f"v{i}", None) for i in range(12)] + [("audio", "a0", None)]
+
+    file_ids = asyncio.run(bot.send_media_entries(FakeMessage(), entries))
+
+    assert calls == [("group", 10), ("group", 2), ("audio", 1)]
+    assert file_ids == [f"v{i}" for i in range(12)] + ["a0"]
@@ -0,0 +1,78 @@
+import asyncio
+
+import pytest
+from aiogram.exceptions import TelegramBadRequest, TelegramNetworkError
+from aiogram.methods import SendVideo
+
+import bot
+from downloader import DownloadResult
+
+
+def bad_request(message: str) -> TelegramBadRequest:
+    return TelegramBadRequest(method=SendVideo(chat_id=1, video="x"), message=message)
+
+
+def seed(fake_db):
+    fake_db["downloads_col"].docs.extend([
+        {"url": "https://a/1", "file_id": "F", "media_type": "video", "content_hash": "H", "send_failures": 0},
+        {"url": "https://b/2", "file_id": "F", "media_type": "video", "content_hash": "H", "send_failures": 0},
+        {"url": "https://c/3", "file_id": "G", "media_type": "video", "send_failures": 0},
+    ])
+
+
+def test_stale_file_id_removed_from_every_url(fake_db):
+    seed(fake_db)
+    cached = {"url": "https://a/1", "file_id": "F", "media_type": "video", "known": True}
+    error = bad_request("Bad Request: wrong file identifier/HTTP URL specified")
+
+    asyncio.run(bot.handle_cached_send_failure("https://d/4", cached, error))
+
+    assert [d["url"] for d in fake_db["downloads_col"].docs] == ["https://c/3"]
+
+
+def test_transient_failure_counted_on_original_row(fake_db):
+    seed(fake_db)
+    cached = {"url": "https://a/1", "file_id": "F", "media_type": "video", "known": True}
+    error = TelegramNetworkError(method=SendVideo(chat_id=1, video="x"), message="timeout")
+
+    asyncio.run(bot.handle_cached_send_failure("https://d/4", cached, error))
+
+    failures = {d["url"]: d["send_failures"] for d in fake_db["downloads_col"].docs}
+    assert failures == {"https://a/1": 1, "https://b/2": 0, "https://c/3": 0}
+
+
+def test_dedup_hit_cached_only_after_send(fake_db):
+    seed(fake_db)
+    result = DownloadResult(success=True, media_type="video", content_hash="H")
+
+    known = asyncio.run(bot.find_known_content("https://d/4", result))
+
+    assert known["file_id"] == "F" and known["known"]
+    assert len(fake_db["downloads_col"].docs) == 3
+
+    asyncio.run(bot.cache_known_content("https://d/4", known))
+    row = next(d for d in fake_db["downloads_col"].docs if d["url"] == "https://d/4")
+    assert (row["file_id"], row["content_hash"]) == ("F", "H")
+
+
+def test_unknown_content_not_deduped(fake_db):
+    seed(fake_db)
+    result = DownloadResult(success=True, media_type="video", content_hash="other")
+    assert asyncio.run(bot.find_known_content("https://d/4", result)) is None
+
+
+@pytest.mark.parametrize("message, stale", [
+    ("Bad Request: wrong file identifier/HTTP URL specified", True),
+    ("Bad Request: wrong remote file identifier specified: can't unserialize it", True),
+    ("Bad Request: file reference has expired", True),
+    # URL yuklash xatolari file_id ni o'chirmaydi
+    ("Bad Request: failed to get HTTP URL content", False),
+    ("Bad Request: wrong type of the web page content", False),
+    ("Bad Request: message to reply not found", False),
+])
+def test_stale_file_id_error_markers(message, stale):
+    assert bot.is_stale_file_id_error(bad_request(message)) is stale
+
+
+def test_stale_check_ignores_other_errors():
+    assert not bot.is_stale_file_id_error(ValueError("wrong file identifier"))
@@ -0,0 +1,109 @@
+import asyncio
+from types import SimpleNamespace
+
+import aiohttp
+import pytest
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.methods import SendVideo
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+import bot
+import metrics
+from downloader import DownloadResult, probe_direct
+
+MB = 1024 * 1024
+
+
+def head(content_type: str, size: int):
+    async def handler(request):
+        return web.Response(headers={"Content-Type": content_type, "Content-Length": str(size)})
+    return handler
+
+
+async def redirect(request):
+    raise web.HTTPFound("/photo.jpg")
+
+
+async def probe(path: str, media_type: str):
+    app = web.Application()
+    app.router.add_route("HEAD", "/photo.jpg", head("image/jpeg; charset=binary", 300 * 1024))
+    app.router.add_route("HEAD", "/clip.mp4", head("video/mp4", 19 * MB))
+    app.router.add_route("HEAD", "/long.mp4", head("video/mp4", 21 * MB))
+    app.router.add_route("HEAD", "/page", head("text/html", 1000))
+    app.router.add_route("HEAD", "/empty.mp4", head("video/mp4", 0))
+    app.router.add_route("HEAD", "/short", redirect)
+    server = TestServer(app)
+    await server.start_server()
+    try:
+        async with aiohttp.ClientSession() as session:
+            return await probe_direct(session, str(server.make_url(path)), media_type), server.make_url("/")
+    finally:
+        await server.close()
+
+
+@pytest.mark.parametrize("path, media_type, size", [
+    ("/photo.jpg", "image", 300 * 1024),
+    ("/clip.mp4", "video", 19 * MB),
+])
+def test_probe_accepts_small_supported_files(path, media_type, size):
+    found, base = asyncio.run(probe(path, media_type))
+    assert found == (f"{base}{path[1:]}", size)
+
+
+def test_probe_returns_final_url_after_redirect():
+    found, base = asyncio.run(probe("/short", "image"))
+    assert found[0] == f"{base}photo.jpg"
+
+
+@pytest.mark.parametrize("path, media_type", [
+    ("/long.mp4", "video"),      # Telegram limitidan katta
+    ("/page", "image"),          # Tur mos emas
+    ("/photo.jpg", "video"),
+    ("/empty.mp4", "video"),     # Hajm noma'lum
+    ("/missing", "video"),       # 404
+])
+def test_probe_rejects(path, media_type):
+    found, _ = asyncio.run(probe(path, media_type))
+    assert found is None
+
+
+class FakeChatMessage:
+    def __init__(self, error: Exception = None):
+        self.chat = SimpleNamespace(id=1)
+        self.message_id = 1
+        self.error = error
+        self.sent = []
+        self.deleted = False
+
+    async def answer_video(self, video, **kwargs):
+        if self.error:
+            raise self.error
+        self.sent.append(video)
+        return SimpleNamespace(video=SimpleNamespace(file_id="F"))
+
+    async def delete(self):
+        self.deleted = True
+
+
+def direct_result():
+    return DownloadResult(success=True, media_type="video", title="clip", direct_url="https://cdn.example/clip.mp4")
+
+
+def test_send_direct_caches_file_id(fake_db):
+    message, loading = FakeChatMessage(), FakeChatMessage()
+    sent = asyncio.run(bot.send_direct(message, "https://tiktok.com/v/1", "tiktok", direct_result(), loading))
+    assert sent and loading.deleted
+    assert message.sent == ["https://cdn.example/clip.mp4"]
+    assert fake_db["downloads_col"].docs[0]["url"] == "https://tiktok.com/v/1"
+    assert fake_db["downloads_col"].docs[0]["file_id"] == "F"
+
+
+def test_send_direct_falls_back_when_telegram_rejects_url(fake_db):
+    error = TelegramBadRequest(method=SendVideo(chat_id=1, video="x"), message="failed to get HTTP URL content")
+    message, loading = FakeChatMessage(error), FakeChatMessage()
+    fallbacks = metrics._counters["direct_send_fallback"]
+    sent = asyncio.run(bot.send_direct(message, "https://tiktok.com/v/1", "tiktok", direct_result(), loading))
+    assert sent is False and not loading.deleted
+    assert fake_db["downloads_col"].docs == []
+    assert metrics._counters["direct_send_fallback"] == fallbacks + 1
@@ -0,0 +1,39 @@
+import os
+
+from downloader import CONTENT_HASH_CHUNK, content_fingerprint
+
+
+def write(path, data: bytes) -> str:
+    with open(path, "wb") as f:
+        f.write(data)
+    return str(path)
+
+
+def test_same_content_same_fingerprint(tmp_path):
+    data = os.urandom(1000)
+    assert content_fingerprint(write(tmp_path / "a", data)) == content_fingerprint(write(tmp_path / "b", data))
+
+
+def test_small_file_changes(tmp_path):
+    data = bytearray(os.urandom(1000))
+    original = content_fingerprint(write(tmp_path / "a", data))
+    data[500] ^= 0xFF
+    assert content_fingerprint(write(tmp_path / "b", data)) != original
+    assert content_fingerprint(write(tmp_path / "c", data + b"\0")) != original
+
+
+def test_large_file_reads_head_and_tail_only(tmp_path):
+    size = 3 * CONTENT_HASH_CHUNK
+    data = bytearray(size)
+    original = content_fingerprint(write(tmp_path / "a", data))
+
+    # O'rta qism hisobga olinmaydi
+    data[size // 2] = 1
+    assert content_fingerprint(write(tmp_path / "b", data)) == original
+
+    data[-1] = 1
+    assert content_fingerprint(write(tmp_path / "c", data)) != original
+
+
+def test_size_is_part_of_fingerprint(tmp_path):
+    assert content_fingerprint(write(tmp_path / "a", b"")) != content_fingerprint(write(tmp_path / "b", b"\0"))
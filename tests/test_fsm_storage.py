@@ -0,0 +1,95 @@
+import asyncio
+
+from aiogram.fsm.storage.base import StorageKey
+
+import metrics
+from benchmarks.fakes import FakeCollection
+from fsm_storage import MongoStorage
+
+
+class FlakyCollection(FakeCollection):
+    """bulk_write birinchi `failures` marta xato beradi"""
+
+    def __init__(self, failures: int):
+        super().__init__("fsm_col")
+        self.failures = failures
+
+    async def bulk_write(self, requests, ordered=True):
+        if self.failures:
+            self.failures -= 1
+            self.calls["bulk_write_failed"] += 1
+            raise ConnectionError("mongo down")
+        return await super().bulk_write(requests, ordered)
+
+
+def key(user_id: int) -> StorageKey:
+    return StorageKey(bot_id=1, chat_id=user_id, user_id=user_id)
+
+
+def test_state_and_data_coalesced_into_one_write():
+    async def scenario():
+        col = FakeCollection("fsm_col")
+        storage = MongoStorage(col, flush_delay=0.01)
+        await storage.set_state(key(1), "Form:url")
+        await storage.set_data(key(1), {"url": "x"})
+        await storage.close()
+        return col
+
+    col = asyncio.run(scenario())
+    assert col.calls["bulk_write"] == 1
+    assert col.docs[0]["state"] == "Form:url" and col.docs[0]["data"] == {"url": "x"}
+
+
+def test_cleared_state_deletes_document():
+    async def scenario():
+        col = FakeCollection("fsm_col")
+        col.docs.append({"_id": "1:1:1", "state": "Form:url", "data": {"a": 1}})
+        storage = MongoStorage(col, flush_delay=0.01)
+        await storage.set_state(key(1), None)
+        await storage.set_data(key(1), {})
+        await storage.close()
+        return col
+
+    assert asyncio.run(scenario()).docs == []
+
+
+def test_failed_flush_is_retried_and_newer_fields_win():
+    async def scenario():
+        col = FlakyCollection(failures=1)
+        storage = MongoStorage(col, flush_delay=0.01)
+        storage.RETRY_DELAY_MIN = storage._retry_delay = 0.01
+        await storage.set_data(key(1), {"v": 1})
+        await asyncio.sleep(0.02)
+        # Birinchi flush yiqildi, qayta urinishdan oldin yangi yozuv
+        assert storage._retry_pending
+        await storage.set_data(key(1), {"v": 2})
+        await asyncio.sleep(0.05)
+        await storage.close()
+        return col, storage
+
+    col, storage = asyncio.run(scenario())
+    assert col.calls["bulk_write_failed"] == 1
+    assert col.docs[0]["data"] == {"v": 2}
+    assert not storage._retry_pending and not storage._pending
+
+
+def test_pending_capped_during_retry_backoff():
+    async def scenario():
+        col = FlakyCollection(failures=1)
+        storage = MongoStorage(col, flush_delay=0.01, max_pending=3)
+        storage._retry_delay = 10
+        await storage.set_data(key(1), {"v": 1})
+        await asyncio.sleep(0.02)
+        for user_id in range(2, 7):
+            await storage.set_data(key(user_id), {"v": user_id})
+        pending = list(storage._pending)
+        calls = col.calls["bulk_write"] + col.calls["bulk_write_failed"]
+        storage._flush_task.cancel()
+        return pending, calls
+
+    dropped_before = metrics._counters["fsm_pending_dropped"]
+    pending, calls = asyncio.run(scenario())
+    # Eng eskilari tashlandi, yozish yo'lida sinxron flush bo'lmadi
+    assert pending == ["1:4:4", "1:5:5", "1:6:6"]
+    assert calls == 1
+    assert metrics._counters["fsm_pending_dropped"] - dropped_before == 3
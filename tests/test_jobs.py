@@ -0,0 +1,77 @@
+import asyncio
+import concurrent.futures
+import os
+import threading
+
+import pytest
+
+import jobs
+from jobs import DownloadCancelled, current_job, get_job, make_temp_dir, raise_if_cancelled, start_job, finish_job
+
+
+def test_cancel_stops_task_and_hooks():
+    async def scenario():
+        job = None
+
+        async def download():
+            nonlocal job
+            job = start_job(chat_id=1)
+            raise_if_cancelled()
+            await asyncio.sleep(10)
+
+        task = asyncio.create_task(download())
+        await asyncio.sleep(0)
+        assert get_job(job.id) is job
+        job.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        finish_job(job)
+        return job
+
+    job = asyncio.run(scenario())
+    assert job.cancelled and get_job(job.id) is None
+    # Executor ichidagi yt-dlp hooki ham to'xtaydi
+    with pytest.raises(DownloadCancelled):
+        job.hook({"status": "downloading"})
+
+
+def test_temp_dirs_removed_on_release():
+    async def scenario():
+        job = start_job(chat_id=1)
+        path = make_temp_dir()
+        job.release()
+        return path
+
+    path = asyncio.run(scenario())
+    assert not os.path.exists(path)
+    assert current_job.get() is None
+
+
+def test_release_waits_for_running_executor_work():
+    """Bekor qilingan yt-dlp threadi hali yozayotgan bo'lsa papka u tugagach o'chiriladi"""
+    job = jobs.Job(chat_id=1, task=None)
+    token = current_job.set(job)
+    try:
+        path = make_temp_dir()
+    finally:
+        current_job.reset(token)
+    started, finish = threading.Event(), threading.Event()
+
+    def work():
+        started.set()
+        finish.wait(5)
+        # Thread hali papkaga yozmoqda
+        with open(os.path.join(path, "part"), "w") as f:
+            f.write("x")
+
+    with concurrent.futures.ThreadPoolExecutor(1) as executor:
+        future = executor.submit(work)
+        job.track(future)
+        started.wait(5)
+        job.cancel()
+        job.release()
+        assert os.path.exists(path)
+        finish.set()
+        future.result(5)
+
+    assert not os.path.exists(path)
@@ -0,0 +1,43 @@
+import asyncio
+
+import pytest
+
+import link_registry
+from link_registry import callback_data, register_link, resolve_link
+
+
+def test_register_and_resolve_from_memory(fake_db):
+    async def scenario():
+        link_id = await register_link("https://youtu.be/x", "youtube")
+        return link_id, await resolve_link(link_id)
+
+    link_id, item = asyncio.run(scenario())
+    assert item == ("https://youtu.be/x", "youtube")
+    assert len(link_id) == 8
+    assert fake_db["links_col"].docs[0]["url"] == "https://youtu.be/x"
+    assert fake_db["links_col"].calls["find_one"] == 0
+
+
+def test_resolve_falls_back_to_mongo(fake_db):
+    async def scenario():
+        link_id = await register_link("https://vk.com/video1", "vk")
+        # Restart yoki boshqa replika - xotirada yo'q
+        link_registry._links.clear()
+        first = await resolve_link(link_id)
+        second = await resolve_link(link_id)
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert first == second == ("https://vk.com/video1", "vk")
+    # Ikkinchi murojaat yana xotiradan
+    assert fake_db["links_col"].calls["find_one"] == 1
+
+
+def test_unknown_link(fake_db):
+    assert asyncio.run(resolve_link("missing0")) is None
+
+
+def test_callback_data_limit():
+    assert callback_data("video", "abcdefgh") == "dl:video:abcdefgh"
+    with pytest.raises(ValueError):
+        callback_data("video", "x" * 60)
@@ -0,0 +1,87 @@
+import pytest
+
+import middlewares
+from middlewares import RateLimiter
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(middlewares.time, "monotonic", clock)
+    return clock
+
+
+def test_burst_then_reject(clock):
+    limiter = RateLimiter(rate=1, burst=3)
+    assert [limiter.consume(1) for _ in range(4)] == [True, True, True, False]
+    assert limiter.allowed == 3 and limiter.rejected == 1
+
+
+def test_refill(clock):
+    limiter = RateLimiter(rate=2, burst=2)
+    assert limiter.consume(1) and limiter.consume(1)
+    assert not limiter.consume(1)
+    clock.now += 0.5  # 1 token
+    assert limiter.consume(1)
+    assert not limiter.consume(1)
+    clock.now += 100  # burst dan oshmaydi
+    assert limiter.consume(1) and limiter.consume(1)
+    assert not limiter.consume(1)
+
+
+def test_cost_and_keys_are_separate(clock):
+    limiter = RateLimiter(rate=1, burst=3)
+    assert limiter.consume(1, cost=3)
+    assert not limiter.consume(1, cost=1)
+    assert limiter.consume(2, cost=3)
+
+
+def test_max_keys_evicts_oldest(clock):
+    limiter = RateLimiter(rate=1, burst=1, max_keys=2)
+    limiter.consume(1)
+    limiter.consume(2)
+    limiter.consume(1)  # 1 - eng so'nggi
+    limiter.consume(3)
+    assert list(limiter._buckets) == [1, 3]
+
+
+def test_sweep_drops_full_buckets(clock):
+    limiter = RateLimiter(rate=1, burst=2, sweep_interval=10)
+    limiter.consume(1)
+    clock.now += 5
+    limiter.consume(2)
+    clock.now += 6  # 1 - to'la (idle_ttl=2), 2 ham; sweep ishlaydi
+    limiter.consume(3)
+    assert list(limiter._buckets) == [3]
+
+
+def test_zero_rate_is_unlimited(clock):
+    limiter = RateLimiter(rate=0, burst=0)
+    assert all(limiter.consume(1) for _ in range(100))
+    assert limiter.consume_up_to(1, 10) == 10
+    assert not limiter._buckets
+
+
+def test_consume_up_to_grants_whole_tokens(clock):
+    limiter = RateLimiter(rate=1, burst=3)
+    assert limiter.consume_up_to(1, 5) == 3
+    assert limiter.consume_up_to(1, 5) == 0
+    clock.now += 1.5
+    assert limiter.consume_up_to(1, 5) == 1
+    assert limiter.allowed == 4 and limiter.rejected == 11
+
+
+def test_allow_downloads_per_item(clock, monkeypatch):
+    monkeypatch.setattr(middlewares.config, "admin_ids", [42])
+    throttle = middlewares.ThrottlingMiddleware(download_rate=1, download_burst=5)
+    assert throttle.allow_download(1)
+    assert throttle.allow_downloads(1, 9) == 4
+    assert throttle.allow_downloads(42, 9) == 9
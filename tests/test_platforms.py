@@ -0,0 +1,95 @@
+import pytest
+
+import platforms
+from platforms import PlatformRegistry, registry
+
+
+@pytest.fixture
+def reg():
+    r = PlatformRegistry()
+    r.register("video", {"name": "Video", "hosts": {"example.com": None, "ex.am": None}})
+    r.register("posts", {"name": "Posts", "hosts": {"social.io": r"^/(?:p|reel)/"}})
+    r.register("deep", {"name": "Deep", "hosts": {"media.cdn.net": None}})
+    return r
+
+
+@pytest.mark.parametrize("url, expected", [
+    ("https://example.com/watch?v=1", "video"),
+    ("http://ex.am/abc", "video"),
+    # Subdomen ota domenga tushadi
+    ("https://www.example.com/a", "video"),
+    ("https://m.www.example.com/a", "video"),
+    ("https://EXAMPLE.COM./a", "video"),
+    ("https://user:pw@example.com:8443/a", "video"),
+    ("https://media.cdn.net/x.mp4", "deep"),
+    ("https://eu.media.cdn.net/x.mp4", "deep"),
+])
+def test_resolve_host(reg, url, expected):
+    assert reg.resolve(url).id == expected
+
+
+@pytest.mark.parametrize("url", [
+    # Faqat haqiqiy hostname solishtiriladi, substring emas
+    "https://notexample.com/a",
+    "https://example.com.evil.org/a",
+    "https://evil.org/?u=https://example.com/a",
+    # Ota domen tekshiriladi, TLD ning o'zi emas
+    "https://cdn.net/x.mp4",
+    "https://other.cdn.net/x.mp4",
+    "example.com/a",
+    "",
+])
+def test_resolve_rejects(reg, url):
+    assert reg.resolve(url) is None
+
+
+def test_resolve_path_pattern(reg):
+    assert reg.resolve("https://social.io/p/abc").id == "posts"
+    assert reg.resolve("https://www.social.io/reel/abc").id == "posts"
+    assert reg.resolve("https://social.io/someone") is None
+    assert reg.resolve("https://social.io") is None
+
+
+@pytest.mark.parametrize("url, expected", [
+    ("https://www.youtube.com/watch?v=x", "youtube"),
+    ("https://m.youtube.com/shorts/abc", "youtube"),
+    ("https://youtu.be/x", "youtube"),
+    ("https://vm.tiktok.com/ZM123/", "tiktok"),
+    # Instagram va Twitter/X - eski matcher kabi istalgan yo'l
+    ("https://www.instagram.com/p/Cabc/", "instagram"),
+    ("https://www.instagram.com/reels/Cabc/", "instagram"),
+    ("https://www.instagram.com/some.user/", "instagram"),
+    ("https://x.com/user/status/1", "twitter"),
+    ("https://mobile.twitter.com/i/web/status/1", "twitter"),
+    ("https://x.com/user", "twitter"),
+    ("https://open.spotify.com/track/abc", "spotify"),
+    ("https://open.spotify.com/intl-de/track/abc", "spotify"),
+    ("https://vk.com/video-1_2", "vk"),
+    ("https://clips.twitch.tv/Slug", "twitch"),
+])
+def test_resolve_supported_platforms(url, expected):
+    assert registry.resolve(url).id == expected
+
+
+@pytest.mark.parametrize("url", [
+    "https://box.com/user/status/1",
+    "https://fox.com/watch/1",
+    "https://google.com/search?q=instagram",
+    "https://example.com/redirect?to=https://www.youtube.com/watch?v=x",
+    # Spotify: faqat treklar (albom/playlist qo'llanmaydi)
+    "https://open.spotify.com/album/abc",
+    "https://open.spotify.com/playlist/abc",
+    "https://vk.com/id1",
+])
+def test_resolve_supported_platforms_rejects(url):
+    assert registry.resolve(url) is None
+
+
+def test_host_cache_bounded_and_reset_on_register(reg, monkeypatch):
+    monkeypatch.setattr(platforms, "HOST_CACHE_SIZE", 2)
+    for i in range(5):
+        reg.resolve(f"https://h{i}.example.com/a")
+    assert len(reg._host_cache) <= 2
+    assert reg.resolve("https://new.io/a") is None
+    reg.register("new", {"name": "New", "hosts": {"new.io": None}})
+    assert reg.resolve("https://new.io/a").id == "new"
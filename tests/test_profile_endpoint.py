@@ -0,0 +1,29 @@
+import asyncio
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import make_mocked_request
+
+import bot
+
+
+@pytest.mark.parametrize("configured, sent", [
+    ("", ""),
+    ("", "anything"),
+    ("secret", ""),
+    ("secret", "secreT"),
+    ("secret", "secret-longer"),
+])
+def test_profile_requires_matching_token(monkeypatch, configured, sent):
+    monkeypatch.setattr(bot.config, "debug_token", configured)
+    headers = {"X-Debug-Token": sent} if sent else {}
+    request = make_mocked_request("GET", "/debug/profile?seconds=1", headers=headers)
+    with pytest.raises(web.HTTPNotFound):
+        asyncio.run(bot.handle_profile(request))
+
+
+def test_profile_validates_seconds_after_token(monkeypatch):
+    monkeypatch.setattr(bot.config, "debug_token", "secret")
+    request = make_mocked_request("GET", "/debug/profile?seconds=x", headers={"X-Debug-Token": "secret"})
+    with pytest.raises(web.HTTPBadRequest):
+        asyncio.run(bot.handle_profile(request))
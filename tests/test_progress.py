@@ -0,0 +1,101 @@
+import asyncio
+from types import SimpleNamespace
+
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import EditMessageText
+
+from progress import ProgressRenderer
+
+
+class FakeMessage:
+    def __init__(self, message_id: int, delay: float = 0, fail_with: Exception = None):
+        self.chat = SimpleNamespace(id=1)
+        self.message_id = message_id
+        self.delay = delay
+        self.fail_with = fail_with
+        self.texts = []
+
+    async def edit_text(self, text, **kwargs):
+        await asyncio.sleep(self.delay)
+        if self.fail_with:
+            error, self.fail_with = self.fail_with, None
+            raise error
+        self.texts.append(text)
+
+
+def renderer(rate: float = 100, min_interval: float = 0) -> ProgressRenderer:
+    r = ProgressRenderer(rate, min_interval)
+    r.TICK = 0.005
+    return r
+
+
+def test_only_latest_state_is_sent():
+    async def scenario():
+        r, msg = renderer(), FakeMessage(1)
+        for i in range(5):
+            r.update(msg, f"{i}%")
+        await asyncio.sleep(0.05)
+        return r, msg
+
+    r, msg = asyncio.run(scenario())
+    assert msg.texts == ["4%"]
+    assert r.edits == 1 and r.dropped == 4
+
+
+def test_min_interval_per_message():
+    async def scenario():
+        r, msg = renderer(min_interval=10), FakeMessage(1)
+        r.update(msg, "a")
+        await asyncio.sleep(0.03)
+        r.update(msg, "b")
+        await asyncio.sleep(0.03)
+        return msg
+
+    assert asyncio.run(scenario()).texts == ["a"]
+
+
+def test_edit_budget_shared_across_messages():
+    async def scenario():
+        r = renderer(rate=2)
+        messages = [FakeMessage(i) for i in range(6)]
+        for msg in messages:
+            r.update(msg, "x")
+        await asyncio.sleep(0.03)
+        return sum(len(m.texts) for m in messages)
+
+    assert asyncio.run(scenario()) <= 2
+
+
+def test_discard_drops_pending_and_waits_for_inflight():
+    async def scenario():
+        r = renderer()
+        queued, slow = FakeMessage(1), FakeMessage(2, delay=0.05)
+        r.update(slow, "downloading")
+        await asyncio.sleep(0.02)  # slow tahrir ketmoqda
+        r.update(queued, "queued")
+        await r.discard(queued)
+        await r.discard(slow)
+        inflight_done = slow.texts == ["downloading"]
+        await asyncio.sleep(0.03)
+        return queued.texts, inflight_done, r.stats()
+
+    queued_texts, inflight_done, stats = asyncio.run(scenario())
+    assert queued_texts == []
+    assert inflight_done
+    assert stats["pending"] == 0 and stats["tracked"] == 0
+
+
+def test_retry_after_pauses_and_keeps_latest_state():
+    async def scenario():
+        r = renderer()
+        flood = TelegramRetryAfter(method=EditMessageText(text="x"), message="flood", retry_after=0.05)
+        msg = FakeMessage(1, fail_with=flood)
+        r.update(msg, "10%")
+        await asyncio.sleep(0.02)
+        paused = msg.texts == [] and r.stats()["pending"] == 1
+        await asyncio.sleep(0.08)
+        return paused, msg.texts
+
+    paused, texts = asyncio.run(scenario())
+    assert paused
+    assert texts == ["10%"]
@@ -0,0 +1,162 @@
+import asyncio
+import os
+
+import aiohttp
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+import metrics
+import range_fetch
+from range_fetch import RangeFetchError, _parse_content_range, fetch_to_file, plan_segments
+
+
+def assert_covers(segments, total):
+    assert segments[0][0] == 0
+    assert segments[-1][1] == total - 1
+    for (_, end), (start, _) in zip(segments, segments[1:]):
+        assert start == end + 1
+
+
+@pytest.mark.parametrize("total, connections, min_segment, expected", [
+    (100, 4, 10, [(0, 24), (25, 49), (50, 74), (75, 99)]),
+    (10, 3, 1, [(0, 3), (4, 7), (8, 9)]),
+    # min_segment ulanishlar sonini cheklaydi
+    (100, 8, 40, [(0, 49), (50, 99)]),
+    (100, 4, 1000, [(0, 99)]),
+    (100, 1, 1, [(0, 99)]),
+])
+def test_plan_segments(total, connections, min_segment, expected):
+    segments = plan_segments(total, connections, min_segment)
+    assert segments == expected
+    assert_covers(segments, total)
+
+
+@pytest.mark.parametrize("total", [1, 7, 1000, 4 * 1024 * 1024 + 3])
+def test_plan_segments_covers_file(total):
+    segments = plan_segments(total, 4, 1)
+    assert_covers(segments, total)
+    assert len(segments) <= 4
+
+
+def test_plan_segments_zero_min_segment():
+    assert plan_segments(8, 4, 0) == [(0, 1), (2, 3), (4, 5), (6, 7)]
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("bytes 0-99/1000", (0, 99, 1000)),
+    ("bytes 500-999/1000", (500, 999, 1000)),
+    ("bytes  0-0/1", (0, 0, 1)),
+    # Umumiy hajm noma'lum - segmentlab bo'lmaydi
+    ("bytes 0-99/*", None),
+    ("bytes */1000", None),
+    ("items 0-99/1000", None),
+    ("", None),
+    (None, None),
+])
+def test_parse_content_range(value, expected):
+    assert _parse_content_range(value) == expected
+
+
+# ============== fetch_to_file (lokal HTTP server bilan) ==============
+
+PAYLOAD = os.urandom(200 * 1024)
+
+
+class RangeServer:
+    """
+    Range so'rovlarini qo'llaydigan lokal server.
+    ranges=False - Range e'tiborsiz (200), first_limit - "bytes=0-" ga qisqa javob,
+    break_once - shu offsetdan boshlangan birinchi javob yarmida uziladi.
+    """
+
+    def __init__(self, ranges: bool = True, first_limit: int = 0, break_once: int = None):
+        self.ranges = ranges
+        self.first_limit = first_limit
+        self.break_once = break_once
+        self.requests = []
+
+    async def handle(self, request):
+        header = request.headers.get("Range")
+        self.requests.append(header)
+        if not self.ranges or not header:
+            return web.Response(body=PAYLOAD, content_type="video/mp4")
+        start, _, end = header[len("bytes="):].partition("-")
+        start = int(start)
+        end = int(end) if end else len(PAYLOAD) - 1
+        if start == 0 and not end < len(PAYLOAD) - 1 and self.first_limit:
+            end = self.first_limit - 1
+        body = PAYLOAD[start:end + 1]
+        resp = web.StreamResponse(status=206, headers={
+            "Content-Range": f"bytes {start}-{end}/{len(PAYLOAD)}", "Content-Type": "video/mp4"
+        })
+        resp.content_length = len(body)
+        await resp.prepare(request)
+        if start == self.break_once:
+            self.break_once = None
+            await resp.write(body[:len(body) // 2])
+            request.transport.close()
+            return resp
+        await resp.write(body)
+        return resp
+
+    async def fetch(self, path, **kwargs):
+        app = web.Application()
+        app.router.add_get("/file", self.handle)
+        server = TestServer(app)
+        await server.start_server()
+        try:
+            async with aiohttp.ClientSession() as session:
+                return await fetch_to_file(session, str(server.make_url("/file")), str(path), **kwargs)
+        finally:
+            await server.close()
+
+
+@pytest.fixture
+def small_segments(monkeypatch):
+    monkeypatch.setattr(range_fetch.config, "range_min_mb", 32 / 1024)  # 32KB
+    monkeypatch.setattr(range_fetch.config, "range_connections", 4)
+
+
+def test_fetch_segmented(tmp_path, small_segments):
+    server = RangeServer()
+    result = asyncio.run(server.fetch(tmp_path / "out"))
+    assert result.connections == 4 and result.size == len(PAYLOAD)
+    assert (tmp_path / "out").read_bytes() == PAYLOAD
+    assert server.requests[0] == "bytes=0-"
+
+
+def test_fetch_without_range_support(tmp_path, small_segments):
+    server = RangeServer(ranges=False)
+    result = asyncio.run(server.fetch(tmp_path / "out"))
+    assert result.connections == 1
+    assert (tmp_path / "out").read_bytes() == PAYLOAD
+    assert len(server.requests) == 1
+
+
+def test_fetch_short_first_range(tmp_path, small_segments):
+    # CDN "0-" ga faqat 10KB qaytaradi - birinchi segmentning qolgani alohida so'raladi
+    server = RangeServer(first_limit=10 * 1024)
+    result = asyncio.run(server.fetch(tmp_path / "out"))
+    assert result.connections == 5
+    assert (tmp_path / "out").read_bytes() == PAYLOAD
+    assert f"bytes={10 * 1024}-{len(PAYLOAD) // 4 - 1}" in server.requests
+
+
+def test_fetch_retries_broken_segment(tmp_path, small_segments):
+    middle = len(PAYLOAD) // 2  # 3-segment boshi
+    server = RangeServer(break_once=middle)
+    retries = metrics._counters["range_segment_retries"]
+    asyncio.run(server.fetch(tmp_path / "out"))
+    assert (tmp_path / "out").read_bytes() == PAYLOAD
+    assert metrics._counters["range_segment_retries"] == retries + 1
+    # Uzilgan segment boshidan emas, qolgan joyidan so'raldi
+    resumed = [r for r in server.requests if r and r.endswith(f"-{middle + len(PAYLOAD) // 4 - 1}")]
+    assert len(resumed) == 2 and resumed[1] != f"bytes={middle}-{middle + len(PAYLOAD) // 4 - 1}"
+
+
+def test_fetch_too_large_removes_file(tmp_path, small_segments):
+    server = RangeServer()
+    with pytest.raises(RangeFetchError):
+        asyncio.run(server.fetch(tmp_path / "out", max_bytes=1024))
+    assert not (tmp_path / "out").exists()
@@ -0,0 +1,62 @@
+from update_recorder import Anonymizer
+
+
+def test_user_id_is_stable_and_keeps_sign():
+    a = Anonymizer(salt=b"s" * 16)
+    assert a.user_id(42) == a.user_id(42)
+    assert a.user_id(42) != 42
+    assert a.user_id(42) != a.user_id(43)
+    assert a.user_id(-1001234) < 0
+    assert Anonymizer(salt=b"t" * 16).user_id(42) != a.user_id(42)
+
+
+def test_url_keeps_route_and_hides_ids():
+    a = Anonymizer(salt=b"s" * 16)
+    url = a.url("https://www.instagram.com/p/Cx1AbCdEfG/?igsh=secret")
+    assert url.startswith("https://www.instagram.com/p/")
+    assert "Cx1AbCdEfG" not in url
+    assert "secret" not in url
+    assert a.url("https://www.instagram.com/p/Cx1AbCdEfG/?igsh=secret") == url
+
+
+def test_text():
+    a = Anonymizer(salt=b"s" * 16)
+    assert a.text("/start ref123") == "/start"
+    assert a.text("salom dunyo") == "x" * 11
+    assert len(a.text("a" * 100)) == 32
+    text = a.text("mana https://youtu.be/dQw4w9WgXcQ va https://vk.com/video-1_2")
+    assert text.startswith("https://youtu.be/") and "dQw4w9WgXcQ" not in text
+    assert "mana" not in text and "https://vk.com/" in text and "video-1_2" not in text
+
+
+def test_callback_data_hides_link_id():
+    a = Anonymizer(salt=b"s" * 16)
+    data = a.callback_data("dl:video:AbCdEfGh")
+    assert data.startswith("dl:video:") and "AbCdEfGh" not in data
+    assert a.callback_data("lang:uz") == "lang:uz"
+
+
+def test_update():
+    a = Anonymizer(salt=b"s" * 16)
+    update = {
+        "update_id": 1,
+        "message": {
+            "message_id": 5,
+            "from": {"id": 42, "first_name": "Ali", "username": "ali"},
+            "chat": {"id": -100, "title": "Guruh", "type": "supergroup"},
+            "text": "https://youtu.be/dQw4w9WgXcQ",
+            "contact": {"phone_number": "+998"},
+        },
+    }
+    result = a.update(update)["message"]
+    assert result["message_id"] == 5
+    assert result["from"] == {"id": a.user_id(42), "first_name": "u", "username": "u"}
+    assert result["chat"]["id"] == a.user_id(-100) and result["chat"]["title"] == "u"
+    assert "contact" not in result
+    assert "dQw4w9WgXcQ" not in result["text"]
+
+
+def test_url_keeps_short_route_words():
+    # instagram.com/p/, vk.com/video - platforma aniqlanishi uchun saqlanadi
+    a = Anonymizer(salt=b"s" * 16)
+    assert a.url("https://vk.com/video/abc") == "https://vk.com/video/abc"
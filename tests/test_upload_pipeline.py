@@ -0,0 +1,133 @@
+import asyncio
+
+import pytest
+
+import bot
+
+
+def run_pipeline(monkeypatch, scenario):
+    """Yangi navbat + bitta worker bilan ssenariyni bajarish"""
+    async def main():
+        monkeypatch.setattr(bot, "UPLOAD_QUEUE", asyncio.Queue(maxsize=4))
+        worker = asyncio.create_task(bot.upload_worker())
+        try:
+            return await scenario(worker)
+        finally:
+            worker.cancel()
+
+    return asyncio.run(main())
+
+
+def test_result_returned_and_cleanup_called(monkeypatch):
+    cleaned = []
+
+    async def scenario(worker):
+        async def job():
+            return "sent"
+        future = await bot.submit_upload(job, lambda: cleaned.append(True))
+        return await future
+
+    assert run_pipeline(monkeypatch, scenario) == "sent"
+    assert cleaned == [True]
+
+
+def test_worker_survives_failing_jobs(monkeypatch):
+    async def scenario(worker):
+        async def fails():
+            raise ValueError("boom")
+
+        async def cancels_itself():
+            raise asyncio.CancelledError()
+
+        async def ok():
+            return 42
+
+        failed = await bot.submit_upload(fails)
+        cancelled = await bot.submit_upload(cancels_itself)
+        last = await bot.submit_upload(ok)
+        with pytest.raises(ValueError):
+            await failed
+        with pytest.raises(asyncio.CancelledError):
+            await cancelled
+        return await last, worker.done()
+
+    assert run_pipeline(monkeypatch, scenario) == (42, False)
+
+
+def test_cancelled_future_skips_job(monkeypatch):
+    started = []
+    cleaned = []
+
+    async def scenario(worker):
+        gate = asyncio.Event()
+
+        async def blocker():
+            await gate.wait()
+
+        async def job():
+            started.append(True)
+
+        first = await bot.submit_upload(blocker)
+        skipped = await bot.submit_upload(job, lambda: cleaned.append(True))
+        skipped.cancel()
+        gate.set()
+        await first
+        await bot.UPLOAD_QUEUE.join()
+        return worker.done()
+
+    assert run_pipeline(monkeypatch, scenario) is False
+    assert started == [] and cleaned == [True]
+
+
+def test_cancel_during_upload_stops_job(monkeypatch):
+    async def scenario(worker):
+        started = asyncio.Event()
+        stopped = []
+
+        async def job():
+            started.set()
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                stopped.append(True)
+                raise
+
+        future = await bot.submit_upload(job)
+        await started.wait()
+        future.cancel()
+        await bot.UPLOAD_QUEUE.join()
+        return stopped, worker.done()
+
+    assert run_pipeline(monkeypatch, scenario) == ([True], False)
+
+
+def test_worker_shutdown_cancels_pending_future(monkeypatch):
+    async def scenario(worker):
+        started = asyncio.Event()
+
+        async def job():
+            started.set()
+            await asyncio.sleep(10)
+
+        future = await bot.submit_upload(job)
+        await started.wait()
+        worker.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await worker
+        return future.cancelled()
+
+    assert run_pipeline(monkeypatch, scenario) is True
+
+
+def test_slot_semaphore_counts_free_slots():
+    async def main():
+        slots = bot.SlotSemaphore(2)
+        seen = [slots.free]
+        async with slots:
+            seen.append(slots.free)
+            async with slots:
+                seen.append((slots.free, slots.locked()))
+        seen.append(slots.free)
+        return seen
+
+    assert asyncio.run(main()) == [2, 1, (0, True), 2]
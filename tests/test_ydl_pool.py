@@ -0,0 +1,76 @@
+import threading
+
+import pytest
+
+from ydl_pool import YdlPool, profile_key
+
+OPTS = {"quiet": True, "no_warnings": True, "format": "best"}
+
+
+def test_reused_with_fresh_per_call_state():
+    pool = YdlPool()
+    hook_calls = []
+    with pool.acquire({**OPTS, "outtmpl": "/tmp/a.%(ext)s", "progress_hooks": [hook_calls.append]}) as ydl:
+        first = ydl
+        ydl.params["format"] = "worst"  # chaqiruv ichida o'zgartirildi
+        ydl.params["progress_hooks"][0]({"status": "downloading"})
+    with pool.acquire({**OPTS, "outtmpl": "/tmp/b.%(ext)s"}) as ydl:
+        assert ydl is first
+        assert ydl.params["format"] == "best"
+        assert ydl.params["outtmpl"]["default"] == "/tmp/b.%(ext)s"
+        # Oldingi chaqiruv hooki endi ishlamaydi
+        ydl.params["progress_hooks"][0]({"status": "downloading"})
+    assert len(hook_calls) == 1
+    assert (pool.created, pool.reused) == (1, 1)
+
+
+def test_cookies_and_extractors_cleared_between_calls():
+    pool = YdlPool()
+    with pool.acquire(OPTS) as ydl:
+        ydl._load_cookies("session=secret; Domain=.example.com; Path=/", autoscope=False)
+        ydl.get_info_extractor("Generic")
+        assert len(ydl.cookiejar) == 1 and ydl._ies_instances
+    with pool.acquire(OPTS) as ydl:
+        assert len(ydl.cookiejar) == 0
+        assert not ydl._ies_instances
+
+
+def test_error_discards_instance():
+    pool = YdlPool()
+    with pytest.raises(RuntimeError):
+        with pool.acquire(OPTS) as ydl:
+            failed = ydl
+            raise RuntimeError("download failed")
+    with pool.acquire(OPTS) as ydl:
+        assert ydl is not failed
+    assert pool.discarded == 1
+
+
+def test_nested_and_max_uses():
+    pool = YdlPool(max_uses=2)
+    with pool.acquire(OPTS) as outer:
+        with pool.acquire(OPTS) as inner:
+            assert inner is not outer
+    assert pool.created == 2
+    with pool.acquire(OPTS):
+        pass
+    # Ikkinchi ishlatilishda yopildi
+    assert pool.discarded >= 1
+
+
+def test_instances_are_per_thread_and_per_profile():
+    pool = YdlPool()
+    seen = {}
+
+    def worker(name):
+        with pool.acquire(OPTS) as ydl:
+            seen[name] = ydl
+
+    with pool.acquire(OPTS) as ydl:
+        seen["main"] = ydl
+    thread = threading.Thread(target=worker, args=("other",))
+    thread.start()
+    thread.join()
+    assert seen["main"] is not seen["other"]
+    assert profile_key({**OPTS, "outtmpl": "x"}) == profile_key(OPTS)
+    assert profile_key({**OPTS, "format": "worst"}) != profile_key(OPTS)
@@ -0,0 +1,173 @@
+"""
+Update bo'yicha tracing - bitta correlation ID middleware -> handler -> yuklash -> upload -> DB
+bo'ylab contextvar orqali uzatiladi (create_task va run_blocking kontekstni nusxalaydi).
+
+Har bir bosqich (span) vaqti yoziladi; trace tugaganda (update va undan boshlangan barcha
+background tasklar tugagach) umumiy vaqt TRACE_SLOW_SECONDS dan oshsa bitta tuzilgan (JSON) yozuv logga chiqadi.
+"""
+
+import asyncio
+import contextvars
+import functools
+import logging
+import secrets
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from config import config
+from metrics import inc
+
+logger = logging.getLogger(__name__)
+trace_logger = logging.getLogger("trace")
+
+# Bitta trace dagi maksimal spanlar (uzun playlist/batch xotirani to'ldirmasligi uchun)
+MAX_SPANS = 300
+
+
+class Trace:
+    """Bitta update ning bosqichlari. Spanlar executor threadlaridan ham qo'shiladi."""
+
+    def __init__(self, name: str, **attrs):
+        self.id = secrets.token_hex(6)
+        self.name = name
+        self.attrs: Dict[str, Any] = attrs
+        self.started = time.monotonic()
+        self.timestamp = time.time()
+        self.spans: List[Dict[str, Any]] = []
+        self.dropped = 0
+        self._holds = 0
+        self._lock = threading.Lock()
+        self._finished = False
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def add_span(self, name: str, started: float, ended: float, **attrs):
+        with self._lock:
+            if len(self.spans) >= MAX_SPANS:
+                self.dropped += 1
+                return
+            span = {
+                "name": name,
+                "start_ms": round((started - self.started) * 1000, 1),
+                "ms": round((ended - started) * 1000, 1),
+            }
+            span.update((k, v) for k, v in attrs.items() if v is not None)
+            self.spans.append(span)
+
+    def hold(self):
+        """Trace ni ochiq ushlab turish (background task tugaguncha)"""
+        self._holds += 1
+
+    def release(self):
+        self._holds -= 1
+        if self._holds <= 0:
+            self.finish()
+
+    def finish(self):
+        if self._finished:
+            return
+        self._finished = True
+        duration = time.monotonic() - self.started
+        if duration >= config.trace_slow_seconds:
+            inc("traces_slow")
+            # JSON ga aylantirish log threadida (logging_setup formatterlari payload ni yozadi)
+            trace_logger.warning("Slow trace %s", self.id, extra={"payload": self.to_dict(duration)})
+
+    def to_dict(self, duration: float) -> Dict[str, Any]:
+        # Bosqichlar bo'yicha jami (bir nechta urinish/element bo'lsa qo'shiladi)
+        stages: Dict[str, float] = {}
+        for span in self.spans:
+            stages[span["name"]] = round(stages.get(span["name"], 0) + span["ms"], 1)
+        result = {
+            "trace_id": self.id,
+            "name": self.name,
+            "started_at": round(self.timestamp, 3),
+            "duration_ms": round(duration * 1000, 1),
+            **self.attrs,
+            "stages": stages,
+            "spans": self.spans,
+        }
+        if self.dropped:
+            result["spans_dropped"] = self.dropped
+        return result
+
+
+current_trace: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar("current_trace", default=None)
+
+
+def trace_id() -> str:
+    """Loglar uchun joriy correlation ID ("-" - trace yo'q)"""
+    trace = current_trace.get()
+    return trace.id if trace else "-"
+
+
+def annotate(**attrs):
+    """Joriy trace ga atributlar (platform, url, ...)"""
+    trace = current_trace.get()
+    if trace:
+        trace.set(**attrs)
+
+
+def record_span(name: str, started: float, **attrs):
+    """Boshlanish vaqti (time.monotonic) ma'lum bo'lgan bosqich - hozirgacha"""
+    trace = current_trace.get()
+    if trace:
+        trace.add_span(name, started, time.monotonic(), **attrs)
+
+
+class span:
+    """
+    with span("cache_lookup"): ...  - async kod ichida ham (await ni o'rab) ishlaydi.
+    Trace bo'lmasa deyarli bepul (bitta contextvar o'qish).
+    """
+
+    __slots__ = ("name", "attrs", "trace", "started")
+
+    def __init__(self, name: str, **attrs):
+        self.name = name
+        self.attrs = attrs
+
+    def __enter__(self) -> "span":
+        self.trace = current_trace.get()
+        self.started = time.monotonic()
+        return self
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.trace:
+            error = exc_type.__name__ if exc_type else None
+            self.trace.add_span(self.name, self.started, time.monotonic(), error=error, **self.attrs)
+        return False
+
+
+def traced(name: Optional[str] = None):
+    """Funksiya (sync yoki async) chaqiruvini span sifatida yozish"""
+    def decorator(func: Callable):
+        span_name = name or func.__name__
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(span_name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(span_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def create_traced_task(coro) -> asyncio.Task:
+    """asyncio.create_task - trace task tugaguncha yopilmaydi"""
+    trace = current_trace.get()
+    task = asyncio.create_task(coro)
+    if trace:
+        trace.hold()
+        task.add_done_callback(lambda _: trace.release())
+    return task
@@ -0,0 +1,137 @@
+"""
+Kelayotgan Update larni anonimlashtirib yozib olish (middleware zanjirini load-test qilish uchun)
+Fayl: gzip JSON lines - {"t": boshlanishdan sekundlar, "u": update}
+Qayta ijro: python -m benchmarks.replay <fayl>
+
+Anonimlashtirish: ID lar tuz (salt) bilan xeshlanadi (yozuv ichida barqaror - bitta user
+bitta ID bo'lib qoladi), ismlar o'chiriladi, matndan faqat havolalar tuzilishi qoladi.
+"""
+
+import atexit
+import gzip
+import hashlib
+import json
+import logging
+import re
+import secrets
+import time
+from typing import Any, Callable, Dict, Iterator, Tuple
+from urllib.parse import parse_qsl, urlencode, urlparse, urlunparse
+
+from aiogram import BaseMiddleware
+from aiogram.types import Update
+
+logger = logging.getLogger(__name__)
+
+URL_RE = re.compile(r'https?://[^\s<>"{}|\\^`\[\]]+')
+# Marshrut so'zlari (instagram.com/p/, vk.com/video, ...) saqlanadi - platforma aniqlanishi uchun
+ROUTE_SEGMENT_RE = re.compile(r'^[a-z]{1,12}$')
+NAME_FIELDS = {"first_name", "last_name", "username", "title", "bio", "description"}
+DROP_FIELDS = {"contact", "location", "venue", "phone_number", "photo", "document", "video", "audio", "voice", "sticker"}
+ID_PARENTS = {"from", "from_user", "chat", "user", "sender_chat"}
+
+
+class Anonymizer:
+    def __init__(self, salt: bytes = None):
+        self.salt = salt or secrets.token_bytes(16)
+
+    def _digest(self, value: str, size: int = 6) -> str:
+        return hashlib.blake2b(value.encode(), key=self.salt, digest_size=size).hexdigest()
+
+    def user_id(self, value: int) -> int:
+        # Ishora saqlanadi (guruhlar manfiy)
+        mapped = int(self._digest(str(value)), 16) % 10 ** 12 + 1
+        return -mapped if value < 0 else mapped
+
+    def url(self, url: str) -> str:
+        parts = urlparse(url)
+        path = "/".join(
+            seg if not seg or ROUTE_SEGMENT_RE.match(seg) else self._digest(seg)
+            for seg in parts.path.split("/")
+        )
+        query = urlencode([(k, self._digest(v)) for k, v in parse_qsl(parts.query)])
+        return urlunparse((parts.scheme, parts.netloc, path, "", query, ""))
+
+    def text(self, text: str) -> str:
+        if text.startswith("/"):
+            return text.split()[0]  # Faqat buyruq
+        urls = URL_RE.findall(text)
+        if urls:
+            return " ".join(self.url(u) for u in urls)
+        return "x" * min(len(text), 32)
+
+    def callback_data(self, data: str) -> str:
+        parts = data.split(":")
+        if len(parts) >= 3:
+            parts[-1] = self._digest(parts[-1], 4)
+        return ":".join(parts)
+
+    def update(self, obj: Any, parent: str = "") -> Any:
+        if isinstance(obj, list):
+            return [self.update(item, parent) for item in obj]
+        if not isinstance(obj, dict):
+            return obj
+        result = {}
+        for key, value in obj.items():
+            if key in DROP_FIELDS:
+                continue
+            if key in NAME_FIELDS and isinstance(value, str):
+                result[key] = "u"
+            elif key == "id" and parent in ID_PARENTS and isinstance(value, int):
+                result[key] = self.user_id(value)
+            elif key in ("text", "caption", "query") and isinstance(value, str):
+                result[key] = self.text(value)
+            elif key == "data" and isinstance(value, str):
+                result[key] = self.callback_data(value)
+            else:
+                result[key] = self.update(value, key)
+        return result
+
+
+class UpdateRecorder(BaseMiddleware):
+    """dp.update.outer_middleware - har bir update (throttlingdan oldin) yoziladi"""
+
+    FLUSH_EVERY = 100
+
+    def __init__(self, path: str, limit: int = 100_000):
+        self.path = path
+        self.limit = limit
+        self.count = 0
+        self.anonymizer = Anonymizer()
+        self._started = time.monotonic()
+        self._file = gzip.open(path, "at", encoding="utf-8")
+        atexit.register(self.close)
+        logger.info(f"📼 Updatelar yozilmoqda: {path}")
+
+    async def __call__(self, handler: Callable, event: Update, data: Dict[str, Any]) -> Any:
+        if self._file and self.count < self.limit:
+            try:
+                self._write(event)
+            except Exception as e:
+                logger.debug(f"Update record error: {e}")
+        return await handler(event, data)
+
+    def _write(self, event: Update):
+        payload = self.anonymizer.update(event.model_dump(mode="json", exclude_none=True))
+        line = json.dumps({"t": round(time.monotonic() - self._started, 3), "u": payload}, separators=(",", ":"))
+        self._file.write(line + "\n")
+        self.count += 1
+        if self.count % self.FLUSH_EVERY == 0:
+            self._file.flush()
+        if self.count >= self.limit:
+            logger.info(f"📼 Yozish limiti: {self.limit}")
+            self.close()
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+
+
+def load_recording(path: str) -> Iterator[Tuple[float, Dict[str, Any]]]:
+    """Yozib olingan fayl -> (vaqt, update dict)"""
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                item = json.loads(line)
+                yield item["t"], item["u"]
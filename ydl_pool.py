@@ -0,0 +1,167 @@
+"""
+Qayta ishlatiladigan YoutubeDL obyektlari - har bir executor threadi uchun alohida,
+opsiyalar profili (outtmpl va hooklarsiz) bo'yicha kalitlangan.
+
+Har safar yangi YoutubeDL yaratish qimmat: opsiyalar qayta ishlanadi, extractor ro'yxati
+va HTTP opener qaytadan quriladi. Pool da esa ular saqlanib qoladi,
+chaqiruvga xos qismlar (outtmpl, progress/postprocessor hooklari) har safar almashtiriladi.
+
+Xavfsizlik:
+- Obyekt faqat o'zi yaratilgan threadda ishlatiladi (threading.local)
+- Ishlatilayotgan obyekt pooldan olinadi - ichma-ich chaqiruv yangisini oladi
+- Xato (shu jumladan bekor qilish) bo'lsa yoki MAX_USES dan keyin obyekt yopiladi
+- params har chaqiruvdan keyin yaratilgandagi holatiga qaytariladi
+- Cookie jar va extractor obyektlari (sessiya/token holati) har chaqiruvdan keyin
+  tozalanadi - bir foydalanuvchining cookie lari boshqasining so'roviga o'tmaydi
+"""
+
+import json
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Sequence
+
+from metrics import register_gauge
+
+logger = logging.getLogger(__name__)
+
+# Chaqiruvga xos opsiyalar - profil kalitiga kirmaydi
+PER_CALL_KEYS = ('outtmpl', 'progress_hooks', 'postprocessor_hooks')
+
+
+class _HookSlot:
+    """YoutubeDL ga bir marta qo'shiladigan hook - haqiqiy hooklar har chaqiruvda almashtiriladi"""
+
+    __slots__ = ("hooks",)
+
+    def __init__(self):
+        self.hooks: Sequence[Callable[[Dict[str, Any]], None]] = ()
+
+    def __call__(self, d: Dict[str, Any]):
+        for hook in self.hooks:
+            hook(d)
+
+
+class _Entry:
+    __slots__ = ("ydl", "params", "progress", "postprocess", "uses")
+
+    def __init__(self, ydl, progress: _HookSlot, postprocess: _HookSlot):
+        self.ydl = ydl
+        self.params = dict(ydl.params)
+        self.progress = progress
+        self.postprocess = postprocess
+        self.uses = 0
+
+
+def profile_key(opts: Dict[str, Any]) -> str:
+    return json.dumps(
+        {k: v for k, v in opts.items() if k not in PER_CALL_KEYS}, sort_keys=True, default=repr
+    )
+
+
+def _outtmpl(template: Any) -> Dict[str, str]:
+    from yt_dlp.utils import DEFAULT_OUTTMPL
+    if isinstance(template, dict):
+        return {**DEFAULT_OUTTMPL, **template}
+    if template:
+        return {**DEFAULT_OUTTMPL, 'default': template}
+    return dict(DEFAULT_OUTTMPL)
+
+
+class YdlPool:
+    def __init__(self, max_per_thread: int = 8, max_uses: int = 200):
+        self.max_per_thread = max_per_thread
+        self.max_uses = max_uses
+        self._local = threading.local()
+        # Taxminiy hisoblagichlar (bir nechta threaddan, qulfsiz)
+        self.created = 0
+        self.reused = 0
+        self.discarded = 0
+        register_gauge("ydl_pool", lambda: {
+            "created": self.created, "reused": self.reused, "discarded": self.discarded
+        })
+
+    def _instances(self) -> "OrderedDict[str, _Entry]":
+        instances = getattr(self._local, "instances", None)
+        if instances is None:
+            instances = self._local.instances = OrderedDict()
+        return instances
+
+    def _create(self, opts: Dict[str, Any]) -> _Entry:
+        import yt_dlp
+        progress, postprocess = _HookSlot(), _HookSlot()
+        params = {k: v for k, v in opts.items() if k not in PER_CALL_KEYS}
+        params['progress_hooks'] = [progress]
+        params['postprocessor_hooks'] = [postprocess]
+        params['outtmpl'] = _outtmpl(None)
+        self.created += 1
+        return _Entry(yt_dlp.YoutubeDL(params), progress, postprocess)
+
+    def _close(self, entry: _Entry):
+        self.discarded += 1
+        try:
+            close = getattr(entry.ydl, "close", None)
+            if close:
+                close()
+        except Exception as e:
+            logger.debug(f"YoutubeDL close error: {e}")
+
+    @contextmanager
+    def acquire(self, opts: Dict[str, Any]) -> Iterator[Any]:
+        """Blocking (executor threadida). opts - odatdagi YoutubeDL opsiyalari."""
+        key = profile_key(opts)
+        instances = self._instances()
+        entry = instances.pop(key, None)
+        if entry is None:
+            entry = self._create(opts)
+        else:
+            self.reused += 1
+
+        ydl = entry.ydl
+        ydl.params['outtmpl'] = _outtmpl(opts.get('outtmpl'))
+        entry.progress.hooks = tuple(opts.get('progress_hooks') or ())
+        entry.postprocess.hooks = tuple(opts.get('postprocessor_hooks') or ())
+
+        ok = False
+        try:
+            yield ydl
+            ok = True
+        finally:
+            entry.progress.hooks = entry.postprocess.hooks = ()
+            entry.uses += 1
+            if ok and entry.uses < self.max_uses:
+                self._reset(entry)
+                instances[key] = entry
+                while len(instances) > self.max_per_thread:
+                    _, old = instances.popitem(last=False)
+                    self._close(old)
+            else:
+                self._close(entry)
+
+    @staticmethod
+    def _reset(entry: _Entry):
+        """Keyingi ish uchun: params, yuklash hisoblagichlari, cookie va extractorlar boshlang'ich holatga"""
+        ydl = entry.ydl
+        ydl.params.clear()
+        ydl.params.update(entry.params)
+        for attr in ("_download_retcode", "_num_downloads"):
+            if hasattr(ydl, attr):
+                setattr(ydl, attr, 0)
+        # cookiejar - cached_property: yaratilmagan bo'lsa tegilmaydi; obyekt HTTP handlerlarga
+        # bog'langan, shuning uchun almashtirilmaydi - joyida tozalanadi (cookiefile qayta o'qiladi)
+        jar = vars(ydl).get('cookiejar')
+        if jar is not None:
+            jar.clear()
+            if getattr(jar, 'filename', None):
+                try:
+                    jar.load()
+                except Exception as e:
+                    logger.debug(f"Cookie file reload error: {e}")
+        # Extractor obyektlari login/token holatini saqlaydi - kerak bo'lganda qayta yaratiladi
+        ies_instances = getattr(ydl, '_ies_instances', None)
+        if ies_instances is not None:
+            ies_instances.clear()
+
+
+ydl_pool = YdlPool()